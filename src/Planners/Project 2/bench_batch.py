@@ -0,0 +1,67 @@
+"""
+Benchmark for pyhop2_parallel.plan_batch: plans for a batch of problems
+from bench_problems (with different seeds) one after the other, and then
+with plan_batch on different numbers of workers, and reports the
+throughput of each and whether they got the same plans.
+
+The office and cleaning problems are solved with pyhop, in the domain
+that STAMMER and Swiffer declare, and the blocks-world and travel
+problems with pyhop2.
+
+Usage: python bench_batch.py [--workers n1 n2 ...] [--problems n]
+                             [--domains d1 d2 ...]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, io, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+import pyhop2_parallel
+import bench_problems
+import blocks_world_operators_p2
+import blocks_world_methods_p2
+
+# These run some example problems when they are imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2
+    import STAMMER
+    import Swiffer
+
+# (name, problem function, size, planner, domain)
+DOMAINS = [('blocks', bench_problems.blocks_problem, 30, pyhop2.pyhop, pyhop2.default_domain),
+           ('office', bench_problems.office_problem, 20, pyhop.pyhop, pyhop.default_domain),
+           ('cleaning', bench_problems.cleaning_problem, 50, pyhop.pyhop, pyhop.default_domain),
+           ('travel', bench_problems.travel_problem, 30, pyhop2.pyhop, pyhop2.default_domain)]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark batch planning.')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument('--problems', type=int, default=200,
+                        help='how many problems in each batch (default 200)')
+    parser.add_argument('--domains', nargs='+', choices=[d[0] for d in DOMAINS],
+                        default=[d[0] for d in DOMAINS])
+    args = parser.parse_args(argv)
+    print('{:<9} {:<10} {:>9} {:>12} {:>8}  {}'.format(
+        'domain', 'planner', 'seconds', 'problems/s', 'speedup', 'same plans'))
+    for (name, problem, size, planner, domain) in DOMAINS:
+        if name not in args.domains:
+            continue
+        problems = [problem(size, seed=seed) for seed in range(args.problems)]
+        start = time.perf_counter()
+        expected = [planner(state, tasks, domain=domain) for (state, tasks) in problems]
+        serial = time.perf_counter() - start
+        print('{:<9} {:<10} {:>9.3f} {:>12.1f}'.format(name, 'serial', serial, len(problems) / serial))
+        for workers in args.workers:
+            start = time.perf_counter()
+            results = pyhop2_parallel.plan_batch(domain, problems, workers, planner)
+            seconds = time.perf_counter() - start
+            print('{:<9} {:<10} {:>9.3f} {:>12.1f} {:>7.2f}x  {}'.format(
+                name, '{} workers'.format(workers), seconds, len(problems) / seconds,
+                serial / seconds, 'yes' if results == expected else 'NO'))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+"""
+Benchmark for the incrementally maintained block statuses that moveb_m
+uses (see blocks_world_status_p2).
+
+For blocks-world problems of increasing size, in which the blocks start
+on the table and are to be stacked into random towers, this plans with
+blocks_world_methods_p2.moveb_m, and for the smaller problems also with
+a version of moveb_m that recomputes every block's status at every step,
+as moveb_m used to. It checks that the two give the same plans.
+
+Usage: python bench_block_status.py [n1 n2 ...]
+"""
+
+from __future__ import print_function
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import blocks_world_operators_p2
+import blocks_world_methods_p2
+from blocks_world_methods_p2 import status, all_blocks
+from bench_problems import table_blocks_state, random_blocks_goal
+
+
+def moveb_m_from_scratch(state, goal):
+    """moveb_m, computing the statuses with status() at every step."""
+    for b1 in all_blocks(state):
+        s = status(b1, state, goal)
+        if s == 'move-to-table':
+            return [[('move_one', b1, 'table'), ('move_blocks', goal)]]
+        elif s == 'move-to-block':
+            return [[('move_one', b1, goal.pos[b1]), ('move_blocks', goal)]]
+    b1 = pyhop2.find_if(lambda x: status(x, state, goal) == 'waiting', all_blocks(state))
+    if b1 != None:
+        return [[('move_one', b1, 'table'), ('move_blocks', goal)]]
+    return [[]]
+
+def timed(method, state, goal):
+    pyhop2.declare_methods('move_blocks', method)
+    start = time.perf_counter()
+    plan = pyhop2.pyhop(pyhop2.cow_state(state), [('move_blocks', goal)])
+    return (plan, time.perf_counter() - start)
+
+def main(sizes):
+    print('{:>7} {:>8} {:>14} {:>14} {:>10}'.format(
+        'blocks', 'length', 'from scratch s', 'incremental s', 'same plan'))
+    for n in sizes:
+        state = table_blocks_state(n, seed=n)
+        goal = random_blocks_goal(n, seed=n)
+        (plan, elapsed) = timed(blocks_world_methods_p2.moveb_m, state, goal)
+        if n <= 1000:
+            (old_plan, old_elapsed) = timed(moveb_m_from_scratch, state, goal)
+            old = ('{:>14.2f}'.format(old_elapsed), str(old_plan == plan))
+        else:
+            old = ('-', '-')
+        print('{:>7} {:>8} {:>14} {:>14.2f} {:>10}'.format(
+            n, len(plan) if plan else 'none', old[0], elapsed, old[1]))
+    pyhop2.declare_methods('move_blocks', blocks_world_methods_p2.moveb_m)
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [100, 300, 1000, 5000])
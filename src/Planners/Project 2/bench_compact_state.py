@@ -0,0 +1,71 @@
+"""
+Benchmark for compact states (pyhop2.compact_state).
+
+For blocks worlds of 1000 and 10000 blocks, this compares ordinary,
+copy-on-write and compact states: the memory that one state takes, and
+the time and memory of one search expansion (copy the state, then apply
+an operator to the copy). It also checks that the three kinds of states
+give the same plans.
+
+Usage: python bench_compact_state.py [n1 n2 ...]
+"""
+
+from __future__ import print_function
+import os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import blocks_world_operators_p2
+import blocks_world_methods3_p2
+from bench_problems import random_blocks_state, random_blocks_goal
+from bench_cow_state import expansion_cost
+
+
+def blocks_schema(state):
+    """Return a Schema for blocks-world states with the blocks of state."""
+    blocks = list(state.clear)
+    return pyhop2.Schema(pos=(blocks, blocks + ['table', 'hand']),
+                         clear=(blocks, [True, False]),
+                         holding=None)
+
+def state_size(make):
+    """Return the number of bytes allocated by make()."""
+    tracemalloc.start()
+    state = make()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated
+
+def main(sizes):
+    kinds = [('plain', lambda state, schema: state),
+             ('cow', lambda state, schema: pyhop2.cow_state(state)),
+             ('compact', lambda state, schema: pyhop2.compact_state(state, schema))]
+    print('{:>7} {:>8} {:>12} {:>14} {:>14}'.format(
+        'blocks', 'state', 'state B', 'expansion us', 'expansion B'))
+    for n in sizes:
+        state = random_blocks_state(n)
+        schema = blocks_schema(state)
+        for (kind, convert) in kinds:
+            size = state_size(lambda: convert(random_blocks_state(n), schema))
+            (seconds, allocated) = expansion_cost(convert(state, schema), 200)
+            print('{:>7} {:>8} {:>12} {:>14.1f} {:>14.0f}'.format(
+                n, kind, size, seconds*1e6, allocated))
+    print('')
+    print('{:>7} {:>8} {:>10} {:>8} {:>10}'.format(
+        'blocks', 'state', 'seconds', 'length', 'same plan'))
+    for n in [19, 50, 100]:
+        state = random_blocks_state(n, seed=n)
+        goal = random_blocks_goal(n, seed=n)
+        schema = blocks_schema(state)
+        plans = []
+        for (kind, convert) in kinds:
+            start = time.perf_counter()
+            plans.append(pyhop2.pyhop(convert(state, schema), [('move_blocks', goal)]))
+            elapsed = time.perf_counter() - start
+            print('{:>7} {:>8} {:>10.3f} {:>8} {:>10}'.format(
+                n, kind, elapsed, len(plans[-1]) if plans[-1] else '-',
+                str(plans[-1] == plans[0])))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000])
@@ -0,0 +1,74 @@
+"""
+Benchmark for copy-on-write states (pyhop2.cow_state).
+
+For blocks worlds of increasing size, this measures the cost of one
+search expansion (copy the state, then apply an operator to the copy)
+with copy.deepcopy and with a CowState, and checks that both kinds of
+states give the same plans.
+
+Usage: python bench_cow_state.py [n1 n2 ...]
+"""
+
+from __future__ import print_function
+import os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import blocks_world_operators_p2
+import blocks_world_methods3_p2
+from bench_problems import random_blocks_state, random_blocks_goal
+
+
+def expansion_cost(state, steps):
+    """
+    Apply steps operators along one search path, copying the state before
+    each of them as the planner does, and keep every state alive as the
+    planner's frontier would. Return (seconds, bytes) per step.
+    """
+    tops = [b for b in state.clear if state.clear[b]]
+    path = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(steps):
+        b = tops[i % len(tops)]
+        state = pyhop2.copy_state(state)
+        if state.pos[b] == 'table':
+            state = blocks_world_operators_p2.pickup(state, b)
+        else:
+            state = blocks_world_operators_p2.unstack(state, b, state.pos[b])
+        path.append(state)
+        state = pyhop2.copy_state(state)
+        state = blocks_world_operators_p2.putdown(state, b)
+        path.append(state)
+    elapsed = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (elapsed / (2*steps), allocated / (2*steps))
+
+def main(sizes):
+    print('{:>7} {:>14} {:>14} {:>12} {:>12}'.format(
+        'blocks', 'deepcopy us', 'cow us', 'deepcopy B', 'cow B'))
+    for n in sizes:
+        state = random_blocks_state(n)
+        (t1, m1) = expansion_cost(state, 200)
+        (t2, m2) = expansion_cost(pyhop2.cow_state(state), 200)
+        print('{:>7} {:>14.1f} {:>14.1f} {:>12.0f} {:>12.0f}'.format(
+            n, t1*1e6, t2*1e6, m1, m2))
+    print('')
+    print('{:>7} {:>12} {:>12} {:>8} {:>10}'.format(
+        'blocks', 'deepcopy s', 'cow s', 'length', 'same plan'))
+    for n in [19, 50, 100]:
+        state = random_blocks_state(n, seed=n)
+        goal = random_blocks_goal(n, seed=n)
+        start = time.perf_counter()
+        plan1 = pyhop2.pyhop(state, [('move_blocks', goal)])
+        t1 = time.perf_counter() - start
+        start = time.perf_counter()
+        plan2 = pyhop2.pyhop(pyhop2.cow_state(state), [('move_blocks', goal)])
+        t2 = time.perf_counter() - start
+        print('{:>7} {:>12.3f} {:>12.3f} {:>8} {:>10}'.format(
+            n, t1, t2, len(plan1) if plan1 else '-', str(plan1 == plan2)))
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [20, 100, 1000, 10000])
@@ -0,0 +1,124 @@
+"""
+Benchmark for pyhop2's search frontiers (see pyhop2.frontiers), on the
+blocks-world and travel examples that come with pyhop2, and on a few
+random problems from bench_problems.
+
+For each problem and frontier, it records the number of nodes expanded,
+the length of the plan found and the time taken. A search that expands
+more than --max-nodes nodes is stopped, and shown as 'gave up'.
+
+The blocks-world problems are solved both with the methods of
+blocks_world_methods_p2 and with those of blocks_world_methods3_p2, whose
+move_blocks method gives an alternative for each waiting block. Their
+heuristic is twice the number of blocks that aren't in their final
+positions, since each of those has to be picked up and put down. The
+travel problems use the number of tasks left.
+
+Usage: python bench_frontiers.py [--frontiers f1 f2 ...] [--max-nodes n]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, io, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import bench_problems
+
+# These run some example problems when they are imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import blocks_world_examples_p2 as examples
+    import blocks_world_methods_p2
+    import blocks_world_methods3_p2
+    import simple_travel_example_p2
+
+
+### heuristics
+
+def misplaced_blocks(goal):
+    """Return a heuristic for the blocks-world problems with goal."""
+    goal_pos = goal.pos
+    def heuristic(state, tasks, plan):
+        pos = state.pos
+        done = {'table': True, 'hand': False}
+        for b in pos:
+            path = []
+            while b not in done:
+                if b in goal_pos and goal_pos[b] != pos[b]:
+                    done[b] = False
+                    break
+                path.append(b)
+                b = pos[b]
+            for x in path:
+                done[x] = done[b]
+        return 2 * sum(1 for b in pos if not done[b])
+    return heuristic
+
+def tasks_left(state, tasks, plan):
+    return len(tasks)
+
+
+### the problems
+
+BLOCKS_METHODS = [('methods', blocks_world_methods_p2.moveb_m),
+                  ('methods3', blocks_world_methods3_p2.moveb_m)]
+
+def problems():
+    """
+    Generate (name, moveb_m or None, state, tasks, heuristic) for each
+    problem; moveb_m is the move_blocks method to use.
+    """
+    blocks = [('state1/goal1a', examples.state1, examples.goal1a),
+              ('state1/goal1b', examples.state1, examples.goal1b),
+              ('state2/goal2a', examples.state2, examples.goal2a),
+              ('state2/goal2b', examples.state2, examples.goal2b),
+              ('state3/goal3', examples.state3, examples.goal3)]
+    for n in [10, 20, 40]:
+        (state, tasks) = bench_problems.blocks_problem(n)
+        blocks.append(('blocks{}'.format(n), state, tasks[0][1]))
+    for (methods, moveb_m) in BLOCKS_METHODS:
+        for (name, state, goal) in blocks:
+            yield ('{} {}'.format(name, methods), moveb_m, state,
+                   [('move_blocks', goal)], misplaced_blocks(goal))
+    yield ('travel', None, simple_travel_example_p2.state1,
+           [('travel', 'me', 'home', 'park')], tasks_left)
+    for n in [10, 50]:
+        (state, tasks) = bench_problems.travel_problem(n)
+        yield ('travel{}'.format(n), None, state, tasks, tasks_left)
+
+
+### the benchmark
+
+def run(state, tasks, frontier, heuristic, max_nodes):
+    """Return (plan, nodes expanded, seconds) for one search."""
+    stats = pyhop2.SearchStats()
+    start = time.perf_counter()
+    plan = pyhop2.pyhop(state, tasks, stats=stats, frontier=frontier, heuristic=heuristic,
+                        budget=pyhop2.Budget(max_nodes=max_nodes))
+    return (plan, stats.nodes, time.perf_counter() - start)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compare the search frontiers of pyhop2.')
+    parser.add_argument('--frontiers', nargs='+', choices=sorted(pyhop2.frontiers),
+                        default=['depth-first', 'breadth-first', 'greedy', 'best-first'])
+    parser.add_argument('--max-nodes', type=int, default=20000,
+                        help='give up on searches that expand more nodes than this '
+                             '(default 20000)')
+    args = parser.parse_args(argv)
+    print('{:<24} {:<14} {:>8} {:>7} {:>9}'.format(
+        'problem', 'frontier', 'nodes', 'length', 'seconds'))
+    for (name, moveb_m, state, tasks, heuristic) in problems():
+        if moveb_m is not None:
+            pyhop2.declare_methods('move_blocks', moveb_m)
+        for frontier in args.frontiers:
+            (plan, nodes, seconds) = run(state, tasks, frontier, heuristic, args.max_nodes)
+            if isinstance(plan, pyhop2.BudgetExhausted):
+                length = 'gave up'
+            else:
+                length = len(plan) if plan is not False else '-'
+            print('{:<24} {:<14} {:>8} {:>7} {:>9.4f}'.format(
+                name, frontier, nodes, length, seconds))
+    pyhop2.declare_methods('move_blocks', blocks_world_methods_p2.moveb_m)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
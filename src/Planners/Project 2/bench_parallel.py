@@ -0,0 +1,67 @@
+"""
+Benchmark for pyhop2_parallel: enumerates the plans of blocks-world
+problems with the methods of blocks_world_methods3_p2 (whose move_blocks
+method gives an alternative for each waiting block), with pyhop2.iter_plans
+and with pyhop2_parallel.iter_plans on different numbers of workers, and
+checks that they find the same plans in the same order.
+
+Usage: python bench_parallel.py [--workers n1 n2 ...] [--max-plans n]
+                                [--chunk-nodes n]
+"""
+
+from __future__ import print_function
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import pyhop2_parallel
+import bench_problems
+import blocks_world_operators_p2
+import blocks_world_methods3_p2
+
+# (size, seed) of blocks_problem for problems with many plans
+PROBLEMS = [(18, 0), (18, 3)]
+
+def serial_plans(state, tasks, n):
+    """Return the first n different plans that pyhop2.iter_plans finds."""
+    plans = []
+    seen = set()
+    for plan in pyhop2.iter_plans(state, tasks):
+        if tuple(plan) not in seen:
+            seen.add(tuple(plan))
+            plans.append(plan)
+            if len(plans) >= n:
+                break
+    return plans
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compare serial and parallel plan enumeration.')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument('--max-plans', type=int, default=10000,
+                        help='how many plans to enumerate at most (default 10000)')
+    parser.add_argument('--chunk-nodes', type=int, default=1000,
+                        help="pyhop2_parallel's chunk_nodes (default 1000)")
+    args = parser.parse_args(argv)
+    pyhop2.declare_methods('move_blocks', blocks_world_methods3_p2.moveb_m)
+    print('{:<12} {:<10} {:>7} {:>9} {:>8}  {}'.format(
+        'problem', 'planner', 'plans', 'seconds', 'speedup', 'same plans'))
+    for (size, seed) in PROBLEMS:
+        (state, tasks) = bench_problems.blocks_problem(size, seed)
+        name = 'blocks{}/{}'.format(size, seed)
+        start = time.perf_counter()
+        expected = serial_plans(state, tasks, args.max_plans)
+        serial = time.perf_counter() - start
+        print('{:<12} {:<10} {:>7} {:>9.3f}'.format(name, 'serial', len(expected), serial))
+        for workers in args.workers:
+            start = time.perf_counter()
+            plans = pyhop2_parallel.multi_plan(state, tasks, args.max_plans, workers,
+                                               chunk_nodes=args.chunk_nodes)
+            seconds = time.perf_counter() - start
+            print('{:<12} {:<10} {:>7} {:>9.3f} {:>7.2f}x  {}'.format(
+                name, '{} workers'.format(workers), len(plans), seconds, serial / seconds,
+                'yes' if plans == expected else 'NO'))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+"""
+Benchmark for pyhop2_cache.PlanCache: plans for the office and cleaning
+missions of STAMMER and Swiffer (with pyhop) and for blocks-world and
+travel problems from bench_problems (with pyhop2), and reports the
+median latency of
+- plan: the planner on its own
+- miss: PlanCache.pyhop the first time, which plans and stores the result
+- disk: a hit read from the file, by a PlanCache that was just opened
+- memory: a hit that the PlanCache already had in memory
+and whether the cache returned the planner's results.
+
+Usage: python bench_plan_cache.py [--repeat n] [--file path]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, io, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+import pyhop2_cache
+import bench_problems
+import blocks_world_operators_p2
+import blocks_world_methods_p2
+
+# These run some example problems when they are imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2
+    import STAMMER
+    import Swiffer
+    import domains
+
+# (name, [(state, tasks), ...], planner, domain)
+PROBLEMS = [('office', [(domains.state2, domains.prob2), (domains.state3, domains.prob3)],
+             pyhop.pyhop, pyhop.default_domain),
+            ('cleaning', [(domains.mopper2, domains.mopall)], pyhop.pyhop, pyhop.default_domain),
+            ('blocks', [bench_problems.blocks_problem(30, seed=seed) for seed in range(5)],
+             pyhop2.pyhop, pyhop2.default_domain),
+            ('travel', [bench_problems.travel_problem(30, seed=seed) for seed in range(5)],
+             pyhop2.pyhop, pyhop2.default_domain)]
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return (result, 1e6 * (time.perf_counter() - start))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the plan cache.')
+    parser.add_argument('--repeat', type=int, default=1000,
+                        help='how many memory hits to time for each problem (default 1000)')
+    parser.add_argument('--file', help='the cache file, which it clears (default: a temporary one)')
+    args = parser.parse_args(argv)
+    directory = tempfile.TemporaryDirectory()
+    path = args.file or os.path.join(directory.name, 'plans.db')
+    with pyhop2_cache.PlanCache(path) as cache:
+        cache.clear()
+    print('{:<9} {:>10} {:>10} {:>10} {:>10}  {}'.format(
+        'domain', 'plan us', 'miss us', 'disk us', 'memory us', 'same plans'))
+    for (name, problems, planner, domain) in PROBLEMS:
+        planned = [timed(planner, state, tasks) for (state, tasks) in problems]
+        with pyhop2_cache.PlanCache(path) as cache:
+            missed = [timed(cache.pyhop, state, tasks, planner=planner, domain=domain)
+                      for (state, tasks) in problems]
+        with pyhop2_cache.PlanCache(path) as cache:
+            read = [timed(cache.pyhop, state, tasks, planner=planner, domain=domain)
+                    for (state, tasks) in problems]
+            memory = []
+            for (state, tasks) in problems:
+                start = time.perf_counter()
+                for i in range(args.repeat):
+                    cache.pyhop(state, tasks, planner=planner, domain=domain)
+                memory.append(1e6 * (time.perf_counter() - start) / args.repeat)
+        same = all(p[0] == m[0] == r[0] for (p, m, r) in zip(planned, missed, read))
+        print('{:<9} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}  {}'.format(
+            name, median([t for (r, t) in planned]), median([t for (r, t) in missed]),
+            median([t for (r, t) in read]), median(memory), 'yes' if same else 'NO'))
+    directory.cleanup()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+"""
+Benchmark suite for the planners, on generated problems from every
+shipped domain (see bench_problems): the blocks world, office delivery
+(STAMMER), cleaning (Swiffer) and travel.
+
+For each problem and each planner (pyhop.pyhop, pyhop2.pyhop and
+pyhop2.multi_pyhop), it records the wall time (the best of --repeat
+runs), the number of nodes expanded, the peak memory traced by
+tracemalloc, and the length of the plan (the first plan, for
+multi_pyhop). --save writes the results to a JSON file, and --compare
+reads such a file and shows how the new results differ from it.
+
+Every run has a pyhop2.Budget of --max-nodes nodes and --time-limit
+seconds, since pyhop doesn't prune cycles and can search forever. A run
+that finds no plan, or runs out of its budget, is shown as such instead
+of with a time. The blocks-world problems start with the blocks on the
+table (see bench_problems.table_blocks_problem), as the move_blocks
+method of blocks_world_methods_p2 gets stuck on most others.
+
+The pyhop domains (STAMMER and Swiffer) are adapted to pyhop2, and the
+pyhop2 domains to pyhop, so that every planner can run every problem.
+
+Usage: python bench_planners.py [--domains d1 d2 ...] [--repeat n]
+                                [--max-nodes n] [--time-limit s]
+                                [--save file] [--compare file]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, io, json, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+import blocks_world_operators_p2
+import blocks_world_methods_p2
+import bench_problems
+
+# These run some example problems when they are imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2
+    import STAMMER
+    import Swiffer
+
+
+### making every domain available to both planners
+
+def v1_method(method):
+    """Turn a pyhop2 method into a pyhop method that uses its first alternative."""
+    def adapted(state, *args):
+        alternatives = method(state, *args)
+        return alternatives[0] if alternatives else False
+    adapted.__name__ = method.__name__
+    return adapted
+
+def v2_method(method):
+    """Turn a pyhop method into a pyhop2 method with one alternative."""
+    def adapted(state, *args):
+        subtasks = method(state, *args)
+        return False if subtasks is False else [subtasks]
+    adapted.__name__ = method.__name__
+    return adapted
+
+V2_TASKS = ['move_blocks', 'move_one', 'get', 'put', 'travel']
+V1_TASKS = ['goAndGet', 'deliver', 'takeAndSign', 'seek_destroy', 'take_deliver',
+            'take_sign_deliver', 'clean_lock']
+
+pyhop2.declare_methods('move_blocks', blocks_world_methods_p2.moveb_m)
+for task in V2_TASKS:
+    pyhop.declare_methods(task, *[v1_method(m) for m in pyhop2.methods[task]])
+for task in V1_TASKS:
+    pyhop2.declare_methods(task, *[v2_method(m) for m in pyhop.methods[task]])
+pyhop.declare_operators(*pyhop2.operators.values())
+pyhop2.declare_operators(*pyhop.operators.values())
+
+
+### the benchmarks
+
+DOMAINS = [('blocks', bench_problems.table_blocks_problem, [10, 30, 100]),
+           ('office', bench_problems.office_problem, [5, 20, 50]),
+           ('cleaning', bench_problems.cleaning_problem, [10, 50, 200]),
+           ('travel', bench_problems.travel_problem, [10, 50, 150])]
+
+# how many plans multi_pyhop looks for
+MULTI = 5
+
+def plans(plan):
+    """Return the plans in what pyhop returned: a list, or a BudgetExhausted."""
+    if isinstance(plan, pyhop2.BudgetExhausted):
+        return plan
+    return [] if plan is False else [plan]
+
+def run_pyhop(state, tasks, stats, budget):
+    if stats is None:
+        return plans(pyhop.pyhop(state, tasks, budget=budget))
+    # pyhop has no SearchStats, so count the calls that expand nodes
+    with counting(pyhop, '_seek_plan_steps') as calls:
+        result = plans(pyhop.pyhop(state, tasks, budget=budget))
+    stats.nodes = calls[0]
+    return result
+
+def run_pyhop2(state, tasks, stats, budget):
+    return plans(pyhop2.pyhop(state, tasks, stats=stats, budget=budget))
+
+def run_multi_pyhop(state, tasks, stats, budget):
+    return pyhop2.multi_pyhop(state, tasks, MULTI, stats=stats, budget=budget)
+
+# Each planner is (name, function(state, tasks, stats, budget) that runs
+# it and returns a list of plans, or a BudgetExhausted)
+PLANNERS = [('pyhop', run_pyhop), ('pyhop2', run_pyhop2), ('multi_pyhop', run_multi_pyhop)]
+
+@contextlib.contextmanager
+def counting(owner, name):
+    """Count the calls to owner.name while the context is active."""
+    original = getattr(owner, name)
+    calls = [0]
+    def counted(*args):
+        calls[0] += 1
+        return original(*args)
+    setattr(owner, name, counted)
+    try:
+        yield calls
+    finally:
+        setattr(owner, name, original)
+
+def measure(planner, state, tasks, repeat, budget):
+    """
+    Run planner on a problem, and return a dict with the measurements.
+    status is 'found', 'no plan' or 'gave up (reason)'; the runs that
+    don't find a plan aren't timed.
+    """
+    stats = pyhop2.SearchStats()
+    tracemalloc.start()
+    result = planner(state, tasks, stats, budget)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    measured = {'nodes': stats.nodes, 'peak_kb': peak // 1024, 'seconds': None,
+                'length': None, 'plans': 0}
+    if isinstance(result, pyhop2.BudgetExhausted):
+        measured['status'] = 'gave up ({})'.format(result.reason)
+    elif not result:
+        measured['status'] = 'no plan'
+    else:
+        measured['status'] = 'found'
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            planner(state, tasks, None, budget)
+            times.append(time.perf_counter() - start)
+        measured.update(seconds=min(times), length=len(result[0]), plans=len(result))
+    return measured
+
+def compare(new, old, tolerance):
+    """Describe how the measurements new differ from the baseline old."""
+    notes = []
+    if new['status'] != old.get('status', 'found'):
+        notes.append('{} -> {}'.format(old.get('status', 'found'), new['status']))
+    for (key, more, less) in [('seconds', 'slower', 'faster'),
+                              ('peak_kb', 'more memory', 'less memory')]:
+        if new[key] is None or not old.get(key):
+            continue
+        ratio = new[key] / old[key]
+        if ratio > 1 + tolerance:
+            notes.append('{:.2f}x {}'.format(ratio, more))
+        elif ratio < 1 - tolerance:
+            notes.append('{:.2f}x {}'.format(1 / ratio, less))
+    for key in ['nodes', 'length', 'plans']:
+        if new[key] != old.get(key):
+            notes.append('{} {} -> {}'.format(key, old.get(key), new[key]))
+    return ', '.join(notes) or 'same'
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the planners.')
+    parser.add_argument('--domains', nargs='+', choices=[d[0] for d in DOMAINS],
+                        default=[d[0] for d in DOMAINS])
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='how many times to time each run (default 3)')
+    parser.add_argument('--max-nodes', type=int, default=200000,
+                        help='give up on runs that expand more nodes than this (default 200000)')
+    parser.add_argument('--time-limit', type=float, default=60.0,
+                        help='give up on runs that take longer than this many seconds '
+                             '(default 60)')
+    parser.add_argument('--save', metavar='FILE', help='save the results in FILE')
+    parser.add_argument('--compare', metavar='FILE', help='compare with the results in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative differences in time and memory smaller '
+                             'than this are ignored (default 0.1)')
+    args = parser.parse_args(argv)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    budget = pyhop2.Budget(max_nodes=args.max_nodes, time_limit=args.time_limit)
+    results = {}
+    print('{:<9} {:>5} {:<12} {:>16} {:>8} {:>9} {:>7}  {}'.format(
+        'domain', 'size', 'planner', 'seconds', 'nodes', 'peak KB', 'length',
+        'vs baseline' if baseline else ''))
+    for (domain, problem, sizes) in DOMAINS:
+        if domain not in args.domains:
+            continue
+        for size in sizes:
+            (state, tasks) = problem(size)
+            for (name, planner) in PLANNERS:
+                key = '{}/{}/{}'.format(domain, size, name)
+                r = results[key] = measure(planner, state, tasks, args.repeat, budget)
+                if key in baseline:
+                    note = compare(r, baseline[key], args.tolerance)
+                else:
+                    note = 'new' if baseline else ''
+                seconds = r['status'] if r['seconds'] is None else '{:.4f}'.format(r['seconds'])
+                print('{:<9} {:>5} {:<12} {:>16} {:>8} {:>9} {:>7}  {}'.format(
+                    domain, size, name, seconds, r['nodes'], r['peak_kb'],
+                    '-' if r['length'] is None else r['length'], note))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,233 @@
+"""
+Seeded generators of planning problems for the benchmarks, one or more
+for each of the shipped domains. The same arguments always give the same
+problem. Each problem function returns (state, tasks).
+
+- blocks_problem(n): n blocks in random towers, to be rearranged into
+  other random towers, like bw_large_d in blocks_world_examples_p2.
+  blocks_world_methods_p2's moveb_m, which has only one way to move,
+  gets stuck on most of them; blocks_world_methods3_p2's backtracks.
+- table_blocks_problem(n): n blocks on the table, to be stacked into
+  random towers, which moveb_m of either blocks-world methods solves.
+- office_problem(n, m): the STAMMER domain, with n documents in m
+  offices, to be signed and delivered or shredded.
+- cleaning_problem(n): the Swiffer domain, with n rooms to mop and lock.
+- travel_problem(n): the travel domain of simple_travel_example_p2, with
+  n cities at random places, and ten people who each take a trip.
+- campus_problem(n): the travel domain of travel_routes_p2, on a road
+  network of n places (see campus_graph), with ten people who each take
+  a trip.
+
+States are pyhop2 States; pyhop.State is the same except for its class.
+"""
+
+from __future__ import print_function
+import math, os, sys, random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+
+
+### blocks world
+
+def random_blocks_state(n, seed=0, name='bw'):
+    """Return a state in which blocks 1..n are in random towers."""
+    rng = random.Random(seed)
+    blocks = list(range(1, n+1))
+    rng.shuffle(blocks)
+    state = pyhop2.State(name)
+    state.pos = {}
+    state.clear = {}
+    below = 'table'
+    for b in blocks:
+        state.pos[b] = below
+        state.clear[b] = True
+        if below != 'table':
+            state.clear[below] = False
+        below = b if rng.random() < 0.7 else 'table'
+    state.holding = False
+    return state
+
+def random_blocks_goal(n, seed=0, name='goal'):
+    """Return a goal that puts blocks 1..n into other random towers."""
+    state = random_blocks_state(n, seed+1, name)
+    goal = pyhop2.Goal(name)
+    goal.pos = state.pos
+    goal.clear = {b: True for b in state.clear if state.clear[b]}
+    return goal
+
+def blocks_problem(n, seed=0):
+    state = random_blocks_state(n, seed, 'blocks{}'.format(n))
+    return (state, [('move_blocks', random_blocks_goal(n, seed))])
+
+def table_blocks_state(n, seed=0, name='bw'):
+    """
+    Return a state in which blocks 1..n are on the table. (moveb_m can
+    get stuck when the blocks start in random towers, as it may pick a
+    waiting block that is on the table already.)
+    """
+    state = random_blocks_state(n, seed, name)
+    state.pos = {b: 'table' for b in state.pos}
+    state.clear = {b: True for b in state.clear}
+    return state
+
+def table_blocks_problem(n, seed=0):
+    state = table_blocks_state(n, seed, 'table{}'.format(n))
+    return (state, [('move_blocks', random_blocks_goal(n, seed))])
+
+
+### office delivery (STAMMER)
+
+def _other(rng, places, *excluded):
+    """Return a random element of places that isn't one of excluded."""
+    while True:
+        place = rng.choice(places)
+        if place not in excluded:
+            return place
+
+def office_problem(n, m=None, seed=0):
+    """
+    Return a problem with n documents in m offices (n//2 of them, but at
+    least 3, by default). Three out of four documents are to be taken to
+    an office to be signed and then delivered, and the rest shredded.
+    The offices are chosen so that the robot never has to go to where it
+    already is, which pyhop2 would prune as a cycle.
+    """
+    rng = random.Random(seed)
+    offices = ['Office {}'.format(i) for i in range(1, max(3, m or n//2) + 1)]
+    state = pyhop2.State('offices{}'.format(n))
+    state.at = {'robot': 'dock'}
+    state.holding = None
+    state.signed = []
+    state.shredded = []
+    tasks = []
+    robot = 'dock'
+    for i in range(1, n+1):
+        doc = 'Doc{}'.format(i)
+        office = state.at[doc] = _other(rng, offices, robot)
+        if rng.random() < 0.75:
+            sign = _other(rng, offices, office)
+            end = _other(rng, offices, sign)
+            tasks.append(('take_sign_deliver', doc, sign, end))
+            robot = end
+        else:
+            tasks.append(('seek_destroy', doc))
+            robot = office
+    return (state, tasks)
+
+
+### cleaning (Swiffer)
+
+def cleaning_problem(n, seed=0):
+    """Return a problem with n dirty rooms to mop and lock, in random order."""
+    rng = random.Random(seed)
+    rooms = ['Room {}'.format(i) for i in range(1, n+1)]
+    state = pyhop2.State('rooms{}'.format(n))
+    state.robot_location = 'Hallway'
+    state.clean = []
+    state.locked = []
+    state.dirty = list(rooms)
+    rng.shuffle(rooms)
+    return (state, [('clean_lock', room) for room in rooms])
+
+
+### travel
+
+def travel_problem(n, seed=0, people=10):
+    """
+    Return a problem with n cities at random places in a 20x20 square,
+    and the distance between every two of them. Each person takes a trip
+    from one city to another, and no trip starts where the previous one
+    ended, so that the taxi always has somewhere to go.
+    """
+    rng = random.Random(seed)
+    cities = ['city{}'.format(i) for i in range(n)]
+    where = {c: (rng.uniform(0, 20), rng.uniform(0, 20)) for c in cities}
+    state = pyhop2.State('cities{}'.format(n))
+    dist = {}
+    for (c, (x, y)) in where.items():
+        dist[c] = {d: round(((x-u)**2 + (y-v)**2) ** 0.5, 1)
+                   for (d, (u, v)) in where.items() if d != c}
+    # No operator changes the distances
+    state.dist = pyhop2.rigid(dist)
+    return (state, _trips(rng, state, cities, people))
+
+def _trips(rng, state, places, people, cash=100):
+    """Give state people with trips between places, and return the tasks."""
+    state.loc = {}
+    state.cash = {}
+    state.owe = {}
+    tasks = []
+    last = None
+    for i in range(people):
+        person = 'person{}'.format(i)
+        start = _other(rng, places, last)
+        last = _other(rng, places, start)
+        state.loc[person] = start
+        state.cash[person] = cash
+        state.owe[person] = 0
+        tasks.append(('travel', person, start, last))
+    return tasks
+
+def campus_graph(n, seed=0, degree=4):
+    """
+    Return (dist, coords) for a road network of n places at random spots
+    in a square, about 2.5 apart, with roads from each place to its degree
+    nearest neighbours (and back), as long as the straight line rounded up
+    to a tenth. Both are rigid (see pyhop2.rigid).
+    """
+    rng = random.Random(seed)
+    side = 2.5 * n ** 0.5
+    places = ['place{}'.format(i) for i in range(n)]
+    coords = {p: (rng.uniform(0, side), rng.uniform(0, side)) for p in places}
+    # Put the places in a grid of 2.5x2.5 cells, to find their neighbours
+    cells = {}
+    for (p, (x, y)) in coords.items():
+        cells.setdefault((int(x // 2.5), int(y // 2.5)), []).append(p)
+    dist = {p: {} for p in places}
+    for (p, (x, y)) in coords.items():
+        (cx, cy) = (int(x // 2.5), int(y // 2.5))
+        r = 1
+        while True:
+            near = [q for i in range(cx-r, cx+r+1) for j in range(cy-r, cy+r+1)
+                    for q in cells.get((i, j), ()) if q != p]
+            if len(near) >= degree or len(near) == n - 1:
+                break
+            r += 1
+        for q in sorted(near, key=lambda q: math.hypot(coords[q][0] - x, coords[q][1] - y))[:degree]:
+            d = math.ceil(10 * math.hypot(coords[q][0] - x, coords[q][1] - y)) / 10.0
+            dist[p][q] = dist[q][p] = d
+    return (pyhop2.rigid(dist), pyhop2.rigid(coords))
+
+def campus_problem(n, seed=0, people=10, graph=None):
+    """
+    Return a problem in campus_graph(n, seed), or in graph if given (a
+    (dist, coords) pair from campus_graph), with trips between the places
+    of its largest connected part. Each person has enough cash to take a
+    taxi a long way across the campus.
+    """
+    (dist, coords) = graph or campus_graph(n, seed)
+    rng = random.Random(seed)
+    # The largest set of places that are connected to each other
+    parts = []
+    seen = set()
+    for p in dist:
+        if p not in seen:
+            part = [p]
+            seen.add(p)
+            for q in part:
+                for r in dist[q]:
+                    if r not in seen:
+                        seen.add(r)
+                        part.append(r)
+            parts.append(part)
+    largest = set(max(parts, key=len))
+    places = [p for p in dist if p in largest]
+    state = pyhop2.State('campus{}'.format(len(dist)))
+    state.dist = dist
+    state.coords = coords
+    # Routes can be much longer than the straight line, so plenty of cash
+    side = 2.5 * len(dist) ** 0.5
+    cash = 10 + int(2.5 * side)
+    return (state, _trips(rng, state, places, people, cash))
@@ -0,0 +1,53 @@
+"""
+Benchmark for rigid state variables: plans for travel problems from
+bench_problems with more and more cities, once with the distance table
+as an ordinary dict variable and once with it rigid (see pyhop2.rigid),
+with each engine, and reports the time per node expanded. With a rigid
+table, the time per node shouldn't depend on the number of cities.
+
+Usage: python bench_rigid.py [--cities n1 n2 ...] [--people n]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, io, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import bench_problems
+
+# simple_travel_example_p2 runs some example problems when it is imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2
+
+# (name, how to make the initial state, engine)
+SETUPS = [('copy', lambda state: state, 'copy'),
+          ('copy, cow', pyhop2.cow_state, 'copy'),
+          ('trail', lambda state: state, 'trail')]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark rigid state variables.')
+    parser.add_argument('--cities', type=int, nargs='+', default=[25, 50, 100, 200, 400])
+    parser.add_argument('--people', type=int, default=10,
+                        help='how many people travel in each problem (default 10)')
+    args = parser.parse_args(argv)
+    print('{:>6} {:<10} {:>10} {:>10}  {}'.format(
+        'cities', 'engine', 'dict us', 'rigid us', 'same plans'))
+    for n in args.cities:
+        (state, tasks) = bench_problems.travel_problem(n, people=args.people)
+        plain = pyhop2.State(state.__name__)
+        plain.__dict__.update(vars(state))
+        plain.dist = {c: dict(d) for (c, d) in state.dist.items()}
+        for (name, make, engine) in SETUPS:
+            results = []
+            for initial in (plain, state):
+                stats = pyhop2.SearchStats()
+                start = time.perf_counter()
+                plan = pyhop2.pyhop(make(initial), tasks, engine=engine, stats=stats)
+                results.append((plan, 1e6 * (time.perf_counter() - start) / stats.nodes))
+            print('{:>6} {:<10} {:>10.1f} {:>10.1f}  {}'.format(
+                n, name, results[0][1], results[1][1],
+                'yes' if results[0][0] == results[1][0] else 'NO'))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
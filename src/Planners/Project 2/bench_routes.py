@@ -0,0 +1,69 @@
+"""
+Benchmark for travel_routes_p2: plans trips on road networks from
+bench_problems.campus_graph of growing size, with each way that a
+RouteIndex can find routes, and reports the time to index the graph and
+the planning latency: for the first problem on the graph (while the
+index is cold) and the median of the others (once it is warm).
+
+- all-pairs: every route is found when the graph is indexed (only for
+  graphs with at most --all-pairs-limit places)
+- dijkstra: the routes from a place are found as they are needed, by a
+  Dijkstra search that goes on where the last one from there stopped
+- a*: each route is found as it is needed, by A* search on the places'
+  coordinates
+
+Usage: python bench_routes.py [--places n1 n2 ...] [--problems n]
+                              [--all-pairs-limit n]
+"""
+
+from __future__ import print_function
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop2
+import bench_problems
+
+DOMAIN = pyhop2.Domain('routes')
+with pyhop2.using_domain(DOMAIN):
+    import travel_routes_p2
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark planning on growing road networks.')
+    parser.add_argument('--places', type=int, nargs='+', default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument('--problems', type=int, default=20,
+                        help='how many problems to plan for on each graph (default 20)')
+    parser.add_argument('--all-pairs-limit', type=int, default=1000,
+                        help='the largest graph to index with all-pairs (default 1000)')
+    args = parser.parse_args(argv)
+    print('{:>7} {:<10} {:>10} {:>10} {:>10}  {}'.format(
+        'places', 'index', 'index ms', 'cold ms', 'warm ms', 'plans'))
+    for n in args.places:
+        graph = bench_problems.campus_graph(n)
+        problems = [bench_problems.campus_problem(n, seed, graph=graph)
+                    for seed in range(args.problems)]
+        (dist, coords) = graph
+        modes = [('dijkstra', None, 0), ('a*', coords, 0)]
+        if n <= args.all_pairs_limit:
+            modes.insert(0, ('all-pairs', None, n))
+        for (name, mode_coords, limit) in modes:
+            start = time.perf_counter()
+            travel_routes_p2.index_graph(dist, mode_coords, all_pairs_limit=limit)
+            indexing = time.perf_counter() - start
+            latencies = []
+            found = 0
+            for (state, tasks) in problems:
+                start = time.perf_counter()
+                plan = pyhop2.pyhop(state, tasks, domain=DOMAIN)
+                latencies.append(time.perf_counter() - start)
+                found += plan is not False
+            print('{:>7} {:<10} {:>10.1f} {:>10.2f} {:>10.2f}  {}/{}'.format(
+                n, name, 1000 * indexing, 1000 * latencies[0],
+                1000 * median(latencies[1:] or latencies), found, len(problems)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+"""
+Scaling benchmark for pyhop.seek_plan, which searches with an explicit
+stack instead of recursion.
+
+It plans in two domains whose plans grow with the problem size:
+- a corridor of n cells that the robot walks along one step at a time,
+  giving a plan of n steps and a search 2n levels deep;
+- blocks worlds with n blocks in towers of three, where every tower has
+  to be turned upside down, giving a plan of 2n steps.
+The time per plan step should stay flat as the plans get longer, and
+Python's recursion limit is never changed.
+
+Usage: python bench_seek_plan.py [n1 n2 ...]
+"""
+
+from __future__ import print_function
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+import blocks_world_operators_p2
+import blocks_world_methods_p2
+
+
+### the corridor domain
+
+def step(state, x):
+    if state.at + 1 == x:
+        state.at = x
+        return state
+    else: return False
+
+def walk_to(state, x):
+    if state.at == x:
+        return []
+    return [('step', state.at + 1), ('walk_to', x)]
+
+pyhop.declare_operators(step)
+pyhop.declare_methods('walk_to', walk_to)
+
+
+### the blocks world, using the pyhop2 operators and methods
+
+def first_alternative(method):
+    """Turn a pyhop2 method into a pyhop method that uses its first alternative."""
+    def adapted(state, *args):
+        alternatives = method(state, *args)
+        return alternatives[0] if alternatives else False
+    adapted.__name__ = method.__name__
+    return adapted
+
+pyhop.declare_operators(*pyhop2.operators.values())
+for (task, relevant) in pyhop2.methods.items():
+    pyhop.declare_methods(task, *[first_alternative(m) for m in relevant])
+
+def upside_down_towers(n):
+    """Return a state with n blocks in towers of three, and a goal that reverses each tower."""
+    state = pyhop.State('towers')
+    state.pos = {}
+    state.clear = {}
+    state.holding = False
+    goal = pyhop.Goal('reversed')
+    goal.pos = {}
+    for bottom in range(1, n+1, 3):
+        tower = list(range(bottom, min(bottom+3, n+1)))
+        for (below, b) in zip(['table'] + tower, tower):
+            state.pos[b] = below
+            state.clear[b] = (b == tower[-1])
+        for (below, b) in zip(['table'] + tower[::-1], tower[::-1]):
+            goal.pos[b] = below
+    return (state, goal)
+
+
+def timed(state, tasks):
+    start = time.perf_counter()
+    plan = pyhop.pyhop(state, tasks)
+    return (plan, time.perf_counter() - start)
+
+def main(sizes):
+    limit = sys.getrecursionlimit()
+    print('recursion limit: {}'.format(limit))
+    print('')
+    print('{:>8} {:>10} {:>10} {:>14}'.format('cells', 'steps', 'seconds', 'us per step'))
+    for n in sizes:
+        state = pyhop.State('corridor')
+        state.at = 0
+        (plan, elapsed) = timed(state, [('walk_to', n)])
+        print('{:>8} {:>10} {:>10.3f} {:>14.1f}'.format(n, len(plan), elapsed, 1e6*elapsed/len(plan)))
+    print('')
+    print('{:>8} {:>10} {:>10} {:>14}'.format('blocks', 'steps', 'seconds', 'us per step'))
+    for n in [b for b in sizes if b <= 1000] or sizes[:1]:
+        (state, goal) = upside_down_towers(n)
+        (plan, elapsed) = timed(pyhop.cow_state(state), [('move_blocks', goal)])
+        print('{:>8} {:>10} {:>10.3f} {:>14.1f}'.format(n, len(plan), elapsed, 1e6*elapsed/len(plan)))
+    assert sys.getrecursionlimit() == limit
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [100, 1000, 10000, 50000])
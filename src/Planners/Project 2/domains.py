@@ -4,7 +4,10 @@ Created on Sep 2, 2018
 @author: Shane
 '''
 import pyhop
-import Queue
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
 state1 = pyhop.State('state1')
 state1.at = {'robot':'dock', 'birthCertificate':'Office 1'}
 state1.holding = None
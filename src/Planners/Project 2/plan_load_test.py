@@ -0,0 +1,123 @@
+"""
+Load test for plan_server. It sends planning requests for problems from
+bench_problems to a running server from --concurrency threads at once,
+until --requests of them have been answered, and then reports the
+throughput and the percentiles of the requests' latencies.
+
+Usage: python plan_load_test.py [--url URL] [--requests n] [--concurrency n]
+                                [--domains d1 d2 ...] [--size n]
+
+For example, with the server started by python plan_server.py --workers 4:
+    python plan_load_test.py --requests 500 --concurrency 8 --domains blocks
+"""
+
+from __future__ import print_function
+import argparse, itertools, json, sys, threading, time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import bench_problems
+import plan_server
+
+
+def request_plan(url, domain, state, tasks, options=None):
+    """
+    Ask the plan server at url for plans for tasks in state, and return
+    its answer, with the plans in it decoded.
+    """
+    body = {'domain': domain, 'state': plan_server.encode_state(state),
+            'tasks': plan_server.encode_tasks(tasks), 'options': options or {}}
+    request = Request(url.rstrip('/') + '/plan', json.dumps(body).encode('utf-8'),
+                      {'Content-Type': 'application/json'})
+    try:
+        with urlopen(request) as response:
+            answer = json.loads(response.read().decode('utf-8'))
+    except HTTPError as e:
+        answer = json.loads(e.read().decode('utf-8'))
+        answer['http_status'] = e.code
+        return answer
+    answer['plans'] = [plan_server.decode_tasks(p) for p in answer['plans']]
+    return answer
+
+PROBLEMS = {'blocks': bench_problems.blocks_problem,
+            'office': bench_problems.office_problem,
+            'cleaning': bench_problems.cleaning_problem,
+            'travel': bench_problems.travel_problem}
+
+# The variables of each domain's problems that no operator changes
+RIGID = {'travel': ['dist']}
+
+def percentile(values, p):
+    """Return the p-th percentile of the sorted list values (by the nearest rank)."""
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+def load_test(url, bodies, n, concurrency):
+    """
+    Send n requests, going round bodies (a list of JSON requests, as
+    bytes), from concurrency threads, and return (latencies in seconds,
+    the number of failed requests, total seconds).
+    """
+    bodies = itertools.cycle(bodies)
+    lock = threading.Lock()
+    latencies = []
+    failures = [0]
+    left = [n]
+    def client():
+        while True:
+            with lock:
+                if left[0] == 0:
+                    return
+                left[0] -= 1
+                body = next(bodies)
+            request = Request(url.rstrip('/') + '/plan', body, {'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            try:
+                with urlopen(request) as response:
+                    response.read()
+                ok = True
+            except (HTTPError, OSError):
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                if not ok:
+                    failures[0] += 1
+    threads = [threading.Thread(target=client) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (sorted(latencies), failures[0], time.perf_counter() - start)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Load-test a plan server.')
+    parser.add_argument('--url', default='http://127.0.0.1:8765',
+                        help='the server (default http://127.0.0.1:8765)')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='how many requests to send (default 200)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='how many requests to have waiting at once (default 4)')
+    parser.add_argument('--domains', nargs='+', choices=sorted(PROBLEMS), default=sorted(PROBLEMS))
+    parser.add_argument('--size', type=int, default=10,
+                        help='the size of the problems, as for bench_problems (default 10)')
+    parser.add_argument('--seeds', type=int, default=10,
+                        help='how many different problems of each domain to send (default 10)')
+    args = parser.parse_args(argv)
+    bodies = []
+    for domain in args.domains:
+        for seed in range(args.seeds):
+            (state, tasks) = PROBLEMS[domain](args.size, seed=seed)
+            body = {'domain': domain, 'state': plan_server.encode_state(state),
+                    'tasks': plan_server.encode_tasks(tasks)}
+            if domain in RIGID:
+                body['options'] = {'rigid': RIGID[domain]}
+            bodies.append(json.dumps(body).encode('utf-8'))
+    (latencies, failures, seconds) = load_test(args.url, bodies, args.requests, args.concurrency)
+    print('{} requests ({} failed) in {:.3f} seconds: {:.1f} requests/second'.format(
+        len(latencies), failures, seconds, len(latencies) / seconds))
+    print('latency (ms): ' + ', '.join('p{} {:.2f}'.format(p, 1000 * percentile(latencies, p))
+                                       for p in [50, 90, 95, 99, 100]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,389 @@
+"""
+A planning server on localhost HTTP. It keeps a pool of worker processes,
+each of which imports the domains once when it starts, so that a request
+pays only for the planning, and not for starting Python and importing a
+domain module (which, for STAMMER.py and the like, also runs its example
+problems). Each domain is loaded into a Domain of its own, so domains
+whose operators or tasks have the same names (such as STAMMER's and
+Demo's take) can be served by the same workers.
+
+POST /plan with a JSON object
+    {"domain": "blocks", "state": STATE, "tasks": TASKS, "options": {...}}
+answers with a JSON object
+    {"status": "found", "plans": [PLAN, ...], "nodes": n, "seconds": s}
+where status is "found", "none" if there is no plan, or "gave up" if the
+search ran out of its budget (and then "reason" says why). GET /domains
+lists the domains. A request that is wrong gets a 400 answer, and one for
+which the planner or the domain's operators and methods raised an
+exception (even a ValueError) a 500, with {"error": message}.
+
+STATE is a JSON object with the state's variables (and its name, as
+"__name__"), and TASKS is a list of tasks, each of them a list. Values
+that JSON doesn't have are written as objects with one key:
+{"__tuple__": [...]}, {"__set__": [...]}, {"__dict__": [[key, value],
+...]} for a dict whose keys aren't all strings (such as the blocks
+world's), and {"__goal__": {...}} for a Goal; see encode and decode.
+
+The options are
+- engine, frontier: as for pyhop2.pyhop (pyhop2 domains only)
+- plans: how many plans to look for (pyhop2 domains only; default 1)
+- cheapest: true to look for the cheapest plan, with
+  pyhop2.find_cheapest_plan (pyhop2 domains only); if the budget runs
+  out, the answer has the cheapest plan found so far
+- max_nodes, time_limit: the search's pyhop2.Budget, a whole number and a
+  number of seconds, neither negative. The server has limits of its own
+  (--max-nodes and --time-limit, LIMITS by default), which a request
+  can lower but not raise or remove
+- rigid: a list of the state variables that no operator changes (such as
+  the travel domain's "dist"), to be made rigid with pyhop2.rigid
+
+Usage: python plan_server.py [--port n] [--workers n] [--domains d1 d2 ...]
+                             [--max-nodes n] [--time-limit s]
+"""
+
+from __future__ import print_function
+import argparse, contextlib, importlib, io, json, multiprocessing, os, sys, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+
+
+### the domains
+
+# For each domain, the planner it is for ('pyhop' or 'pyhop2') and the
+# modules that declare its operators and methods, in the order in which
+# they are to be imported
+DOMAINS = {'blocks': ('pyhop2', ['blocks_world_operators_p2', 'blocks_world_methods_p2']),
+           'travel': ('pyhop2', ['simple_travel_example_p2']),
+           'office': ('pyhop', ['STAMMER']),
+           'cleaning': ('pyhop', ['Swiffer']),
+           'mail': ('pyhop', ['Demo'])}
+
+PLANNERS = {'pyhop': pyhop, 'pyhop2': pyhop2}
+
+OPTIONS = {'engine', 'frontier', 'plans', 'cheapest', 'max_nodes', 'time_limit', 'rigid'}
+PYHOP_OPTIONS = {'max_nodes', 'time_limit', 'rigid'}
+
+# The most nodes and seconds that the server lets a search take (None for
+# no limit). The workers get the server's limits when they start.
+LIMITS = {'max_nodes': 1000000, 'time_limit': 60.0}
+
+
+### JSON encoding of states, goals and tasks
+
+def encode(value):
+    """Return a version of value that json.dumps can write, for decode to read."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [encode(x) for x in value]
+        if isinstance(value, list):
+            return items
+        return {'__tuple__': items} if isinstance(value, tuple) else {'__set__': items}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith('__') for k in value):
+            return {k: encode(v) for (k, v) in value.items()}
+        return {'__dict__': [[encode(k), encode(v)] for (k, v) in value.items()]}
+    if isinstance(value, pyhop2.Goal):
+        return {'__goal__': encode_state(value)}
+    if isinstance(value, (pyhop2.State, pyhop.State)):
+        return {'__state__': encode_state(value)}
+    return value
+
+def decode(value):
+    """Return the value that encode turned into value."""
+    if isinstance(value, list):
+        return [decode(x) for x in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            ((tag, items),) = value.items()
+            if tag in ('__tuple__', '__set__', '__dict__') and not isinstance(items, list):
+                raise ValueError('{} must be a list, not {}'.format(tag, json.dumps(items)))
+            if tag == '__tuple__':
+                return tuple(decode(x) for x in items)
+            if tag == '__set__':
+                return _hashed(set, (decode(x) for x in items), tag)
+            if tag == '__dict__':
+                if not all(isinstance(item, list) and len(item) == 2 for item in items):
+                    raise ValueError('__dict__ must be a list of [key, value] lists')
+                return _hashed(dict, ((decode(k), decode(v)) for (k, v) in items), tag)
+            if tag == '__goal__':
+                return decode_state(items, pyhop2.Goal)
+            if tag == '__state__':
+                return decode_state(items)
+        return {k: decode(v) for (k, v) in value.items()}
+    return value
+
+def _hashed(cls, items, tag):
+    """Return cls(items), or raise ValueError if the set elements or dict keys in items can't be."""
+    try:
+        return cls(items)
+    except TypeError as e:
+        raise ValueError('{} has a list or an object where it needs a hashable value: {}'.format(
+            tag, e))
+
+def encode_state(state):
+    """Return a JSON object with state's variables, for decode_state to read."""
+    return {name: encode(value) for (name, value) in vars(state).items()}
+
+def decode_state(obj, cls=pyhop2.State):
+    """Return the state (or goal, if cls is pyhop2.Goal) that encode_state turned into obj."""
+    if not isinstance(obj, dict):
+        raise ValueError('a state must be a JSON object, not {}'.format(json.dumps(obj)))
+    state = cls(obj.get('__name__', 'state'))
+    for (name, value) in obj.items():
+        if name != '__name__':
+            setattr(state, name, decode(value))
+    return state
+
+def encode_tasks(tasks):
+    """Return a list of JSON lists for a list of tasks (or a plan)."""
+    return [[encode(x) for x in task] for task in tasks]
+
+def decode_tasks(obj):
+    """Return the list of tasks (or the plan) that encode_tasks turned into obj."""
+    if not isinstance(obj, list) or not all(isinstance(t, list) and t for t in obj):
+        raise ValueError('tasks must be a list of non-empty lists')
+    return [tuple(decode(x) for x in task) for task in obj]
+
+
+### the worker processes
+
+# The Domain of each domain this process loaded, by name
+_domains = {}
+
+def load_domains(names):
+    """
+    Load the domains with these names in this process, each into a Domain
+    of its own: import their modules (again, if they were imported before)
+    while the Domain is the current one.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    for path in [here, os.path.join(here, 'pyhop', 'pyhop2')]:
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # Some of the modules run example problems when they are imported
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in names:
+            (planner, modules) = DOMAINS[name]
+            library = PLANNERS[planner]
+            domain = library.Domain(name)
+            with library.using_domain(domain):
+                for module in modules:
+                    if module in sys.modules:
+                        importlib.reload(sys.modules[module])
+                    else:
+                        importlib.import_module(module)
+            _domains[name] = domain
+
+def _start_worker(names, limits):
+    """Start a worker process: load the domains, and take on the server's limits."""
+    LIMITS.update(limits)
+    load_domains(names)
+
+def check_request(request):
+    """Raise ValueError if request isn't a valid planning request."""
+    if not isinstance(request, dict):
+        raise ValueError('the request must be a JSON object')
+    for key in ['domain', 'state', 'tasks']:
+        if key not in request:
+            raise ValueError('the request has no {}'.format(key))
+    if not isinstance(request['domain'], str):
+        raise ValueError('the domain must be a string')
+    if request['domain'] not in DOMAINS:
+        raise ValueError('unknown domain {}'.format(json.dumps(request['domain'])))
+    if request['domain'] not in _domains:
+        raise ValueError('domain {} is not loaded'.format(request['domain']))
+    options = request.get('options') or {}
+    if not isinstance(options, dict):
+        raise ValueError('options must be a JSON object')
+    allowed = OPTIONS if DOMAINS[request['domain']][0] == 'pyhop2' else PYHOP_OPTIONS
+    for key in options:
+        if key not in allowed:
+            raise ValueError('option {} is not supported for domain {}'.format(
+                key, request['domain']))
+    for (key, names) in [('engine', pyhop2.engines), ('frontier', pyhop2.frontiers)]:
+        if key in options and (not isinstance(options[key], str) or options[key] not in names):
+            raise ValueError('unknown {} {}'.format(key, json.dumps(options[key])))
+    for (key, kinds, least) in [('plans', int, 1), ('max_nodes', int, 0),
+                                ('time_limit', (int, float), 0)]:
+        value = options.get(key, least)
+        if isinstance(value, bool) or not isinstance(value, kinds) or value < least:
+            raise ValueError('{} must be a {} of at least {}, not {}'.format(
+                key, 'whole number' if kinds is int else 'number', least, json.dumps(value)))
+    if not isinstance(options.get('cheapest', False), bool):
+        raise ValueError('cheapest must be true or false')
+    rigid = options.get('rigid', [])
+    if not isinstance(rigid, list) or not all(isinstance(name, str) for name in rigid):
+        raise ValueError('rigid must be a list of variable names')
+
+def read_request(request):
+    """
+    Check a planning request (a dict read from JSON) and decode its state
+    and tasks, and return (state, tasks, budget). Raise ValueError if the
+    request is wrong.
+    """
+    check_request(request)
+    options = request.get('options') or {}
+    state = decode_state(request['state'])
+    tasks = decode_tasks(request['tasks'])
+    for name in options.get('rigid', []):
+        if name not in vars(state) or name == '__name__':
+            raise ValueError('the state has no variable {}'.format(json.dumps(name)))
+        try:
+            setattr(state, name, pyhop2.rigid(getattr(state, name)))
+        except TypeError as e:
+            raise ValueError('variable {} can\'t be rigid: {}'.format(json.dumps(name), e))
+    limits = {}
+    for (key, limit) in LIMITS.items():
+        value = options.get(key)
+        limits[key] = value if limit is None or (value is not None and value < limit) else limit
+    budget = None
+    if any(value is not None for value in limits.values()):
+        budget = pyhop2.Budget(**limits)
+    return (state, tasks, budget)
+
+def plan(request):
+    """
+    Answer a planning request (a dict read from JSON) in this process,
+    and return the answer, a dict to be written as JSON.
+    """
+    return search(request, *read_request(request))
+
+def search(request, state, tasks, budget):
+    """Plan for a request that read_request has read, and return the answer."""
+    options = request.get('options') or {}
+    domain = _domains[request['domain']]
+    answer = {}
+    start = time.perf_counter()
+    if DOMAINS[request['domain']][0] == 'pyhop':
+        result = pyhop.pyhop(state, tasks, budget=budget, domain=domain)
+        plans = [result] if result else []
+    else:
+        stats = pyhop2.SearchStats()
+        engine = options.get('engine', 'copy')
+        if options.get('cheapest'):
+            result = pyhop2.find_cheapest_plan(state, tasks, engine=engine, stats=stats,
+                                               domain=domain, budget=budget)
+            plans = []
+            if result:
+                (cheapest, answer['cost']) = result
+                plans = [cheapest]
+        else:
+            result = pyhop2.multi_pyhop(state, tasks, options.get('plans', 1), engine=engine,
+                                        stats=stats, frontier=options.get('frontier', 'depth-first'),
+                                        budget=budget, domain=domain)
+            plans = result if isinstance(result, list) else result.plans
+        answer['nodes'] = stats.nodes
+    if isinstance(result, pyhop2.BudgetExhausted):
+        answer['status'] = 'gave up'
+        answer['reason'] = result.reason
+    else:
+        answer['status'] = 'found' if plans else 'none'
+    answer['plans'] = [encode_tasks(p) for p in plans]
+    answer['seconds'] = time.perf_counter() - start
+    return answer
+
+def _worker_plan(request):
+    """Run plan in a worker, and return (HTTP status, answer)."""
+    try:
+        problem = read_request(request)
+    except ValueError as e:
+        return (400, {'error': str(e)})
+    # Anything that goes wrong from here on is the server's or the domain's fault
+    try:
+        return (200, search(request, *problem))
+    except Exception as e:
+        return (500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+### the server
+
+class PlanHandler(BaseHTTPRequestHandler):
+    """Handles the requests to a PlanServer."""
+
+    def do_GET(self):
+        if self.path != '/domains':
+            return self.reply(404, {'error': 'no such page {}'.format(self.path)})
+        self.reply(200, {name: DOMAINS[name][0] for name in self.server.domains})
+
+    def do_POST(self):
+        if self.path != '/plan':
+            return self.reply(404, {'error': 'no such page {}'.format(self.path)})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as e:
+            return self.reply(400, {'error': 'the request is not JSON: {}'.format(e)})
+        if isinstance(request, dict) and 'domain' in request:
+            # Answer these here, without waiting for a worker
+            if not isinstance(request['domain'], str):
+                return self.reply(400, {'error': 'the domain must be a string'})
+            if request['domain'] in DOMAINS and request['domain'] not in self.server.domains:
+                return self.reply(400, {'error': 'domain {} is not loaded'.format(request['domain'])})
+        self.reply(*self.server.pool.apply(_worker_plan, (request,)))
+
+    def reply(self, status, answer):
+        body = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class PlanServer(ThreadingHTTPServer):
+    """
+    An HTTP server that answers planning requests with a pool of workers
+    processes, each of which has imported the given domains. Each request
+    is handled in its own thread, which waits for a worker to answer it.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, domains=None, workers=None, verbose=False, limits=None):
+        self.domains = list(domains or DOMAINS)
+        for name in self.domains:
+            if name not in DOMAINS:
+                raise ValueError('unknown domain {}'.format(name))
+        self.verbose = verbose
+        self.pool = multiprocessing.Pool(workers or os.cpu_count(), _start_worker,
+                                         (self.domains, dict(LIMITS, **(limits or {}))))
+        ThreadingHTTPServer.__init__(self, address, PlanHandler)
+
+    def server_close(self):
+        ThreadingHTTPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Serve planning requests on localhost.')
+    parser.add_argument('--port', type=int, default=8765, help='the port (default 8765)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='how many worker processes to plan in (default {})'.format(os.cpu_count()))
+    parser.add_argument('--domains', nargs='+', choices=sorted(DOMAINS), default=sorted(DOMAINS),
+                        help='the domains to load (default all of them)')
+    parser.add_argument('--max-nodes', type=int, default=LIMITS['max_nodes'],
+                        help='the most nodes a search may expand (default {})'.format(
+                            LIMITS['max_nodes']))
+    parser.add_argument('--time-limit', type=float, default=LIMITS['time_limit'],
+                        help='the most seconds a search may take (default {})'.format(
+                            LIMITS['time_limit']))
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+    server = PlanServer(('127.0.0.1', args.port), args.domains, args.workers, args.verbose,
+                        {'max_nodes': args.max_nodes, 'time_limit': args.time_limit})
+    print('serving {} on http://127.0.0.1:{} with {} workers'.format(
+        ', '.join(server.domains), args.port, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
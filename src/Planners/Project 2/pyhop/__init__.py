@@ -33,6 +33,20 @@ Pyhop provides the following classes and functions:
 
 - print_goal(foo) will print the variables and values in the goal foo.
 
+- cow_state(foo) returns a copy-on-write version of the state foo. If it is
+  the initial state, Pyhop copies only the parts of each state that the
+  operators modify, instead of copying the whole state with copy.deepcopy.
+
+- foo.dist = rigid(dist) makes dist a rigid variable of foo: a read-only
+  version of dist that the copies of foo share instead of copying. Use it
+  for facts that no operator changes, such as maps and distance tables.
+
+- compact_state(foo, schema) returns a version of the state foo that takes
+  much less memory and is much cheaper to copy. schema is a Schema that
+  declares foo's variables; for the blocks world, it could be
+  Schema(pos=(blocks, blocks+['table','hand']), clear=(blocks, [True,False]),
+  holding=None). schema.state('foo') makes an empty one.
+
 - declare_operators(o1, o2, ..., ok) tells Pyhop that o1, o2, ..., ok
   are all of the planning operators; this supersedes any previous call
   to declare_operators.
@@ -55,6 +69,41 @@ Pyhop provides the following classes and functions:
 - if verbose = 1, it prints the initial parameters and the answer;
 - if verbose = 2, it also prints a message on each recursive call;
 - if verbose = 3, it also prints info about what it's computing.
+
+- pyhop also takes an optional 'trace' argument: a PlanTracer from pyhop2,
+  which writes structured events about the search to a file instead of
+  printing them (see PlanTracer and read_trace in pyhop2).
+
+- pyhop also takes an optional 'budget' argument: a Budget from pyhop2,
+  which limits the nodes the search may expand, the time it may take and
+  the depth of its stack, and can cancel it from outside. If the search
+  runs out of budget, pyhop returns a BudgetExhausted, which is false.
+
+- Domain('foo') makes a domain with operators and methods of its own,
+  which foo.declare_operators(...) and foo.declare_methods(...) declare,
+  and pyhop takes an optional 'domain' argument. Without one, it uses the
+  current domain, as declare_operators and declare_methods do:
+  default_domain, or d inside a "with using_domain(d):" statement, which
+  is how to load a module that calls them into a domain of its own.
+
+- pyhop also takes an optional 'nogoods' argument: a NogoodTable from
+  pyhop2, in which it remembers the states and tasks for which it found no
+  plan, so that it doesn't search for one again when they come up again,
+  in the same search or a later one in the same domain.
+
+- search_scratch(), called from a method or an operator, returns a dict
+  in which it can keep things for the rest of the search, as in pyhop2.
+
+- pyhop2_cache.PlanCache('plans.db').pyhop(state, tasks, planner=pyhop,
+  domain=current_domain()) returns what pyhop returns, from a file of the
+  plans it found before (and the problems for which it found none) if the
+  problem is there.
+
+Those of these that come from pyhop2 (cow_state, rigid, compact_state,
+Schema, PlanTracer, read_trace, Budget, BudgetExhausted, NogoodTable and
+search_scratch) are pyhop2's own: importing pyhop appends the directory
+pyhop/pyhop2 to sys.path, if it isn't there, and imports pyhop2 from it,
+so pyhop.Budget is pyhop2.Budget, for instance.
 """
 
 # Pyhop's planning algorithm is very similar to the one in SHOP and JSHOP
@@ -96,7 +145,30 @@ Pyhop provides the following classes and functions:
 
 
 from __future__ import print_function
-import copy,sys, pprint
+import os, sys, contextlib
+
+# pyhop2's examples and tools import it as the top-level module pyhop2, so
+# import it that way too, rather than as pyhop.pyhop2.pyhop2, which would
+# load the same file as a second module with classes of its own
+_PYHOP2_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyhop2')
+if _PYHOP2_DIR not in sys.path:
+    sys.path.append(_PYHOP2_DIR)
+
+from pyhop2 import cow_state, copy_state, push_tasks, task_list
+from pyhop2 import Schema, compact_state
+from pyhop2 import PlanTracer, read_trace, state_diff
+from pyhop2 import Budget, BudgetExhausted
+from pyhop2 import Domain
+from pyhop2 import NogoodTable, search_scratch, _scratch
+from pyhop2 import rigid
+
+__all__ = ['State', 'Goal', 'print_state', 'print_goal', 'forall', 'find_if',
+           'cow_state', 'rigid', 'Schema', 'compact_state',
+           'Domain', 'default_domain', 'current_domain', 'using_domain',
+           'operators', 'methods', 'declare_operators', 'declare_methods',
+           'print_operators', 'print_methods', 'pyhop', 'seek_plan',
+           'PlanTracer', 'read_trace', 'Budget', 'BudgetExhausted', 'NogoodTable',
+           'search_scratch']
 
 ############################################################
 # States and goals
@@ -152,19 +224,47 @@ def find_if(cond,seq):
         if cond(x): return x
     return None
 
+############################################################
+# Domains (see Domain in pyhop2)
+
+default_domain = Domain('default')
+
+# The domains that with statements made current; see using_domain
+_domains = []
+
+# The table entry for a task that has neither an operator nor methods
+_UNKNOWN = (None, None)
+
+def current_domain():
+    """Return the domain that pyhop and the declare_ functions use by default."""
+    return _domains[-1] if _domains else default_domain
+
+@contextlib.contextmanager
+def using_domain(domain):
+    """
+    Make domain the current domain in the with statement's body, so that
+    declare_operators and declare_methods change it, and pyhop searches
+    in it when it isn't given a domain.
+    """
+    _domains.append(domain)
+    try:
+        yield domain
+    finally:
+        _domains.remove(domain)
+
 ############################################################
 # Commands to tell Pyhop what the operators and methods are
 
-operators = {}
-methods = {}
+# The default domain's tables
+operators = default_domain.operators
+methods = default_domain.methods
 
 def declare_operators(*op_list):
     """
     Call this after defining the operators, to tell Pyhop what they are. 
     op_list must be a list of functions, not strings.
     """
-    operators.update({op.__name__:op for op in op_list})
-    return operators
+    return current_domain().declare_operators(*op_list)
 
 def declare_methods(task_name,*method_list):
     """
@@ -172,8 +272,7 @@ def declare_methods(task_name,*method_list):
     task_name must be a string.
     method_list must be a list of functions, not strings.
     """
-    methods.update({task_name:list(method_list)})
-    return methods[task_name]
+    return current_domain().declare_methods(task_name, *method_list)
 
 ############################################################
 # Commands to find out what the operators and methods are
@@ -191,50 +290,125 @@ def print_methods(mlist=methods):
 ############################################################
 # The actual planner
 
-def pyhop(state,tasks,verbose=0):
+def pyhop(state,tasks,verbose=0,trace=None,budget=None,domain=None,nogoods=None):
     """
     Try to find a plan that accomplishes tasks in state. 
     If successful, return the plan. Otherwise return False.
+    If trace is a PlanTracer, it records the search's events, and if
+    budget is a Budget and the search runs out of it, return a
+    BudgetExhausted. domain is the Domain to search in, by default the
+    current domain (see using_domain). If nogoods is a NogoodTable, the
+    search skips the states and tasks that it knows fail, and adds the
+    ones that it finds fail.
     """
     if verbose>0: print('** pyhop, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
-    result = seek_plan(state,tasks,[],0,verbose)
+    result = seek_plan(state,tasks,[],0,verbose,trace,budget,domain,nogoods)
     if verbose>0: print('** result =',result,'\n')
     return result
 
-def seek_plan(state,tasks,plan,depth,verbose=0):
+def seek_plan(state,tasks,plan,depth,verbose=0,trace=None,budget=None,domain=None,
+              nogoods=None):
     """
     Workhorse for pyhop. state and tasks are as in pyhop.
     - plan is the current partial plan.
     - depth is the recursion depth, for use in debugging
     - verbose is whether to print debugging messages
+    - trace is None, or a PlanTracer to record the search's events
+    - budget is None, or a Budget for the search. Its max_frontier limits
+      the depth of the stack below. If the search runs out of budget,
+      seek_plan returns a BudgetExhausted.
+    - domain is None, or the Domain to search in
+    - nogoods is None, or a NogoodTable of the states and tasks that fail
+    The search is recursive, but seek_plan doesn't call itself: it keeps
+    an explicit stack of _seek_plan_steps generators instead, so the length
+    of a plan isn't limited by Python's recursion limit. The methods and
+    operators it calls get a search_scratch of their own.
+    """
+    meter = budget.start() if budget is not None else None
+    table = (domain if domain is not None else current_domain()).table
+    stack = [_seek_plan_steps(state,push_tasks(tasks,()),list(plan),depth,verbose,trace,table,
+                              nogoods)]
+    solution = None
+    token = _scratch.set({})
+    try:
+        while stack:
+            try:
+                call = stack[-1].send(solution)
+            except StopIteration as e:
+                stack.pop()
+                solution = e.value
+            else:
+                if meter is not None:
+                    exhausted = meter.spend(len(stack))
+                    if exhausted is not None:
+                        return exhausted
+                stack.append(_seek_plan_steps(*call))
+                solution = None
+    finally:
+        _scratch.reset(token)
+    return solution
+
+def _seek_plan_steps(state,tasks,plan,depth,verbose,trace,table,nogoods):
+    """
+    One level of seek_plan's search, as a generator. To make a recursive
+    call, it yields the call's arguments, and seek_plan sends back the
+    result. plan is a single list shared by all of the levels: a level
+    appends its action before the recursive call, and removes it again
+    if the call fails. tasks is a task stack (see push_tasks), so that the
+    levels share their tasks instead of copying them. table is the
+    domain's table of operators and methods.
+    Since this search doesn't prune cycles, a level that returns False
+    has searched all of its subtree, so it can add it to nogoods.
     """
-    if verbose>1: print('depth {} tasks {}'.format(depth,tasks))
-    if tasks == []:
+    if trace is not None:
+        trace.expand(depth, tasks[0] if tasks else None)
+    if verbose>1: print('depth {} tasks {}'.format(depth,task_list(tasks)))
+    if tasks == ():
         if verbose>2: print('depth {} returns plan {}'.format(depth,plan))
-        return plan
+        if trace is not None:
+            trace.solution(depth, plan)
+        return list(plan)
+    if nogoods is not None:
+        key = nogoods.key(state, tasks)
+        if nogoods.lookup(key):
+            if verbose>2: print('depth {} returns known failure'.format(depth))
+            return False
     task1 = tasks[0]
-    if task1[0] in operators:
+    (operator, relevant) = table.get(task1[0], _UNKNOWN)
+    if operator is not None:
         if verbose>2: print('depth {} action {}'.format(depth,task1))
-        operator = operators[task1[0]]
-        newstate = operator(copy.deepcopy(state),*task1[1:])
+        newstate = operator(copy_state(state),*task1[1:])
         if verbose>2:
             print('depth {} new state:'.format(depth))
             print_state(newstate)
         if newstate:
-            solution = seek_plan(newstate,tasks[1:],plan+[task1],depth+1,verbose)
+            if trace is not None:
+                trace.apply(depth, task1, state_diff(state, newstate))
+            plan.append(task1)
+            solution = yield (newstate,tasks[1],plan,depth+1,verbose,trace,table,nogoods)
             if solution != False:
                 return solution
-    if task1[0] in methods:
+            plan.pop()
+        elif trace is not None:
+            trace.fail(depth, task1, 'operator')
+    if relevant is not None:
         if verbose>2: print('depth {} method instance {}'.format(depth,task1))
-        relevant = methods[task1[0]]
+        expanded = False
         for method in relevant:
             subtasks = method(state,*task1[1:])
             # Can't just say "if subtasks:", because that's wrong if subtasks == []
             if verbose>2:
                 print('depth {} new tasks: {}'.format(depth,subtasks))
             if subtasks != False:
-                solution = seek_plan(state,subtasks+tasks[1:],plan,depth+1,verbose)
+                expanded = True
+                solution = yield (state,push_tasks(subtasks,tasks[1]),plan,depth+1,verbose,trace,table,nogoods)
                 if solution != False:
                     return solution
+        if not expanded and trace is not None:
+            trace.fail(depth, task1, 'method')
+    elif operator is None and trace is not None:
+        trace.fail(depth, task1, 'unknown')
     if verbose>2: print('depth {} returns failure'.format(depth))
+    if nogoods is not None:
+        nogoods.add(key)
     return False
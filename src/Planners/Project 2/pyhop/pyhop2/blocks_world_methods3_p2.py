@@ -5,6 +5,7 @@ This file should work correctly in both Python 2.7 and Python 3.2.
 """
 
 import pyhop2
+from blocks_world_status_p2 import block_statuses
 
 
 """
@@ -48,19 +49,23 @@ def moveb_m(state,goal):
     block that needs to be moved and can be moved to the table, then 
     do so and call move_blocks recursively. Otherwise, no blocks need
     to be moved.
+    The statuses of the blocks come from block_statuses, which gives the
+    same answers as status() but updates them incrementally, and which
+    we tell which blocks the next state will have moved.
     """
-    for b1 in all_blocks(state):
-        s = status(b1,state,goal)
-        if s == 'move-to-table':
+    statuses = block_statuses(state,goal)
+    b1 = statuses.first('move-to-table','move-to-block')
+    if b1 != None:
+        statuses.moving(b1)
+        if statuses.status[b1] == 'move-to-table':
             return [[('move_one',b1,'table'),('move_blocks',goal)]]
-        elif s == 'move-to-block':
-            return [[('move_one',b1,goal.pos[b1]), ('move_blocks',goal)]]
         else:
-            continue
+            return [[('move_one',b1,goal.pos[b1]), ('move_blocks',goal)]]
     #
     # if we get here, no blocks can be moved to their final locations
-    waiting_blocks = [b for b in all_blocks(state) if status(b, state, goal) == 'waiting']
+    waiting_blocks = statuses.in_order('waiting')
     if waiting_blocks != []:
+        statuses.moving(*waiting_blocks)
         return [[('move_one', b, 'table'), ('move_blocks', goal)] for b in waiting_blocks]
 
     #
@@ -0,0 +1,221 @@
+"""
+Incrementally maintained block statuses for the blocks-world methods.
+
+moveb_m needs the status (see status() in blocks_world_methods_p2) of
+every block, and computing them from scratch takes O(n * tower height)
+time at every decomposition step. block_statuses(state, goal) instead
+keeps the statuses for each goal in the search's scratch space (see
+pyhop2.search_scratch), so that each search has its own, along with a
+copy of the pos and clear variables of the last state it was given. When
+it is given another state of the same search, it finds the blocks whose
+pos or clear changed, and recomputes only the statuses that can have
+changed: those of those blocks, of the blocks above them, and of the
+blocks whose goal position is one of those.
+
+Finding what changed would mean comparing every block's pos and clear,
+so moveb_m tells the statuses which blocks it is about to move (see
+BlockStatuses.moving). The next state usually differs from the last one
+only in those blocks and the ones they were on and are put on, which the
+statuses check against the fingerprints of pos and clear (see
+pyhop2.fingerprint); if they don't match, as after a backtrack, the
+statuses compare every block after all. The fingerprints of cow,
+trail and compact states are kept up to date as they change, but a plain
+dict's would take as long as the comparison, so with plain states the
+statuses always compare every block. A search's statuses aren't safe to
+use from several threads at once, and a goal mustn't change during a
+search that uses it.
+"""
+
+from functools import reduce
+from operator import xor
+import pyhop2
+
+def block_statuses(state, goal):
+    """
+    Return the BlockStatuses for goal, brought up to date with state.
+    Outside of a search, they are computed from scratch.
+    """
+    scratch = pyhop2.search_scratch()
+    if scratch is None:
+        return BlockStatuses(state, goal)
+    caches = scratch.get(block_statuses)
+    if caches is None:
+        caches = scratch[block_statuses] = {}
+    # The search's tasks keep goal alive, so its id isn't reused
+    statuses = caches.get(id(goal))
+    if statuses is None:
+        statuses = caches[id(goal)] = BlockStatuses(state, goal)
+    else:
+        statuses.update(state)
+    return statuses
+
+class BlockStatuses(object):
+    """
+    The statuses of the blocks in a state, for one goal. status[b] is
+    b's status, and blocks[s] is the set of blocks whose status is s.
+    """
+    STATUSES = ('done', 'inaccessible', 'move-to-table', 'move-to-block', 'waiting')
+
+    def __init__(self, state, goal):
+        self.goal = goal
+        self.rebuild(state)
+
+    def rebuild(self, state):
+        """Compute all of the statuses from scratch."""
+        goal_pos = self.goal.pos
+        self.goal_pos = dict(goal_pos)
+        self.wanted_on = {}
+        for (b, dest) in goal_pos.items():
+            self.wanted_on.setdefault(dest, []).append(b)
+        self.keys = tuple(state.clear)
+        self.order = {b: i for (i, b) in enumerate(self.keys)}
+        self.pos = dict(state.pos)
+        self.clear = dict(state.clear)
+        self.pos_hash = reduce(xor, map(hash, self.pos.items()), 0)
+        self.clear_hash = reduce(xor, map(hash, self.clear.items()), 0)
+        self.hints = ()
+        self.above = {}
+        for (b, below) in self.pos.items():
+            if below != 'table' and below != 'hand':
+                self.above[below] = b
+        self.done = {}
+        self.status = {}
+        self.blocks = {s: set() for s in self.STATUSES}
+        for b in self.order:
+            self._set_status(b)
+
+    def moving(self, *blocks):
+        """
+        Tell the statuses that the next state they are given is likely to
+        be this one with one of blocks moved, so that update can look at
+        those first.
+        """
+        self.hints = blocks
+
+    def update(self, state):
+        """Bring the statuses up to date with state."""
+        pos = state.pos
+        clear = state.clear
+        changes = self._hinted_changes(pos, clear)
+        if changes is not None:
+            (moved, cleared) = changes
+        else:
+            moved = [b for (b, _) in pos.items() ^ self.pos.items()]
+            cleared = [b for (b, _) in clear.items() ^ self.clear.items()]
+        if not moved and not cleared:
+            return
+        for b in moved + cleared:
+            if b not in self.order or b not in pos or b not in clear:
+                # state doesn't have the same blocks
+                self.rebuild(state)
+                return
+        above = self.above
+        for b in moved:
+            below = self.pos.get(b)
+            if above.get(below) == b:
+                del above[below]
+        for b in moved:
+            self.pos_hash ^= hash((b, self.pos[b]))
+            below = self.pos[b] = pos[b]
+            self.pos_hash ^= hash((b, below))
+            if below != 'table' and below != 'hand':
+                above[below] = b
+        for b in cleared:
+            self.clear_hash ^= hash((b, self.clear[b])) ^ hash((b, clear[b]))
+            self.clear[b] = clear[b]
+        # a block's done-ness depends on the positions of the blocks in
+        # its tower from it down, so it can change only if it or a block
+        # below it moved
+        redone = set()
+        for b in moved:
+            while b is not None and b not in redone:
+                redone.add(b)
+                self.done.pop(b, None)
+                b = above.get(b)
+        changed = redone.union(cleared)
+        for b in list(changed):
+            changed.update(self.wanted_on.get(b, ()))
+        for b in changed:
+            if b in self.order:
+                self._set_status(b)
+
+    def _hinted_changes(self, pos, clear):
+        """
+        Return (moved, cleared), the blocks whose pos and clear differ in
+        pos and clear from the last state, if only the hinted blocks and
+        the blocks they were and are on can have changed; otherwise None.
+        """
+        pos_fingerprint = getattr(type(pos), '_fingerprint', None)
+        clear_fingerprint = getattr(type(clear), '_fingerprint', None)
+        if pos_fingerprint is None or clear_fingerprint is None:
+            return None
+        old_pos = self.pos
+        old_clear = self.clear
+        pos_hash = self.pos_hash
+        clear_hash = self.clear_hash
+        moved = []
+        cleared = []
+        try:
+            for b in self.hints:
+                if b in old_pos and pos[b] != old_pos[b]:
+                    moved.append(b)
+                    pos_hash ^= hash((b, old_pos[b])) ^ hash((b, pos[b]))
+            for x in set(moved + [old_pos[b] for b in moved] + [pos[b] for b in moved]):
+                if x in old_clear and clear[x] != old_clear[x]:
+                    cleared.append(x)
+                    clear_hash ^= hash((x, old_clear[x])) ^ hash((x, clear[x]))
+        except KeyError:
+            # state doesn't have the same blocks
+            return None
+        if pos_hash != pos_fingerprint(pos) or clear_hash != clear_fingerprint(clear):
+            return None
+        return (moved, cleared)
+
+    def _is_done(self, b):
+        """Same as is_done(b, state, goal), but remembering the answers."""
+        done = self.done
+        pos = self.pos
+        goal_pos = self.goal_pos
+        path = []
+        while b != 'table' and b != 'hand' and b not in done:
+            if b in goal_pos and goal_pos[b] != pos[b]:
+                done[b] = False
+                break
+            path.append(b)
+            b = pos[b]
+        # a block in the hand isn't done
+        result = b == 'table' or (b != 'hand' and done[b])
+        for x in path:
+            done[x] = result
+        return result
+
+    def _set_status(self, b):
+        goal_pos = self.goal_pos
+        if self._is_done(b):
+            s = 'done'
+        elif not self.clear[b]:
+            s = 'inaccessible'
+        elif not (b in goal_pos) or goal_pos[b] == 'table':
+            s = 'move-to-table'
+        elif self._is_done(goal_pos[b]) and self.clear[goal_pos[b]]:
+            s = 'move-to-block'
+        else:
+            s = 'waiting'
+        old = self.status.get(b)
+        if old != s:
+            if old is not None:
+                self.blocks[old].discard(b)
+            self.blocks[s].add(b)
+            self.status[b] = s
+
+    def first(self, *statuses):
+        """
+        Return the first block (in the order of all_blocks) whose status
+        is one of statuses, or None if there isn't one.
+        """
+        candidates = [b for s in statuses for b in self.blocks[s]]
+        return min(candidates, key=self.order.__getitem__) if candidates else None
+
+    def in_order(self, s):
+        """Return the blocks whose status is s, in the order of all_blocks."""
+        return sorted(self.blocks[s], key=self.order.__getitem__)
@@ -33,6 +33,26 @@ Pyhop provides the following classes and functions:
 
 - print_goal(foo) will print the variables and values in the goal foo.
 
+- cow_state(foo) returns a copy-on-write version of the state foo. If it is
+  the initial state, Pyhop copies only the parts of each state that the
+  operators modify, instead of copying the whole state with copy.deepcopy.
+
+- compact_state(foo, schema) returns a version of the state foo that takes
+  much less memory and is much cheaper to copy. schema is a Schema that
+  declares foo's variables; for the blocks world, it could be
+  Schema(pos=(blocks, blocks+['table','hand']), clear=(blocks, [True,False]),
+  holding=None). schema.state('foo') makes an empty one.
+
+- fingerprint(foo) returns a hash of the variables and values in the state
+  foo. Pyhop uses fingerprints to notice when a plan would revisit a state.
+
+- foo.dist = rigid(dist) makes dist a rigid variable of foo: a read-only
+  version of dist (with read-only versions of its dicts, lists and sets)
+  that all of the states copied from foo share instead of copying, and
+  that fingerprints leave out. Use it for facts that no operator changes,
+  such as maps and distance tables, so that the cost of expanding a node
+  doesn't depend on their size. Operators mustn't assign to the variable.
+
 - declare_operators(o1, o2, ..., ok) tells Pyhop that o1, o2, ..., ok
   are all of the planning operators; this supersedes any previous call
   to declare_operators.
@@ -42,6 +62,9 @@ Pyhop provides the following classes and functions:
 - declare_methods('foo', m1, m2, ..., mk) tells Pyhop that m1, m2, ..., mk
   are all of the methods for tasks having 'foo' as their taskname; this
   supersedes any previous call to declare_methods('foo', ...).
+  A method returns a list of alternative subtask lists, which the search
+  tries last one first, or a generator of them, which the search tries in
+  the order it generates them, running it only as it needs the next one.
 
 - print_methods() will print out a list of all declared methods.
 
@@ -55,6 +78,90 @@ Pyhop provides the following classes and functions:
 - if verbose = 1, it prints the initial parameters and the answer;
 - if verbose = 2, it also prints a message on each recursive call;
 - if verbose = 3, it also prints info about what it's computing.
+
+- pyhop and multi_pyhop also take an optional 'engine' argument that names
+  the search engine to use: 'copy' (the default) gives every search node
+  its own copy of the state, and 'trail' has the operators modify a single
+  state and undoes their changes when it backtracks. Both engines find the
+  same plans, but 'trail' needs operators to return the state they were
+  given, and state variables whose values are dicts, lists, sets or
+  immutable values.
+
+- pyhop and multi_pyhop also take an optional 'stats' argument: a
+  SearchStats, which counts the nodes expanded, operator applications,
+  method calls, cycles pruned, etc., and can call hooks of your own.
+
+- pyhop and multi_pyhop also take an optional 'trace' argument: a
+  PlanTracer, which writes structured events (nodes expanded, actions
+  applied with the changes they made to the state, failures, cycles
+  pruned and solutions) to a JSON Lines or binary file, as a cheaper and
+  more useful alternative to verbose=3. read_trace(path) reads them back,
+  and read_trace.py filters and summarizes them.
+
+- iter_plans(state1,tasklist) is a generator that yields the plans for
+  tasklist one at a time, as the search finds them, so you can stop
+  whenever you like; multi_pyhop(state1,tasklist,n) returns the first n.
+  iter_plan_nodes is the same, but yields search nodes (see below).
+
+- declare_cost('foo', c) tells Pyhop that applying the operator foo costs
+  c, where c is a number or a function called like foo that returns one.
+  find_cheapest_plan(state1,tasklist) finds a plan whose actions cost the
+  least in total, by branch and bound, and returns (plan, cost). It takes
+  an optional time_limit in seconds, after which it returns the cheapest
+  plan found so far, and the frontier, budget and nogoods arguments that
+  pyhop takes; iter_cheaper_plans generates each plan it finds that is
+  cheaper than the last.
+
+- pyhop, multi_pyhop and iter_plans also take an optional 'frontier'
+  argument that names the order in which the search expands nodes:
+  'depth-first' (the default), 'breadth-first', or 'greedy' or
+  'best-first', which also need a 'heuristic' argument: a function
+  h(state, tasks, plan) that estimates how many actions a node with those
+  remaining tasks and partial plan still needs.
+
+- pyhop and multi_pyhop also take an optional 'budget' argument: a Budget,
+  which limits the nodes a search may expand, the time it may take, and
+  the size of its frontier, and can cancel it from outside. If the search
+  runs out of budget, they return a BudgetExhausted, which is false and
+  tells why the search stopped, and which plans it had found.
+
+- Domain('foo') makes a domain with operators, methods and costs of its
+  own, which foo.declare_operators(...), foo.declare_methods(...) and
+  foo.declare_cost(...) declare, and the planners take an optional
+  'domain' argument. Without one, they use the current domain, as the
+  declare_ functions do: default_domain, or d inside a
+  "with using_domain(d):" statement, which is how to load a module that
+  calls the declare_ functions into a domain of its own.
+
+- The planners also take an optional 'nogoods' argument: a NogoodTable,
+  in which they remember the states and task stacks whose subtrees they
+  searched without finding a plan, and skip them when they come up again,
+  in the same search or in later ones in the same domain. Its hit_rate()
+  tells how often that happened.
+
+- The module pyhop2_async has asyncio versions of pyhop, multi_pyhop and
+  iter_plans, which let the event loop run other tasks every so often
+  while they search, and which stop when they are cancelled.
+
+- The module pyhop2_parallel enumerates plans on a pool of worker
+  processes, sharing out the parts of the search tree as workers become
+  free; it finds the same plans, in the same order, as iter_plans. Its
+  plan_batch(domain, problems) plans for many independent problems on a
+  pool, and keeps each problem's exceptions and time limit to itself.
+
+- The module pyhop2_cache has PlanCache, which keeps the plans that pyhop
+  (or another planner) finds, and the problems for which it finds none,
+  in a file, keyed by a hash of the state, the tasks and the code of the
+  domain, and returns them when the same problem comes up again.
+
+- search_scratch(), called from a method or an operator, returns a dict
+  that belongs to the search that called it, for caches that are only
+  good for one search.
+
+- find_first_node(state1,tasklist) searches like pyhop, but returns the
+  search node that completes the plan, or False. Its plan attribute is the
+  plan, and its decomposition() method returns the HTN decomposition tree
+  that produced the plan.
 """
 
 # Pyhop's planning algorithm is very similar to the one in SHOP and JSHOP
@@ -96,8 +203,34 @@ Pyhop provides the following classes and functions:
 
 
 from __future__ import print_function
-import copy,sys, pprint
-from collections import deque
+import copy,sys, os, pprint, time, json, pickle, weakref, heapq, contextlib, contextvars
+from array import array
+from collections import deque, Counter, OrderedDict
+from functools import reduce
+from itertools import compress, islice, count
+from operator import index as _as_index, is_ as _is, xor
+try:
+    from collections.abc import MutableMapping, ItemsView, Iterator
+except ImportError:
+    from collections import MutableMapping, ItemsView, Iterator
+
+# What "from pyhop2 import *" gives, which the example files use
+__all__ = ['AutoRepr', 'State', 'Goal', 'print_state', 'print_goal', 'forall', 'find_if',
+           'CowDict', 'CowState', 'cow_state', 'copy_state',
+           'RigidDict', 'RigidTuple', 'RigidSet', 'rigid', 'fingerprint',
+           'ArrayDict', 'CompactState', 'Schema', 'compact_state',
+           'TrailDict', 'TrailList', 'TrailSet', 'TrailState',
+           'Domain', 'default_domain', 'current_domain', 'using_domain',
+           'operators', 'methods', 'costs', 'declare_operators', 'declare_methods',
+           'declare_cost', 'action_cost', 'print_operators', 'print_methods',
+           'SearchStats', 'state_diff', 'PlanTracer', 'read_trace',
+           'Budget', 'BudgetExhausted', 'NogoodTable', 'search_scratch',
+           'pyhop', 'find_first_plan', 'find_first_node', 'multi_pyhop', 'find_n_plans',
+           'iter_plans', 'iter_plan_nodes', 'iter_search_steps',
+           'find_cheapest_plan', 'iter_cheaper_plans', 'iter_cheaper_plan_nodes',
+           'Ancestry', 'push_tasks', 'task_list', 'Expansion', 'PlannerStep',
+           'TrailPlannerStep', 'engines',
+           'DepthFirst', 'BreadthFirst', 'GreedyBestFirst', 'BestFirst', 'frontiers']
 
 ############################################################
 # States and goals
@@ -118,6 +251,1058 @@ class Goal(AutoRepr):
     def __init__(self,name):
         self.__name__ = name
 
+############################################################
+# Copy-on-write states
+#
+# The planners copy the state before every operator application, and
+# copy.deepcopy dominates the running time on large states. A CowState
+# shares its variables with the state it was copied from, and a variable
+# is only copied the first time it is read through the new state. Dict
+# variables are CowDicts, which copy just the entries that get written.
+
+# Values of these types are never copied, since nobody can modify them.
+_ATOMIC = frozenset([type(None), bool, int, float, complex, str, bytes,
+                     tuple, frozenset])
+
+_MISSING = object()
+_DELETED = object()
+
+def _fork_value(value):
+    """Return a private copy of value that can be modified freely."""
+    if type(value) is CowDict:
+        return value._fork()
+    elif type(value) is dict:
+        return CowDict(value)
+    elif type(value) is list:
+        return list(value)
+    elif type(value) is set:
+        return set(value)
+    else:
+        return copy.deepcopy(value)
+
+class CowDict(MutableMapping):
+    """
+    A dict that can be copied in constant time. Entries live in _base,
+    which is shared with other CowDicts and never modified, and in
+    _delta, which holds this copy's changes (_DELETED marks a deleted
+    entry). When _delta grows past about sqrt(len(_base)) entries, it is
+    merged into a new _base, so copying and writing stay cheap no matter
+    how big the dict is. Iteration order is the same as a plain dict's.
+    """
+    __slots__ = ('_base', '_delta', '_shared', '_owned', '_len', '_limit',
+                 '_hash', '_nested')
+
+    def __init__(self, data=()):
+        base = {}
+        for (key, value) in dict(data).items():
+            base[key] = CowDict(value) if type(value) is dict else value
+        self._reset(base)
+        self._owned = {k for (k, v) in base.items() if type(v) not in _UNCOPIED}
+        self._hash = 0
+        self._nested = frozenset()
+        for (key, value) in base.items():
+            self._rehash(key, _MISSING, value)
+
+    def _reset(self, base):
+        self._base = base
+        self._delta = {}
+        self._shared = False
+        self._len = len(base)
+        self._limit = 8 + int(len(base) ** 0.5)
+
+    def _fork(self):
+        """Return a copy of self; both copies share all of their entries."""
+        other = CowDict.__new__(CowDict)
+        other._base = self._base
+        other._delta = self._delta
+        other._shared = self._shared = True
+        other._owned = set()
+        other._len = self._len
+        other._limit = self._limit
+        other._hash = self._hash
+        other._nested = self._nested
+        return other
+
+    def _compact(self):
+        """Merge _delta into a new _base."""
+        owned = self._owned
+        self._reset(self._plain())
+        self._owned = owned
+
+    def _rehash(self, key, old, new):
+        """Update the hash after the value of key changes from old to new."""
+        if old is not _MISSING:
+            h = _atomic_hash(key, old)
+            if h is not None:
+                self._hash ^= h
+            else:
+                self._nested = self._nested - {key}
+        if new is not _MISSING:
+            h = _atomic_hash(key, new)
+            if h is not None:
+                self._hash ^= h
+            else:
+                self._nested = self._nested | {key}
+
+    def _get(self, key):
+        """Return the value of key, without copying it."""
+        value = self._delta.get(key, _MISSING)
+        if value is _MISSING:
+            return self._base[key]
+        elif value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def _fingerprint(self):
+        h = self._hash
+        for key in self._nested:
+            h ^= _entry_hash(key, self._get(key))
+        return h
+
+    def _plain(self):
+        """Return a plain dict with the same entries, without copying the values."""
+        delta = self._delta
+        plain = dict(self._base)
+        if delta:
+            for (key, value) in delta.items():
+                if value is _DELETED:
+                    del plain[key]
+                else:
+                    plain[key] = value
+        return plain
+
+    def __getitem__(self, key):
+        value = self._delta.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._base[key]
+        elif value is _DELETED:
+            raise KeyError(key)
+        if type(value) in _UNCOPIED or key in self._owned:
+            return value
+        # the value may be shared with other copies, so take a private
+        # copy before anyone can modify it through us
+        value = _fork_value(value)
+        self[key] = value
+        self._owned.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self._shared:
+            self._delta = dict(self._delta)
+            self._shared = False
+        delta = self._delta
+        old = delta.get(key, _MISSING)
+        if old is _DELETED:
+            # a re-inserted key goes at the end, as in a plain dict
+            self._compact()
+            delta = self._delta
+            old = _MISSING
+        elif old is _MISSING:
+            old = self._base.get(key, _MISSING)
+        if old is _MISSING:
+            self._len += 1
+        delta[key] = value
+        self._rehash(key, old, value)
+        self._owned.discard(key)
+        if len(delta) > self._limit:
+            self._compact()
+
+    def __delitem__(self, key):
+        self._rehash(key, self._get(key), _MISSING)
+        if self._shared:
+            self._delta = dict(self._delta)
+            self._shared = False
+        if key in self._base:
+            self._delta[key] = _DELETED
+        else:
+            del self._delta[key]
+        self._owned.discard(key)
+        self._len -= 1
+
+    def __contains__(self, key):
+        value = self._delta.get(key, _MISSING)
+        if value is _MISSING:
+            return key in self._base
+        return value is not _DELETED
+
+    def __iter__(self):
+        if self._delta:
+            return iter(self._plain())
+        return iter(self._base)
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        if self._nested:
+            return ItemsView(self)
+        # no value needs to be copied before it is read, so the items of
+        # a plain dict (which are fast to iterate and compare) will do
+        return self._plain().items()
+
+    def __repr__(self):
+        return repr(self._plain())
+
+    def copy(self):
+        return self._fork()
+
+    def __deepcopy__(self, memo):
+        return self._fork()
+
+    def __reduce__(self):
+        return (CowDict, (self._plain(),))
+
+class CowState(State):
+    """
+    A state whose copies share variables with it until they are read.
+    Operators modify a CowState the same way as an ordinary State.
+    """
+    __slots__ = ('_cow_shared',)
+
+    def __init__(self, name):
+        State.__init__(self, name)
+        self._cow_shared = set()
+
+    def __getattribute__(self, name):
+        shared = _cow_shared_of(self)
+        if shared and name in shared:
+            shared.discard(name)
+            value = _fork_value(self.__dict__[name])
+            self.__dict__[name] = value
+            return value
+        return object.__getattribute__(self, name)
+
+    def _fork(self):
+        """
+        Return a copy of self that shares all of its variables. Afterwards
+        each of the two copies takes a private copy of a shared variable
+        the first time it reads that variable.
+        """
+        variables = self.__dict__
+        other = object.__new__(type(self))
+        other._cow_shared = None
+        other.__dict__.update(variables)
+        shared = {n for (n, v) in variables.items() if type(v) not in _UNCOPIED}
+        other._cow_shared = shared
+        self._cow_shared = set(shared)
+        return other
+
+    def __deepcopy__(self, memo):
+        return self._fork()
+
+    def __reduce__(self):
+        return (cow_state, (_plain_state(self),))
+
+_cow_shared_of = CowState._cow_shared.__get__
+
+def _plain_state(state):
+    """Return an ordinary State with the same variables as state."""
+    plain = State(state.__name__)
+    for (name, value) in vars(state).items():
+        if type(value) is CowDict:
+            value = value._plain()
+        setattr(plain, name, value)
+    return plain
+
+def cow_state(state, name=None):
+    """
+    Return a CowState with the same variables as state (and named name,
+    if given). Use it as the initial state to make the planner copy
+    states lazily instead of with copy.deepcopy.
+    """
+    new = CowState(name or state.__name__)
+    for (var, value) in vars(state).items():
+        if var != '__name__':
+            if type(value) is dict:
+                value = CowDict(copy.deepcopy(value))
+            else:
+                value = copy.deepcopy(value)
+            setattr(new, var, value)
+    return new
+
+def copy_state(state):
+    """Return a copy of state that an operator may modify."""
+    fork = getattr(type(state), '_fork', None)
+    if fork is not None:
+        return fork(state)
+    return copy.deepcopy(state)
+
+############################################################
+# Rigid variables
+#
+# A rigid value is a read-only RigidDict, RigidTuple or RigidSet, whose
+# dicts, lists and sets are read-only too. Copying it returns it, so all
+# the states of a search share it. fingerprint leaves rigid variables
+# out, and a rigid value inside another value hashes to a hash of its
+# key, which identifies it. Unpickling a rigid value returns the one with
+# the same key if the process already has it, so each worker process of
+# a pool keeps one copy of it, however many states it gets.
+
+# The rigid values that this process has, by key; a RigidTuple, which
+# can't be weakly referenced, is there through a _RigidHolder
+_rigid_values = weakref.WeakValueDictionary()
+_rigid_ids = count()
+
+class _RigidHolder(object):
+    """A RigidTuple's entry in _rigid_values, which lives as long as the tuple."""
+    __slots__ = ('value', '__weakref__')
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("a {} can't be modified".format(type(self).__name__))
+
+class RigidDict(dict):
+    """A dict that can't be modified; see rigid."""
+    __slots__ = ('_key', '__weakref__')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def _fingerprint(self):
+        return hash(self._key)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_restore_rigid, (RigidDict, self._key, dict(self)))
+
+class RigidTuple(tuple):
+    """A list that can't be modified, as a tuple; see rigid."""
+    _fingerprint = RigidDict._fingerprint
+    __copy__ = RigidDict.__copy__
+    __deepcopy__ = RigidDict.__deepcopy__
+
+    def __reduce__(self):
+        return (_restore_rigid, (RigidTuple, self._key, tuple(self)))
+
+class RigidSet(frozenset):
+    """A set that can't be modified, as a frozenset; see rigid."""
+    __slots__ = ('_key',)
+    _fingerprint = RigidDict._fingerprint
+    __copy__ = RigidDict.__copy__
+    __deepcopy__ = RigidDict.__deepcopy__
+
+    def __reduce__(self):
+        return (_restore_rigid, (RigidSet, self._key, frozenset(self)))
+
+_RIGID = frozenset([RigidDict, RigidTuple, RigidSet])
+
+# Values of these types are shared by the copies of a state
+_UNCOPIED = _ATOMIC | _RIGID
+
+def _frozen(value):
+    """Return value with its dicts, lists and sets made read-only."""
+    if type(value) in _UNCOPIED:
+        return value
+    elif isinstance(value, (dict, MutableMapping)):
+        return _make_rigid(RigidDict, ((k, _frozen(v)) for (k, v) in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_frozen(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_frozen(v) for v in value)
+    raise TypeError("a rigid value can't contain a {}".format(type(value).__name__))
+
+def _make_rigid(cls, data, key=None):
+    value = cls(data)
+    value._key = key if key is not None else (os.getpid(), next(_rigid_ids))
+    if cls is RigidTuple:
+        holder = value._holder = _RigidHolder()
+        holder.value = value
+        _rigid_values[value._key] = holder
+    else:
+        _rigid_values[value._key] = value
+    return value
+
+def _restore_rigid(cls, key, data):
+    value = _rigid_values.get(key)
+    if value is None:
+        value = _make_rigid(cls, data, key)
+    elif type(value) is _RigidHolder:
+        value = value.value
+    return value
+
+def rigid(value):
+    """
+    Return a read-only version of value, for a state variable that no
+    operator changes: a RigidDict if value is a dict, a RigidTuple if it
+    is a list or a tuple, or a RigidSet if it is a set, with read-only
+    versions of the dicts, lists and sets in it (lists become tuples).
+    States share it instead of copying it, and fingerprint leaves it out.
+    """
+    if type(value) in _RIGID:
+        return value
+    elif isinstance(value, (dict, MutableMapping)):
+        return _frozen(value)
+    elif isinstance(value, (list, tuple)):
+        return _make_rigid(RigidTuple, (_frozen(v) for v in value))
+    elif isinstance(value, (set, frozenset)):
+        return _make_rigid(RigidSet, (_frozen(v) for v in value))
+    raise TypeError("can't make a rigid {}".format(type(value).__name__))
+
+############################################################
+# State fingerprints
+#
+# Cycle detection compares states by fingerprint: the XOR of a hash of
+# each (variable, value) pair, where a dict's value hashes to the XOR of
+# a hash of each (key, value) entry. CowDicts and TrailDicts update their
+# hash on every write, so a fingerprint costs O(number of variables)
+# rather than O(state size). Entries whose values are themselves
+# containers are kept in a separate _nested set and hashed when needed.
+
+def _atomic_hash(key, value):
+    """Return hash((key, value)) if value can't change, otherwise None."""
+    if type(value) in _ATOMIC:
+        try:
+            return hash((key, value))
+        except TypeError:
+            pass
+    return None
+
+def _entry_hash(key, value):
+    h = _atomic_hash(key, value)
+    if h is None:
+        h = hash((key, _value_hash(value)))
+    return h
+
+def _value_hash(value):
+    """Return a hash of value's contents."""
+    if type(value) in _ATOMIC:
+        try:
+            return hash(value)
+        except TypeError:
+            return hash(repr(value))
+    fingerprint = getattr(type(value), '_fingerprint', None)
+    if fingerprint is not None:
+        return fingerprint(value)
+    elif isinstance(value, dict):
+        try:
+            return reduce(xor, map(hash, value.items()), 0)
+        except TypeError:
+            return reduce(xor, (_entry_hash(k, v) for (k, v) in value.items()), 0)
+    elif isinstance(value, list):
+        return hash(tuple(_value_hash(v) for v in value))
+    elif isinstance(value, (set, frozenset)):
+        return hash(frozenset(_value_hash(v) for v in value))
+    return hash(repr(value))
+
+def fingerprint(state):
+    """
+    Return a hash of the variables and values in state, not counting its
+    name. States with equal variables and values have equal fingerprints.
+    """
+    h = 0
+    for (name, value) in vars(state).items():
+        if name != '__name__' and type(value) not in _RIGID:
+            h ^= _entry_hash(name, value)
+    return h
+
+def _rigid_fingerprint(state):
+    """Return a hash of the keys of state's rigid variables, which fingerprint leaves out."""
+    h = 0
+    for (name, value) in vars(state).items():
+        if type(value) in _RIGID:
+            h ^= hash((name, value._key))
+    return h
+
+############################################################
+# Compact states
+#
+# A Schema declares the variables of a kind of state: the keys each
+# dict variable can have and the values it can hold. The states that a
+# Schema makes keep their variables in __slots__, and each dict variable
+# in an ArrayDict: an array of small integers that index the variable's
+# value domain. Such a state takes a fraction of the memory of an
+# ordinary State, and copying it copies a few arrays.
+
+def _domain_index(domain, kind, name):
+    index = {}
+    for (i, x) in enumerate(domain):
+        if index.setdefault(x, i) != i:
+            raise ValueError('the {} domain of {} has {!r} more than once'.format(kind, name, x))
+    return index
+
+def _typecode(n):
+    """Return the smallest array typecode whose items can be -1..n-1."""
+    for code in 'bhi':
+        if n <= 2 ** (8 * array(code).itemsize - 1):
+            return code
+    return 'q'
+
+class _Variable(object):
+    """The key and value domains of a dict variable of a Schema."""
+    __slots__ = ('name', 'keys', 'key_index', 'values', 'value_index', 'empty')
+
+    def __init__(self, name, keys, values):
+        self.name = name
+        self.keys = tuple(keys)
+        self.key_index = _domain_index(self.keys, 'key', name)
+        self.values = tuple(values)
+        self.value_index = _domain_index(self.values, 'value', name)
+        self.empty = array(_typecode(len(self.values)), [-1]) * len(self.keys)
+
+    def __reduce__(self):
+        return (_Variable, (self.name, self.keys, self.values))
+
+_PRESENT = (-1).__lt__
+
+class ArrayDict(MutableMapping):
+    """
+    A dict variable of a compact state. _codes[i] is the index in the
+    value domain of the value of the i'th key of the key domain, or -1 if
+    that key isn't in the dict. Iteration follows the key domain's order.
+    Keys and values outside of the domains can't be stored.
+    """
+    __slots__ = ('_var', '_codes', '_len', '_hash')
+
+    def __init__(self, var, data=()):
+        self._var = var
+        self._codes = var.empty[:]
+        self._len = 0
+        self._hash = 0
+        for (key, value) in dict(data).items():
+            self[key] = value
+
+    def _fork(self):
+        """Return a copy of self."""
+        other = ArrayDict.__new__(ArrayDict)
+        other._var = self._var
+        other._codes = self._codes[:]
+        other._len = self._len
+        other._hash = self._hash
+        return other
+
+    def _fingerprint(self):
+        return self._hash
+
+    def __getitem__(self, key):
+        var = self._var
+        i = var.key_index.get(key)
+        if i is not None:
+            code = self._codes[i]
+            if code >= 0:
+                return var.values[code]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        var = self._var
+        i = var.key_index.get(key)
+        if i is None:
+            raise ValueError('{!r} is not in the key domain of {}'.format(key, var.name))
+        code = var.value_index.get(value)
+        if code is None:
+            raise ValueError('{!r} is not in the value domain of {}'.format(value, var.name))
+        old = self._codes[i]
+        if old >= 0:
+            self._hash ^= hash((key, var.values[old]))
+        else:
+            self._len += 1
+        self._codes[i] = code
+        self._hash ^= hash((key, var.values[code]))
+
+    def __delitem__(self, key):
+        var = self._var
+        i = var.key_index.get(key)
+        if i is None or self._codes[i] < 0:
+            raise KeyError(key)
+        self._hash ^= hash((key, var.values[self._codes[i]]))
+        self._codes[i] = -1
+        self._len -= 1
+
+    def __contains__(self, key):
+        i = self._var.key_index.get(key)
+        return i is not None and self._codes[i] >= 0
+
+    def __iter__(self):
+        return compress(self._var.keys, map(_PRESENT, self._codes))
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        var = self._var
+        codes = self._codes
+        present = list(map(_PRESENT, codes))
+        return dict(zip(compress(var.keys, present),
+                        map(var.values.__getitem__, compress(codes, present)))).items()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        return self._fork()
+
+    def __deepcopy__(self, memo):
+        return self._fork()
+
+    def __reduce__(self):
+        return (ArrayDict, (self._var, dict(self.items())))
+
+class CompactState(object):
+    """
+    The base class of the states that Schemas make. Operators use them
+    like ordinary States, except that they can only have the variables
+    that the schema declares. Assigning a dict to a dict variable turns
+    it into an ArrayDict.
+    """
+    __slots__ = ('__name__',)
+    _schema = None
+    _variables = ()
+
+    @property
+    def __dict__(self):
+        """A new dict with the variables that have values, for vars()."""
+        variables = {}
+        for name in ('__name__',) + self._variables:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                variables[name] = value
+        return variables
+
+    __repr__ = AutoRepr.__repr__
+
+    def __setattr__(self, name, value):
+        var = self._schema._dicts.get(name)
+        if var is not None and type(value) is not ArrayDict:
+            value = ArrayDict(var, value)
+        object.__setattr__(self, name, value)
+
+    def _fork(self):
+        """Return a copy of self."""
+        other = object.__new__(type(self))
+        for (name, value) in vars(self).items():
+            if type(value) is ArrayDict:
+                value = value._fork()
+            elif type(value) not in _UNCOPIED:
+                value = copy.deepcopy(value)
+            object.__setattr__(other, name, value)
+        return other
+
+    def __deepcopy__(self, memo):
+        return self._fork()
+
+    def __reduce__(self):
+        return (_restore_compact_state, (self._schema, vars(self)))
+
+def _restore_compact_state(schema, variables):
+    state = schema.state(variables['__name__'])
+    for (name, value) in variables.items():
+        setattr(state, name, value)
+    return state
+
+class Schema(object):
+    """
+    Declares the variables of compact states. Each keyword argument
+    declares a variable: (keys, values) for a dict variable whose keys
+    come from keys and whose values come from values, or None for a
+    variable with a single value of any kind. For example,
+        Schema(pos=(blocks, blocks+['table','hand']),
+               clear=(blocks, [True,False]), holding=None)
+    Values in a domain must be hashable, and no two may be equal (so a
+    domain can't have both True and 1).
+    """
+    def __init__(self, **variables):
+        self.variables = variables
+        self._dicts = {name: _Variable(name, *domains)
+                       for (name, domains) in variables.items() if domains is not None}
+        names = tuple(variables)
+        self._state_class = type('CompactState', (CompactState,),
+                                 {'__slots__': names, '_schema': self, '_variables': names})
+
+    def state(self, name):
+        """Return a new compact state named name, whose dict variables are empty."""
+        state = object.__new__(self._state_class)
+        object.__setattr__(state, '__name__', name)
+        for (var_name, var) in self._dicts.items():
+            object.__setattr__(state, var_name, ArrayDict(var))
+        return state
+
+    def __reduce__(self):
+        return (_restore_schema, (self.variables,))
+
+def _restore_schema(variables):
+    return Schema(**variables)
+
+def compact_state(state, schema, name=None):
+    """
+    Return a compact state with the variables of state (and named name,
+    if given), using schema, a Schema that declares all of them.
+    """
+    new = schema.state(name or state.__name__)
+    for (var, value) in vars(state).items():
+        if var != '__name__':
+            setattr(new, var, value if schema._dicts.get(var) else copy.deepcopy(value))
+    return new
+
+############################################################
+# Trailed states
+#
+# The 'trail' engine keeps a single state, and operators modify it in
+# place. Each modification is appended to an undo log (the trail) as a
+# tuple (undo_function, object, arg1, arg2), and backtracking pops the
+# log and calls the undo functions. Variables holding dicts, lists and
+# sets are replaced by the Trail* subclasses below, which log their own
+# modifications, and so are the dicts, lists and sets in them (and in
+# their tuples), and the ones that are stored in them later; any other
+# kind of mutable value can't be undone.
+#
+# A modification logs the entries, items or elements that it changes,
+# so that the log grows with the number of changes rather than the size
+# of the containers. Only clear and sort log a whole container. Undoing
+# the deletion of a dict entry puts its key back at the end of the dict.
+
+def _undo_setitem(d, key, old):
+    d._rehash(key, dict.get(d, key, _MISSING), old)
+    if old is _MISSING:
+        dict.__delitem__(d, key)
+    else:
+        dict.__setitem__(d, key, old)
+
+def _undo_dict(d, old, unused):
+    (entries, d._hash, d._nested) = old
+    dict.clear(d)
+    dict.update(d, entries)
+
+def _undo_list(l, old, unused):
+    list.__setitem__(l, slice(None), old)
+
+def _undo_list_slice(l, where, old):
+    list.__setitem__(l, where, old)
+
+def _undo_list_insert(l, index, item):
+    list.insert(l, index, item)
+
+def _undo_list_insert_all(l, items, unused):
+    for (index, item) in items:
+        list.insert(l, index, item)
+
+def _undo_list_truncate(l, length, unused):
+    list.__delitem__(l, slice(length, None))
+
+def _undo_list_reverse(l, unused1, unused2):
+    list.reverse(l)
+
+def _undo_set(s, old, unused):
+    set.clear(s)
+    set.update(s, old)
+
+def _undo_set_change(s, added, removed):
+    set.difference_update(s, added)
+    set.update(s, removed)
+
+def _undo_setattr(state, name, old):
+    if old is _MISSING:
+        del state.__dict__[name]
+    else:
+        state.__dict__[name] = old
+
+def _trail_value(value, log):
+    """Return a copy of value whose modifications are logged in log."""
+    if type(value) is tuple:
+        # The tuple can't change, but the containers in it can
+        items = tuple([_trail_value(v, log) for v in value])
+        return value if all(map(_is, items, value)) else items
+    elif type(value) in _UNCOPIED:
+        return value
+    elif type(value) in _TRAILED and value._log is log:
+        return value
+    elif isinstance(value, (dict, MutableMapping)):
+        new = TrailDict((k, _trail_value(v, log)) for (k, v) in value.items())
+        new._rehash_all()
+    elif isinstance(value, list):
+        new = TrailList([_trail_value(v, log) for v in value])
+    elif isinstance(value, set):
+        new = TrailSet(value)
+    else:
+        return copy.deepcopy(value)
+    new._log = log
+    return new
+
+class TrailDict(dict):
+    """
+    A dict that logs its modifications so that they can be undone, and
+    keeps its hash up to date (see _fingerprint).
+    """
+    __slots__ = ('_log', '_hash', '_nested')
+
+    def __setitem__(self, key, value):
+        if type(value) in _CONTAINERS:
+            value = _trail_value(value, self._log)
+        old = dict.get(self, key, _MISSING)
+        self._log.append((_undo_setitem, self, key, old))
+        dict.__setitem__(self, key, value)
+        self._rehash(key, old, value)
+
+    def _rehash(self, key, old, new):
+        """Update the hash after the value of key changes from old to new."""
+        if old is not _MISSING:
+            h = _atomic_hash(key, old)
+            if h is not None:
+                self._hash ^= h
+            else:
+                self._nested.discard(key)
+        if new is not _MISSING:
+            h = _atomic_hash(key, new)
+            if h is not None:
+                self._hash ^= h
+            else:
+                self._nested.add(key)
+
+    def _rehash_all(self):
+        self._hash = 0
+        self._nested = set()
+        for (key, value) in self.items():
+            self._rehash(key, _MISSING, value)
+
+    def _fingerprint(self):
+        h = self._hash
+        for key in self._nested:
+            h ^= _entry_hash(key, dict.__getitem__(self, key))
+        return h
+
+    def __delitem__(self, key):
+        old = dict.__getitem__(self, key)
+        self._log.append((_undo_setitem, self, key, old))
+        dict.__delitem__(self, key)
+        self._rehash(key, old, _MISSING)
+
+    def pop(self, key, default=_MISSING):
+        if dict.__contains__(self, key):
+            value = dict.__getitem__(self, key)
+            del self[key]
+            return value
+        elif default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        (key, value) = dict.popitem(self)
+        self._log.append((_undo_setitem, self, key, value))
+        self._rehash(key, value, _MISSING)
+        return (key, value)
+
+    def clear(self):
+        self._log.append((_undo_dict, self, (dict(self), self._hash, self._nested), None))
+        dict.clear(self)
+        self._hash = 0
+        self._nested = set()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for (key, value) in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+class TrailList(list):
+    """A list that logs its modifications so that they can be undone."""
+    __slots__ = ('_log',)
+
+    def _index(self, index):
+        """Return index as a position from the start, or raise IndexError."""
+        n = len(self)
+        i = _as_index(index)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('list index out of range')
+        return i
+
+    def __setitem__(self, index, value):
+        log = self._log
+        if isinstance(index, slice):
+            (start, stop, step) = index.indices(len(self))
+            old = list.__getitem__(self, index)
+            length = len(self)
+            list.__setitem__(self, index, [_trail_value(v, log) for v in value])
+            if step == 1:
+                # The new items are where the old ones were
+                added = len(self) - length + len(old)
+                index = slice(start, start + added)
+            log.append((_undo_list_slice, self, index, old))
+        else:
+            i = self._index(index)
+            log.append((_undo_list_slice, self, i, list.__getitem__(self, i)))
+            list.__setitem__(self, i, _trail_value(value, log))
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(len(self)))
+            items = sorted(zip(positions, [list.__getitem__(self, i) for i in positions]))
+            list.__delitem__(self, index)
+            self._log.append((_undo_list_insert_all, self, items, None))
+        else:
+            i = self._index(index)
+            self._log.append((_undo_list_insert, self, i, list.__getitem__(self, i)))
+            list.__delitem__(self, i)
+
+    def pop(self, index=-1):
+        i = self._index(index) if self else index
+        item = list.pop(self, i)
+        self._log.append((_undo_list_insert, self, i, item))
+        return item
+
+    def remove(self, value):
+        i = self.index(value)
+        self._log.append((_undo_list_insert, self, i, list.__getitem__(self, i)))
+        list.__delitem__(self, i)
+
+    def insert(self, index, value):
+        n = len(self)
+        i = _as_index(index)
+        i = max(0, i + n) if i < 0 else min(i, n)
+        self._log.append((_undo_list_slice, self, slice(i, i + 1), []))
+        list.insert(self, i, _trail_value(value, self._log))
+
+    def append(self, value):
+        self._log.append((_undo_list_truncate, self, len(self), None))
+        list.append(self, _trail_value(value, self._log))
+
+    def extend(self, values):
+        log = self._log
+        values = [_trail_value(v, log) for v in values]
+        log.append((_undo_list_truncate, self, len(self), None))
+        list.extend(self, values)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __imul__(self, n):
+        if n <= 0:
+            self.clear()
+        else:
+            self._log.append((_undo_list_truncate, self, len(self), None))
+            list.__imul__(self, n)
+        return self
+
+    def reverse(self):
+        self._log.append((_undo_list_reverse, self, None, None))
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        self._log.append((_undo_list, self, list(self), None))
+        list.sort(self, *args, **kwargs)
+
+    def clear(self):
+        self._log.append((_undo_list, self, list(self), None))
+        list.clear(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+class TrailSet(set):
+    """A set that logs its modifications so that they can be undone."""
+    __slots__ = ('_log',)
+
+    def _change(self, added, removed):
+        """Log that the elements added were added and the elements removed removed."""
+        if added or removed:
+            self._log.append((_undo_set_change, self, added, removed))
+
+    def add(self, element):
+        if not set.__contains__(self, element):
+            self._change((element,), ())
+            set.add(self, element)
+
+    def discard(self, element):
+        if set.__contains__(self, element):
+            self._change((), (element,))
+            set.discard(self, element)
+
+    def remove(self, element):
+        if not set.__contains__(self, element):
+            raise KeyError(element)
+        self.discard(element)
+
+    def pop(self):
+        element = set.pop(self)
+        self._change((), (element,))
+        return element
+
+    def clear(self):
+        self._log.append((_undo_set, self, set(self), None))
+        set.clear(self)
+
+    def update(self, *others):
+        added = set().union(*others)
+        added.difference_update(self)
+        self._change(added, ())
+        set.update(self, added)
+
+    def difference_update(self, *others):
+        removed = set.intersection(self, set().union(*others))
+        self._change((), removed)
+        set.difference_update(self, removed)
+
+    def intersection_update(self, *others):
+        removed = set.difference(self, set.intersection(self, *others))
+        self._change((), removed)
+        set.difference_update(self, removed)
+
+    def symmetric_difference_update(self, other):
+        other = set(other)
+        added = other.difference(self)
+        removed = other.intersection(self)
+        self._change(added, removed)
+        set.difference_update(self, removed)
+        set.update(self, added)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def __reduce__(self):
+        return (set, (set(self),))
+
+# The values that the Trail* containers and TrailState wrap when they are stored
+_CONTAINERS = frozenset([dict, list, set, tuple])
+_TRAILED = frozenset([TrailDict, TrailList, TrailSet])
+
+class TrailState(State):
+    """A state that logs its modifications so that they can be undone."""
+    __slots__ = ('_log',)
+
+    def __init__(self, state, log):
+        self._log = log
+        for (name, value) in vars(state).items():
+            self.__dict__[name] = _trail_value(value, log)
+
+    def __setattr__(self, name, value):
+        if name == '_log':
+            object.__setattr__(self, name, value)
+            return
+        if type(value) in _CONTAINERS:
+            value = _trail_value(value, self._log)
+        self._log.append((_undo_setattr, self, name, self.__dict__.get(name, _MISSING)))
+        self.__dict__[name] = value
+
+    def __delattr__(self, name):
+        self._log.append((_undo_setattr, self, name, self.__dict__[name]))
+        del self.__dict__[name]
+
+    def __reduce__(self):
+        return (_plain_state, (self,))
+
 
 ### print_state and print_goal are identical except for the name
 
@@ -159,19 +1344,114 @@ def find_if(cond,seq):
         if cond(x): return x
     return None
 
+############################################################
+# Domains
+
+class Domain(object):
+    """
+    A planning domain: the operators, methods and operator costs that a
+    search uses, in its operators, methods and costs dicts. Each Domain
+    has its own, so domains whose operators or tasks have the same names
+    don't get in each other's way, and searches in different domains can
+    run at the same time in different threads. The planners take one as
+    their domain argument; without one, they use the current domain (see
+    using_domain), which is default_domain unless a with statement says
+    otherwise.
+
+    table maps each task name to (operator, methods): its operator and
+    its list of methods, either of which is None if there is none, so
+    that the planners look a task up once instead of twice. It is made
+    again whenever the domain changes, so change a domain only with its
+    declare_ methods.
+    """
+    def __init__(self, name='domain'):
+        self.__name__ = name
+        self.operators = {}
+        self.methods = {}
+        self.costs = {}
+        self.table = {}
+
+    def __repr__(self):
+        return '<Domain {}>'.format(self.__name__)
+
+    def declare_operators(self, *op_list):
+        """Like declare_operators, for this domain."""
+        self.operators.update({op.__name__:op for op in op_list})
+        self._resolve()
+        return self.operators
+
+    def declare_methods(self, task_name, *method_list):
+        """Like declare_methods, for this domain."""
+        self.methods.update({task_name:list(method_list)})
+        self._resolve()
+        return self.methods[task_name]
+
+    def declare_cost(self, operator_name, cost):
+        """Like declare_cost, for this domain."""
+        self.costs[operator_name] = cost
+        return cost
+
+    def action_cost(self, state, task):
+        """Return the cost of applying the action task in state."""
+        cost = self.costs.get(task[0], 1)
+        if callable(cost):
+            cost = cost(state, *task[1:])
+        return cost
+
+    def _resolve(self):
+        table = {name: (None, relevant) for (name, relevant) in self.methods.items()}
+        for (name, operator) in self.operators.items():
+            table[name] = (operator, self.methods.get(name))
+        self.table = table
+
+default_domain = Domain('default')
+
+# The table entry for a task that has neither an operator nor methods
+_UNKNOWN = (None, None)
+
+# The domains that with statements made current; see using_domain
+_domains = []
+
+def current_domain():
+    """Return the domain that the planners and declare_ functions use by default."""
+    return _domains[-1] if _domains else default_domain
+
+@contextlib.contextmanager
+def using_domain(domain):
+    """
+    Make domain the current domain in the with statement's body, so that
+    the declare_ functions change it, and the planners search in it when
+    they aren't given a domain. This makes it easy to load a module that
+    declares its operators and methods into a Domain of its own:
+
+        office = Domain('office')
+        with using_domain(office):
+            import office_domain
+        plan = pyhop(state, tasks, domain=office)
+
+    The current domain is the same in all threads, so do this when you
+    load a domain, and pass domain arguments to planners that run in threads.
+    """
+    _domains.append(domain)
+    try:
+        yield domain
+    finally:
+        _domains.remove(domain)
+
 ############################################################
 # Commands to tell Pyhop what the operators and methods are
 
-operators = {}
-methods = {}
+# The default domain's tables
+operators = default_domain.operators
+methods = default_domain.methods
+costs = default_domain.costs
 
 def declare_operators(*op_list):
     """
     Call this after defining the operators, to tell Pyhop what they are. 
     op_list must be a list of functions, not strings.
     """
-    operators.update({op.__name__:op for op in op_list})
-    return operators
+    return current_domain().declare_operators(*op_list)
 
 def declare_methods(task_name,*method_list):
     """
@@ -179,8 +1459,23 @@ def declare_methods(task_name,*method_list):
     task_name must be a string.
     method_list must be a list of functions, not strings.
     """
-    methods.update({task_name:list(method_list)})
-    return methods[task_name]
+    return current_domain().declare_methods(task_name, *method_list)
+
+def declare_cost(operator_name, cost):
+    """
+    Tell Pyhop what it costs to apply an operator, for find_cheapest_plan.
+    cost is a number, or a function that is called like the operator
+    (with the state before the operator is applied, which it mustn't
+    modify, and the task's arguments) and returns a number. Costs must
+    not be negative. Operators without a declared cost cost 1.
+    """
+    return current_domain().declare_cost(operator_name, cost)
+
+def action_cost(state, task, domain=None):
+    """Return the cost of applying the action task in state."""
+    if domain is None:
+        domain = current_domain()
+    return domain.action_cost(state, task)
 
 ############################################################
 # Commands to find out what the operators and methods are
@@ -195,140 +1490,1568 @@ def print_methods(mlist=methods):
     for task in mlist:
         print('{:<14}'.format(task) + ', '.join([f.__name__ for f in mlist[task]]))
 
+############################################################
+# Search statistics
+
+class SearchStats(object):
+    """
+    Statistics about a search. Pass one to pyhop, multi_pyhop,
+    find_first_plan or find_n_plans as their stats argument, and it will
+    have these attributes when they return:
+    - nodes: the number of search nodes expanded
+    - operators, operator_failures: how many times the operator for each
+      task name was applied, and how many of those times it failed
+    - methods, method_failures: how many times a method was called for
+      each task name, and how many of those calls gave no subtasks
+    - operator_time, method_time: the total time in seconds spent in each
+      operator and method function, by function name
+    - cycles: the number of operator applications pruned as cycles
+    - backtracks: the number of dead ends the search went back from
+    - max_depth, max_frontier: the depth of the deepest node expanded,
+      and the largest number of nodes waiting to be expanded
+    - nogood_lookups, nogood_hits: how many nodes were looked up in the
+      search's NogoodTable, and how many of them were known failures
+    A SearchStats can also call hooks, if they are given:
+    - on_expand(node) before a node is expanded
+    - on_operator(node, task, newstate) after an operator is applied
+    - on_method(node, task, method, alternatives) after a method is called
+    - on_prune(node, task, newstate) when a new state is pruned as a cycle
+    """
+    def __init__(self, on_expand=None, on_operator=None, on_method=None, on_prune=None):
+        self.nodes = 0
+        self.operators = Counter()
+        self.operator_failures = Counter()
+        self.operator_time = Counter()
+        self.methods = Counter()
+        self.method_failures = Counter()
+        self.method_time = Counter()
+        self.cycles = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.max_frontier = 0
+        self.nogood_lookups = 0
+        self.nogood_hits = 0
+        self.on_expand = on_expand
+        self.on_operator = on_operator
+        self.on_method = on_method
+        self.on_prune = on_prune
+
+    def expand(self, node):
+        self.nodes += 1
+        if node.depth > self.max_depth:
+            self.max_depth = node.depth
+        if self.on_expand:
+            self.on_expand(node)
+
+    def apply_operator(self, node, operator, state, task):
+        """Apply operator to state for task, and record it."""
+        start = time.perf_counter()
+        newstate = operator(state, *task[1:])
+        self.operator_time[operator.__name__] += time.perf_counter() - start
+        self.operators[task[0]] += 1
+        if not newstate:
+            self.operator_failures[task[0]] += 1
+        if self.on_operator:
+            self.on_operator(node, task, newstate)
+        return newstate
+
+    def call_method(self, node, method, state, task):
+        """Call method in state for task, and record it."""
+        start = time.perf_counter()
+        alternatives = method(state, *task[1:])
+        self.method_time[method.__name__] += time.perf_counter() - start
+        self.methods[task[0]] += 1
+        if not alternatives:
+            self.method_failures[task[0]] += 1
+        if self.on_method:
+            self.on_method(node, task, method, alternatives)
+        return alternatives
+
+    def prune(self, node, task, newstate):
+        self.cycles += 1
+        if self.on_prune:
+            self.on_prune(node, task, newstate)
+
+    def frontier(self, size):
+        if size > self.max_frontier:
+            self.max_frontier = size
+
+    def __str__(self):
+        lines = ['nodes expanded: {}, max depth: {}, max frontier: {}'.format(
+                     self.nodes, self.max_depth, self.max_frontier),
+                 'cycles pruned: {}, backtracks: {}'.format(self.cycles, self.backtracks)]
+        if self.nogood_lookups:
+            lines.append('nogoods: {} hits in {} lookups ({:.1%})'.format(
+                self.nogood_hits, self.nogood_lookups, self.nogood_hits / float(self.nogood_lookups)))
+        for (kind, calls, failures, times) in [
+                ('operator', self.operators, self.operator_failures, self.operator_time),
+                ('method', self.methods, self.method_failures, self.method_time)]:
+            for name in sorted(calls):
+                lines.append('{} {}: {} calls, {} failed'.format(
+                    kind, name, calls[name], failures[name]))
+            for name in sorted(times):
+                lines.append('{} function {}: {:.6f} s'.format(kind, name, times[name]))
+        return '\n'.join(lines)
+
+############################################################
+# Search traces
+#
+# A PlanTracer records what a search does as a sequence of events, each a
+# tuple (event, node, depth, task, data), where node is the number of the
+# node being expanded (1 for the first one) and depth is its depth:
+# - ('expand', n, depth, task, None): node n is expanded, and task is its
+#   first task (None if it has none)
+# - ('apply', n, depth, task, diff): the action task was applied, and
+#   changed the state as described by diff (see state_diff)
+# - ('fail', n, depth, task, kind): task failed. kind is 'operator' if
+#   its operator failed, 'method' if none of its methods gave subtasks,
+#   and 'unknown' if it has neither an operator nor methods
+# - ('prune', n, depth, task, None): the action task was pruned as a cycle
+# - ('solution', n, depth, None, plan): the search found plan
+# Tasks, diffs and plans are recorded as lists, strings and numbers (see
+# _trace_value), so that they can be written as JSON, and so that later
+# changes to the state don't change them.
+
+_TRACE_MAGIC = b'pyhop2 trace 1\n'
+_TRACE_DATA = {'apply': 'diff', 'fail': 'kind', 'solution': 'plan'}
+_JSON_ATOMIC = frozenset([type(None), bool, int, float, str])
+
+def _trace_value(value):
+    """Return value as a tree of lists, strings and numbers, for a trace."""
+    if type(value) in _JSON_ATOMIC:
+        return value
+    elif isinstance(value, (tuple, list)):
+        return [_trace_value(v) for v in value]
+    elif isinstance(value, (State, Goal, CompactState)):
+        return '<{} {}>'.format(type(value).__name__, value.__name__)
+    elif isinstance(value, (dict, MutableMapping)):
+        return [[_trace_value(k), _trace_value(v)] for (k, v) in value.items()]
+    elif isinstance(value, (set, frozenset)):
+        return sorted((_trace_value(v) for v in value), key=repr)
+    return repr(value)
+
+def state_diff(old, new):
+    """
+    Return the changes that turn state old into state new, as a list of
+    ['set', var, key, value] and ['del', var, key] for the entries of dict
+    variables, and ['var', var, value] and ['unset', var] for the other
+    variables.
+    """
+    old_vars = vars(old)
+    new_vars = vars(new)
+    diff = []
+    for (name, value) in new_vars.items():
+        if name == '__name__':
+            continue
+        before = old_vars.get(name, _MISSING)
+        if value is before:
+            continue
+        if isinstance(before, (dict, MutableMapping)) and isinstance(value, (dict, MutableMapping)):
+            for key in _changed_keys(before, value):
+                _diff_entry(diff, name, key, value.get(key, _MISSING))
+        elif before is _MISSING or before != value:
+            diff.append(['var', name, _trace_value(value)])
+    for name in old_vars:
+        if name not in new_vars:
+            diff.append(['unset', name])
+    return diff
+
+def _changed_keys(before, after):
+    """Return the keys whose values differ between the dicts before and after."""
+    try:
+        keys = [k for (k, v) in before.items() ^ after.items()]
+    except TypeError:
+        keys = [k for k in before if k not in after or before[k] != after[k]]
+        keys.extend(k for k in after if k not in before)
+    return dict.fromkeys(keys)
+
+def _diff_entry(diff, name, key, value):
+    if value is _MISSING:
+        diff.append(['del', name, _trace_value(key)])
+    else:
+        diff.append(['set', name, _trace_value(key), _trace_value(value)])
+
+def _find_path(value, obj):
+    """Return the keys that lead from value to obj, or None if obj isn't in value."""
+    if isinstance(value, dict):
+        items = dict.items(value)
+    elif isinstance(value, (list, tuple)):
+        items = enumerate(value)
+    else:
+        return None
+    for (key, v) in items:
+        if v is obj:
+            return [key]
+        if type(v) not in _UNCOPIED or type(v) is tuple:
+            path = _find_path(v, obj)
+            if path is not None:
+                return [key] + path
+    return None
+
+def _trail_diff(state, entries):
+    """
+    Return the changes made to state by the modifications logged in
+    entries (a slice of a trail), in the form that state_diff returns.
+    A change deeper than an entry of a dict variable is reported as a
+    change to that entry.
+    """
+    variables = vars(state)
+    names = {id(value): name for (name, value) in variables.items()}
+    changed = {}
+    for (undo, obj, arg, unused) in entries:
+        if undo is _undo_setattr:
+            path = [arg]
+        else:
+            if id(obj) in names:
+                path = [names[id(obj)]]
+            else:
+                for (name, value) in variables.items():
+                    path = _find_path(value, obj)
+                    if path is not None:
+                        path = [name] + path
+                        break
+                else:
+                    # obj was replaced by an assignment, which is logged too
+                    continue
+            if undo is _undo_setitem:
+                path.append(arg)
+            elif undo is _undo_dict and len(path) == 1:
+                # a deletion from a dict variable: find the keys it changed
+                keys = changed.setdefault(path[0], {})
+                if keys is not None:
+                    keys.update(_changed_keys(arg[0], obj))
+                continue
+        changed.setdefault(path[0], {})
+        if len(path) == 1:
+            changed[path[0]] = None
+        elif changed[path[0]] is not None:
+            changed[path[0]][path[1]] = True
+    diff = []
+    for (name, keys) in changed.items():
+        value = variables.get(name, _MISSING)
+        if keys is None or not isinstance(value, dict):
+            if value is _MISSING:
+                diff.append(['unset', name])
+            else:
+                diff.append(['var', name, _trace_value(value)])
+        else:
+            for key in keys:
+                _diff_entry(diff, name, key, dict.get(value, key, _MISSING))
+    return diff
+
+class PlanTracer(object):
+    """
+    Writes the events of a search (see above) to the file path, buffering
+    buffer_size of them at a time. format is 'jsonl', which writes each
+    event as a line of JSON, or 'binary', which writes them as pickled
+    lists of event tuples and is smaller and faster. By default it is
+    'binary' if path ends with '.bin', and 'jsonl' otherwise.
+
+    Pass a PlanTracer as the trace argument of pyhop, multi_pyhop,
+    find_first_node or find_n_plans, and close it (or use it in a with
+    statement) when you're done. read_trace(path) reads the events back.
+    """
+    def __init__(self, path, format=None, buffer_size=10000):
+        if format is None:
+            format = 'binary' if path.endswith('.bin') else 'jsonl'
+        if format not in ('jsonl', 'binary'):
+            raise ValueError("unknown trace format {!r}; use 'jsonl' or 'binary'".format(format))
+        self.format = format
+        self.buffer_size = buffer_size
+        self.events = []
+        self.nodes = 0
+        self.file = open(path, 'wb')
+        if format == 'binary':
+            self.file.write(_TRACE_MAGIC)
+
+    def expand(self, depth, task):
+        self.nodes += 1
+        self._emit('expand', depth, task, None)
+
+    def apply(self, depth, task, diff):
+        self._emit('apply', depth, task, diff)
+
+    def fail(self, depth, task, kind):
+        self._emit('fail', depth, task, kind)
+
+    def prune(self, depth, task):
+        self._emit('prune', depth, task, None)
+
+    def solution(self, depth, plan):
+        self._emit('solution', depth, None, _trace_value(plan))
+
+    def _emit(self, event, depth, task, data):
+        self.events.append((event, self.nodes, depth, _trace_value(task), data))
+        if len(self.events) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered events to the file."""
+        if self.events:
+            if self.format == 'binary':
+                pickle.dump(self.events, self.file, pickle.HIGHEST_PROTOCOL)
+            else:
+                lines = [json.dumps(_event_dict(e), default=repr) for e in self.events]
+                self.file.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            self.events = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _event_dict(event):
+    (kind, node, depth, task, data) = event
+    d = {'event': kind, 'node': node, 'depth': depth, 'task': task}
+    if kind in _TRACE_DATA:
+        d[_TRACE_DATA[kind]] = data
+    return d
+
+def read_trace(path):
+    """
+    Yield the events in the trace file path (written by a PlanTracer in
+    either format) as dicts with the keys 'event', 'node', 'depth' and
+    'task', plus 'diff', 'kind' or 'plan' for the events that have them.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(_TRACE_MAGIC)) == _TRACE_MAGIC:
+            while True:
+                try:
+                    events = pickle.load(f)
+                except EOFError:
+                    return
+                for event in events:
+                    yield _event_dict(event)
+        else:
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line.decode('utf-8'))
+
+############################################################
+# Search budgets
+
+class Budget(object):
+    """
+    Limits on a search, for the budget argument of pyhop, multi_pyhop and
+    the like. Each limit is None if there isn't one:
+    - max_nodes: the most nodes the search may expand
+    - time_limit: the most seconds the search may take
+    - deadline: the time.monotonic() time by which the search must stop
+    - max_frontier: the most nodes that may be waiting to be expanded
+    - cancel: an object, such as a threading.Event, whose is_set() method
+      returns True when the search should stop
+    The same Budget can be used for any number of searches, and each
+    search gets all of it, except that deadline is the same for all.
+    """
+    def __init__(self, max_nodes=None, time_limit=None, deadline=None, max_frontier=None,
+                 cancel=None):
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.deadline = deadline
+        self.max_frontier = max_frontier
+        self.cancel = cancel
+
+    def start(self):
+        """Return a _BudgetMeter for a search that starts now."""
+        return _BudgetMeter(self)
+
+class _BudgetMeter(object):
+    """What one search has spent of a Budget."""
+    def __init__(self, budget):
+        self.budget = budget
+        self.nodes = 0
+        self.start = time.monotonic()
+        self.deadline = budget.deadline
+        if budget.time_limit is not None:
+            deadline = self.start + budget.time_limit
+            if self.deadline is None or deadline < self.deadline:
+                self.deadline = deadline
+
+    def spend(self, frontier):
+        """
+        Account for expanding another node, while frontier nodes are
+        waiting to be expanded. If that's over budget, return a
+        BudgetExhausted that says why, and otherwise None.
+        """
+        budget = self.budget
+        if budget.max_nodes is not None and self.nodes >= budget.max_nodes:
+            reason = 'nodes'
+        elif budget.max_frontier is not None and frontier > budget.max_frontier:
+            reason = 'frontier'
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            reason = 'time'
+        elif budget.cancel is not None and budget.cancel.is_set():
+            reason = 'cancelled'
+        else:
+            self.nodes += 1
+            return None
+        return BudgetExhausted(reason, self.nodes, time.monotonic() - self.start)
+
+class BudgetExhausted(Exception):
+    """
+    A search ran out of its Budget. find_first_node, iter_plans and the
+    like raise it, and pyhop and multi_pyhop return it instead of a plan
+    or a list of plans. It is false, like a failed search, and has:
+    - reason: 'nodes', 'time', 'frontier' or 'cancelled'
+    - nodes, seconds: the nodes expanded and the time taken
+    - plans: the plans found before the budget ran out
+    - stats: the search's SearchStats, if it had one
+    """
+    def __init__(self, reason, nodes, seconds):
+        Exception.__init__(self, reason, nodes, seconds)
+        self.reason = reason
+        self.nodes = nodes
+        self.seconds = seconds
+        self.plans = []
+        self.stats = None
+
+    def __str__(self):
+        return 'search budget exhausted ({}) after {} nodes and {:.3f} seconds'.format(
+            self.reason, self.nodes, self.seconds)
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+############################################################
+# Nogood tables
+#
+# A NogoodTable remembers the (state fingerprint, task stack) pairs of
+# search nodes whose subtrees were searched completely without finding a
+# plan, so that when the same state and tasks come up again, by another
+# method or alternative, the search doesn't search them again. A subtree
+# in which a state was pruned as a cycle isn't remembered, since its
+# failure may depend on the path that led to it.
+#
+# To find out when a subtree has failed, each node that the search
+# expands gets a _Subtree record, which counts the children that haven't
+# failed yet; the children's memo attribute is their parent's record.
+
+class NogoodTable(object):
+    """
+    A table of failed (state fingerprint, task stack) pairs, for the
+    nogoods argument of pyhop, multi_pyhop and the like. It holds at most
+    max_size of them, and forgets the least recently used ones first.
+    The same table can be used for any number of searches in the same
+    domain: a pair also identifies the state's rigid variables (see
+    rigid), so that states that differ only in them don't share their
+    failures. lookups and hits count the pairs looked up and found; the
+    searches' SearchStats count them too.
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.table = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.current = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def hit_rate(self):
+        """Return the fraction of the lookups that found a failed pair."""
+        return self.hits / float(self.lookups) if self.lookups else 0.0
+
+    def lookup(self, key):
+        """Return True if key is a known failure."""
+        self.lookups += 1
+        try:
+            known = key in self.table
+        except TypeError:
+            # Tasks with unhashable arguments can't be remembered
+            return False
+        if known:
+            self.table.move_to_end(key)
+            self.hits += 1
+        return known
+
+    def add(self, key):
+        """Record that key is a failure."""
+        try:
+            self.table[key] = True
+        except TypeError:
+            return
+        self.table.move_to_end(key)
+        if len(self.table) > self.max_size:
+            self.table.popitem(last=False)
+
+    def key(self, state, stack, state_key=None):
+        """
+        Return the key of state and the task stack stack in the table.
+        state_key is state's fingerprint, if the caller already has it.
+        The stack's hash was computed as its tasks were pushed (see
+        push_tasks), so hashing the key doesn't walk the whole stack.
+        """
+        if state_key is None:
+            state_key = fingerprint(state)
+        return (state_key, _rigid_fingerprint(state), stack)
+
+    def check(self, node, stats=None):
+        """
+        Before node is expanded: return True if its subtree is known to
+        fail, in which case the search should treat it as a dead end.
+        """
+        key = self.key(node.state, node.stack, node.fingerprint())
+        known = self.lookup(key)
+        if stats is not None:
+            stats.nogood_lookups += 1
+            stats.nogood_hits += known
+        self.current = None if known else _Subtree(node.memo, key)
+        return known
+
+    def expanded(self, node, children):
+        """After check(node): record node's children, or that it failed."""
+        record = self.current
+        self.current = None
+        if record is None:
+            self._close(node.memo)
+        elif children:
+            record.open = len(children)
+            for child in children:
+                child.memo = record
+        else:
+            self._finish(record)
+
+    def pruned(self):
+        """Record that the node being expanded pruned a state as a cycle."""
+        if self.current is not None:
+            self.current.cyclic = True
+
+    def solved(self, node):
+        """Record that node completes a plan."""
+        record = node.memo
+        while record is not None and not record.solved:
+            record.solved = True
+            record = record.parent
+        self._close(node.memo)
+
+    def _close(self, record):
+        """Record that one of the children of record is finished."""
+        if record is not None:
+            record.open -= 1
+            if record.open == 0:
+                self._finish(record)
+
+    def _finish(self, record):
+        # Finishing a record can finish its ancestors, so do it in a loop
+        while record is not None:
+            if not record.solved and not record.cyclic:
+                self.add(record.key)
+            parent = record.parent
+            if parent is None:
+                return
+            parent.cyclic = parent.cyclic or record.cyclic
+            parent.open -= 1
+            if parent.open != 0:
+                return
+            record = parent
+
+def _expand(node, nogoods, stats):
+    """Return node's children, or none if nogoods knows that its subtree fails."""
+    children = [] if nogoods.check(node, stats) else node.get_next_step()
+    nogoods.expanded(node, children)
+    return children
+
+class _Subtree(object):
+    """The subtree of a search node that has been expanded; see NogoodTable."""
+    __slots__ = ('parent', 'key', 'open', 'cyclic', 'solved')
+
+    def __init__(self, parent, key):
+        self.parent = parent
+        self.key = key
+        self.open = 0
+        self.cyclic = False
+        self.solved = False
+
+############################################################
+# Search scratch space
+
+_scratch = contextvars.ContextVar('pyhop2 search scratch', default=None)
+
+def search_scratch():
+    """
+    Return a dict in which methods and operators can keep things for the
+    rest of the search that called them, such as caches that are only
+    good for one problem, or None if they weren't called by a search.
+    Each search gets its own, even when several run in turn (as
+    generators do) or at the same time, and it goes away with the search.
+    """
+    return _scratch.get()
+
 ############################################################
 # The actual planner
 
-def pyhop(state,tasks,verbose=0):
+def pyhop(state,tasks,verbose=0,engine='copy',stats=None,trace=None,
+          frontier='depth-first',heuristic=None,budget=None,domain=None,
+          nogoods=None):
     """
     Try to find a plan that accomplishes tasks in state. 
     If successful, return the plan. Otherwise return False.
+    engine is the name of the search engine to use; see engines below.
+    If stats is a SearchStats, it records statistics about the search,
+    and if trace is a PlanTracer, it records the search's events.
+    frontier is the name of the order in which to expand nodes, and
+    heuristic is the function that some of them need; see frontiers below.
+    If budget is a Budget and the search runs out of it, return a
+    BudgetExhausted. domain is the Domain to search in, by default the
+    current domain (see using_domain). If nogoods is a NogoodTable, the
+    search skips the subtrees that it knows fail, and adds the ones that
+    it finds fail.
     """
     if verbose>0: print('** pyhop, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
-    result = find_first_plan(state, tasks, verbose)
+    try:
+        result = find_first_plan(state, tasks, verbose, engine, stats, trace, frontier, heuristic,
+                                 budget, domain, nogoods)
+    except BudgetExhausted as e:
+        e.stats = stats
+        result = e
     if verbose>0: print('** result =',result,'\n')
     return result
 
-def find_first_plan(state, tasks, verbose=0):
-    p = PlannerStep(state, tasks, verbose)
-    choices = deque()
-    while not p.is_complete():
-        next_options = p.get_next_step()
-        if next_options:
-            for option in next_options:
-                choices.append(option)
+def find_first_plan(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                    frontier='depth-first', heuristic=None, budget=None, domain=None,
+                    nogoods=None):
+    p = find_first_node(state, tasks, verbose, engine, stats, trace, frontier, heuristic, budget,
+                        domain, nogoods)
+    return p.plan if p else False
 
-        if choices:
-            p = choices.pop()
-        else:
-            if verbose>0: print("** No plan found **")
-            return False
-    return p.plan
+def find_first_node(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                    frontier='depth-first', heuristic=None, budget=None, domain=None,
+                    nogoods=None):
+    """
+    Search as pyhop does, and return the search node that completes the
+    first plan found, or False if there is none. It is the first node that
+    iter_search_steps generates; if budget is a Budget and the search runs
+    out of it, raise BudgetExhausted.
+    """
+    steps = iter_search_steps(state, tasks, verbose, engine, stats, trace, False, frontier,
+                              heuristic, budget, domain, nogoods)
+    try:
+        for p in steps:
+            if p is not None:
+                return p
+    finally:
+        steps.close()
+    return False
 
-def multi_pyhop(state,tasks,n,verbose=0):
+def multi_pyhop(state,tasks,n,verbose=0,engine='copy',stats=None,trace=None,
+                frontier='depth-first',heuristic=None,budget=None,domain=None,
+                nogoods=None):
+    """
+    Try to find n plans that accomplish tasks in state, and return a list
+    of the plans found. The other arguments are as in pyhop; if the search
+    runs out of budget, return a BudgetExhausted, whose plans attribute
+    has the plans found before it did.
+    """
     if verbose>0: print('** pyhop, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
-    result = find_n_plans(state, tasks, n, verbose)
+    try:
+        result = find_n_plans(state, tasks, n, verbose, engine, stats, trace, frontier, heuristic,
+                              budget, domain, nogoods)
+    except BudgetExhausted as e:
+        e.stats = stats
+        if verbose>0: print('** {}, with {} plans found **\n'.format(e, len(e.plans)))
+        return e
     if verbose>0:
         print('** found', len(result), 'plans:')
         for p in range(len(result)):
             print("Plan {} (length {}): {}".format(p + 1, len(result[p]), result[p]))
     return result
 
-def find_n_plans(state, tasks, n, verbose=0):
-    found = False
-    end = True
-    p = PlannerStep(state, tasks, verbose)
-    choices = deque()
+def find_n_plans(state, tasks, n, verbose=0, engine='copy', stats=None, trace=None,
+                 frontier='depth-first', heuristic=None, budget=None, domain=None,
+                 nogoods=None):
     plans = []
+    try:
+        for plan in islice(iter_plans(state, tasks, verbose, engine, stats, trace, True,
+                                      frontier, heuristic, budget, domain, nogoods), n):
+            plans.append(plan)
+    except BudgetExhausted as e:
+        e.plans = plans
+        raise
+    return plans
+
+def iter_plans(state, tasks, verbose=0, engine='copy', stats=None, trace=None, diversify=False,
+               frontier='depth-first', heuristic=None, budget=None, domain=None,
+               nogoods=None):
+    """
+    Generate the plans that accomplish tasks in state, one at a time, as
+    the search finds them. Only the search's frontier is kept in memory,
+    so the caller can stop whenever it likes, and consuming many plans
+    doesn't take more memory than consuming a few. The other arguments
+    are as in pyhop, and diversify is as in iter_plan_nodes.
+    """
+    for p in iter_plan_nodes(state, tasks, verbose, engine, stats, trace, diversify,
+                             frontier, heuristic, budget, domain, nogoods):
+        yield p.plan
+
+def iter_plan_nodes(state, tasks, verbose=0, engine='copy', stats=None, trace=None, diversify=False,
+                    frontier='depth-first', heuristic=None, budget=None, domain=None,
+                    nogoods=None, bound=False):
+    """
+    Generate the search nodes that complete plans for tasks in state (see
+    find_first_node), one at a time. By default the search is depth-first:
+    it always expands the newest node in the frontier. If diversify is
+    true, then after the first, third, fifth, ... plan it continues from
+    the oldest node in the frontier instead, so that the next plan differs
+    from the last one near the root; this is the order multi_pyhop uses.
+    If budget is a Budget and the search runs out of it, raise
+    BudgetExhausted. bound is as in iter_search_steps.
+    """
+    for p in iter_search_steps(state, tasks, verbose, engine, stats, trace, diversify,
+                               frontier, heuristic, budget, domain, nogoods, bound):
+        if p is not None:
+            yield p
+
+def iter_search_steps(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                      diversify=False, frontier='depth-first', heuristic=None, budget=None,
+                      domain=None, nogoods=None, bound=False):
+    """
+    Search as iter_plan_nodes does, one step at a time: generate each node
+    that completes a plan, and None after each node that the search
+    expands, so that the caller can do other things between expansions
+    (as pyhop2_async does). The arguments are as in iter_plan_nodes. If
+    bound is true, the nodes have a cost attribute, the total cost of
+    their plans' actions, and once a plan has been found the search drops
+    the nodes that cost at least as much, as iter_cheaper_plan_nodes does.
+    """
+    meter = budget.start() if budget is not None else None
+    choices = frontiers[frontier](heuristic)
+    p = engines[engine](state, tasks, verbose, domain=domain)
+    p.stats = stats
+    p.trace = trace
+    p.nogoods = nogoods
+    if bound:
+        p.cost = 0
+    # The cost of the cheapest plan found so far, if bound is true
+    incumbent = None
+    # The search's scratch space is set only while it runs the domain's
+    # code, so that it doesn't leak to the caller between steps
+    scratch = {}
+    found = 0
     while True:
-        if p.is_complete():
-            plans.append(p.plan)
-            if len(plans) >= n:
-                return plans
-            else:
-                found = True
-                end = not end
+        oldest = False
+        if incumbent is not None and p.cost >= incumbent:
+            # Branch and bound: nothing below p can be cheaper. The subtree
+            # isn't searched, so nogoods doesn't hear of it at all
+            pass
+        elif p.is_complete():
+            if trace is not None:
+                trace.solution(p.depth, p.plan)
+            if nogoods is not None:
+                nogoods.solved(p)
+            if bound:
+                incumbent = p.cost
+                if verbose>1: print('found a plan of cost {}'.format(incumbent))
+            yield p
+            found += 1
+            oldest = diversify and found % 2 == 1
         else:
-            found = False
-            next_options = p.get_next_step()
-            if next_options:
-                for option in next_options:
-                    choices.append(option)
+            if meter is not None:
+                exhausted = meter.spend(len(choices))
+                if exhausted is not None:
+                    raise exhausted
+            token = _scratch.set(scratch)
+            try:
+                children = p.next_steps() if nogoods is None else _expand(p, nogoods, stats)[::-1]
+                pushed = choices.push_children(children)
+            finally:
+                _scratch.reset(token)
+            if not pushed and stats is not None:
+                stats.backtracks += 1
+            if stats is not None:
+                stats.frontier(len(choices))
+            yield None
         if choices:
-            if found and not end:
-                p = choices.popleft()
-            else:
-                p = choices.pop()
+            token = _scratch.set(scratch)
+            try:
+                p = choices.pop_oldest() if oldest else choices.pop()
+            finally:
+                _scratch.reset(token)
+        else:
+            if verbose>0:
+                print("** No plan found **" if found == 0 else "** No plans left to be found **")
+            return
+
+def find_cheapest_plan(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                       time_limit=None, domain=None, frontier='depth-first', heuristic=None,
+                       budget=None, nogoods=None):
+    """
+    Find a plan that accomplishes tasks in state and whose actions cost
+    the least in total (see declare_cost), and return (plan, cost), or
+    False if there is no plan. If time_limit (in seconds) or budget runs
+    out before the search finishes, return the cheapest plan found so far
+    instead, or the BudgetExhausted if none was found. The other
+    arguments are as in pyhop.
+    """
+    if verbose>0: print('** find_cheapest_plan, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
+    result = False
+    try:
+        for result in iter_cheaper_plans(state, tasks, verbose, engine, stats, trace, time_limit,
+                                         domain, frontier, heuristic, budget, nogoods):
+            pass
+    except BudgetExhausted as e:
+        if verbose>0: print('** {} **'.format(e))
+        if not result:
+            e.stats = stats
+            result = e
+    if verbose>0: print('** result =',result,'\n')
+    return result
+
+def iter_cheaper_plans(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                       time_limit=None, domain=None, frontier='depth-first', heuristic=None,
+                       budget=None, nogoods=None):
+    """
+    Generate (plan, cost) for plans that accomplish tasks in state, each
+    one cheaper than the one before; see iter_cheaper_plan_nodes.
+    """
+    for p in iter_cheaper_plan_nodes(state, tasks, verbose, engine, stats, trace, time_limit,
+                                     domain, frontier, heuristic, budget, nogoods):
+        yield (p.plan, p.cost)
+
+def iter_cheaper_plan_nodes(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                            time_limit=None, domain=None, frontier='depth-first', heuristic=None,
+                            budget=None, nogoods=None):
+    """
+    Search for plans that accomplish tasks in state, and generate the
+    search nodes that complete them (see find_first_node), each one with
+    a cheaper plan than the one before. A node's cost attribute is the
+    total cost of its plan's actions.
+
+    This is branch and bound: once a plan has been found, the nodes whose
+    partial plans cost at least as much as it are pruned. When the
+    generator ends, the last node it generated has a cheapest plan. If
+    time_limit (in seconds), which is added to budget, or budget runs out
+    first, it raises BudgetExhausted, whose plans attribute has the plans
+    it generated. The other arguments are as in iter_plan_nodes.
+    """
+    if time_limit is not None:
+        budget = _with_time_limit(budget, time_limit)
+    plans = []
+    try:
+        for p in iter_plan_nodes(state, tasks, verbose, engine, stats, trace, False, frontier,
+                                 heuristic, budget, domain, nogoods, bound=True):
+            plans.append(p.plan)
+            yield p
+    except BudgetExhausted as e:
+        e.plans = plans
+        raise
+
+def _with_time_limit(budget, time_limit):
+    """Return a copy of budget (or a new Budget) whose time limit is at most time_limit."""
+    if budget is None:
+        return Budget(time_limit=time_limit)
+    budget = copy.copy(budget)
+    if budget.time_limit is None or time_limit < budget.time_limit:
+        budget.time_limit = time_limit
+    return budget
+
+class Ancestry(object):
+    """
+    The fingerprints of the states on the path from the root of a search
+    to one of its nodes, as a linked list that the nodes share. index maps
+    each fingerprint to weak references to the Ancestry records that have
+    it, which remove themselves when the records are no longer in use, and
+    jump points to an ancestor chosen so that ancestor() takes O(log depth)
+    time (these are Myers' skew-binary jump pointers).
+    """
+    __slots__ = ('key', 'parent', 'depth', 'jump', 'index', '__weakref__')
+
+    def __init__(self, key, parent=None):
+        self.key = key
+        self.parent = parent
+        if parent is None:
+            self.depth = 0
+            self.jump = self
+            self.index = {}
         else:
-            if verbose>0: print("** No plans left to be found **")
-            return plans
+            self.depth = parent.depth + 1
+            jump = parent.jump
+            if parent.depth - jump.depth == jump.depth - jump.jump.depth:
+                self.jump = jump.jump
+            else:
+                self.jump = parent
+            self.index = parent.index
+        self.index.setdefault(key, []).append(_IndexRef(self))
+
+    def ancestor(self, depth):
+        """Return the record on the path to self whose depth is depth."""
+        node = self
+        while node.depth > depth:
+            if node.jump.depth >= depth:
+                node = node.jump
+            else:
+                node = node.parent
+        return node
+
+    def __contains__(self, key):
+        """Is key the fingerprint of self or of one of its ancestors?"""
+        for ref in self.index.get(key, ()):
+            node = ref()
+            if node is not None and node.depth <= self.depth and self.ancestor(node.depth) is node:
+                return True
+        return False
+
+class _IndexRef(weakref.ref):
+    """
+    A weak reference to an Ancestry record, in its index. When the record
+    dies, the reference removes itself from the index, so that the index
+    only grows with the number of nodes alive rather than created.
+    """
+    __slots__ = ('key', 'index')
+
+    def __new__(cls, record):
+        return weakref.ref.__new__(cls, record, _unindex)
+
+    def __init__(self, record):
+        weakref.ref.__init__(self, record, _unindex)
+        self.key = record.key
+        self.index = record.index
+
+def _unindex(ref):
+    refs = ref.index[ref.key]
+    refs.remove(ref)
+    if not refs:
+        del ref.index[ref.key]
+
+def push_tasks(tasks, rest=()):
+    """
+    Return the task stack that has the tasks in the list tasks on top of
+    the task stack rest. A task stack is () if it is empty, and otherwise
+    a _TaskStack (task, rest, hash), so stacks that differ only in their
+    top tasks share the rest.
+    """
+    for task in reversed(tasks):
+        rest = _TaskStack((task, rest, _push_hash(task, rest)))
+    return rest
+
+# The hash of the empty task stack
+_EMPTY_STACK_HASH = hash(())
+
+def _push_hash(task, rest):
+    """Return the hash of the stack with task on top of rest, or None if task isn't hashable."""
+    rest_hash = rest[2] if rest else _EMPTY_STACK_HASH
+    if rest_hash is None:
+        return None
+    try:
+        return hash((task, rest_hash))
+    except TypeError:
+        return None
+
+class _TaskStack(tuple):
+    """
+    A task stack that isn't empty: (task, rest, hash). hash is computed
+    from task and rest's hash when task is pushed, so that hashing a stack,
+    as NogoodTable does for every node, doesn't take time proportional to
+    its length. It is None if the stack has a task that can't be hashed.
+    """
+    __slots__ = ()
+
+    def __hash__(self):
+        if self[2] is None:
+            raise TypeError('a task stack with an unhashable task')
+        return self[2]
+
+    def __reduce__(self):
+        # Hashes of strings differ from one process to another
+        return (_restore_task_stack, (self[0], self[1]))
+
+def _restore_task_stack(task, rest):
+    return _TaskStack((task, rest, _push_hash(task, rest)))
+
+def task_list(stack):
+    """Return the tasks in the task stack stack, as a list."""
+    tasks = []
+    while stack:
+        tasks.append(stack[0])
+        stack = stack[1]
+    return tasks
+
+class Expansion(object):
+    """
+    How a search node was reached from its parent: method (a method, or
+    None if task is an action) expanded task into subtasks. The Expansions
+    on the path from the root, which has task None and the tasks to plan
+    for as its subtasks, are shared by the nodes below them.
+    """
+    __slots__ = ('parent', 'task', 'method', 'subtasks')
+
+    def __init__(self, parent, task, method, subtasks):
+        self.parent = parent
+        self.task = task
+        self.method = method
+        self.subtasks = subtasks
+
+    def path(self):
+        """Return the Expansions from the root to self, in that order."""
+        path = []
+        node = self
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        path.reverse()
+        return path
+
+    def plan(self):
+        """Return the actions on the path from the root to self."""
+        return [e.task for e in self.path() if e.subtasks is None]
+
+    def decomposition(self):
+        """
+        Return the decomposition tree built on the path from the root to
+        self, as a list with an entry (task, method name, subtrees) for
+        each of the root's tasks. method name is None for actions, and
+        for tasks that haven't been expanded yet.
+        """
+        path = self.path()
+        roots = [[t, None, []] for t in path[0].subtasks]
+        agenda = roots[::-1]
+        for e in path[1:]:
+            node = agenda.pop()
+            if e.subtasks is not None:
+                node[1] = e.method.__name__
+                node[2] = [[t, None, []] for t in e.subtasks]
+                agenda.extend(reversed(node[2]))
+        def freeze(node):
+            return (node[0], node[1], [freeze(n) for n in node[2]])
+        return [freeze(n) for n in roots]
 
 class PlannerStep:
-    def __init__(self, state, tasks, verbose, prev_states = set()):
+    """
+    A node in the search for a plan. Its tasks are kept in a task stack
+    (see push_tasks), and the way it was reached in an Expansion, so that
+    making a child node doesn't copy its parent's plan or tasks.
+    """
+    # The _Subtree record of the node's parent, if the search has a NogoodTable
+    memo = None
+    # The total cost of the plan's actions, if the search is branch and
+    # bound (see iter_search_steps)
+    cost = None
+    # The node's tasks and plan as lists, once something has asked for
+    # them with _shared_lists. A node that has them gives its children
+    # theirs, so that a search that needs them for every node, such as
+    # one with a heuristic frontier, doesn't rebuild them from the task
+    # stack and the Expansions each time.
+    _tasks = None
+    _plan = None
+
+    def __init__(self, state, tasks, verbose, ancestry=None, expansion=None, domain=None):
         self.verbose = verbose
         self.state = state
-        self.prev_states = {s for s in prev_states}
-        self.prev_states.add(str(state))
-        self.tasks = tasks
-        self.plan = []
+        self.domain = domain if domain is not None else current_domain()
+        if ancestry is None:
+            ancestry = Ancestry(fingerprint(state))
+        self.ancestry = ancestry
+        if expansion is None:
+            expansion = Expansion(None, None, None, list(tasks))
+            tasks = push_tasks(tasks)
+        self.stack = tasks
+        self.expansion = expansion
         self.depth = 0
+        self.stats = None
+        self.trace = None
+        self.nogoods = None
+
+    @property
+    def tasks(self):
+        return task_list(self.stack) if self._tasks is None else list(self._tasks)
+
+    @property
+    def plan(self):
+        return self.expansion.plan() if self._plan is None else list(self._plan)
+
+    def _shared_lists(self):
+        """
+        Return (tasks, plan), the node's tasks and plan as lists that the
+        node and its children share, which mustn't be changed.
+        """
+        if self._tasks is None:
+            self._tasks = task_list(self.stack)
+            self._plan = self.expansion.plan()
+        return (self._tasks, self._plan)
+
+    def _pass_lists(self, child, subtasks=None):
+        """
+        Give child its tasks and plan made from the node's, if it has
+        them. subtasks is what the node's first task was expanded into,
+        or None if it was an action.
+        """
+        if self._tasks is not None:
+            if subtasks is None:
+                child._tasks = self._tasks[1:]
+                child._plan = self._plan + [self._tasks[0]]
+            else:
+                child._tasks = list(subtasks) + self._tasks[1:]
+                child._plan = self._plan
+
+    def decomposition(self):
+        return self.expansion.decomposition()
 
     def is_complete(self):
-        return self.tasks == []
+        return self.stack == ()
+
+    def fingerprint(self):
+        """Return the fingerprint of the node's state."""
+        return self.ancestry.key
 
     def get_next_step(self):
+        """Return the node's children, in the order to push them onto a stack."""
+        children = list(self.next_steps())
+        children.reverse()
+        return children
+
+    def next_steps(self):
+        """
+        Expand the node, and return its children in the order that a
+        depth-first search tries them: a list, or an iterator that makes
+        them one at a time (see apply_method).
+        """
+        if self.stats is not None:
+            self.stats.expand(self)
+        if self.trace is not None:
+            self.trace.expand(self.depth, self.stack[0] if self.stack else None)
         if self.verbose > 1: print('depth {} tasks {}'.format(self.depth,self.tasks))
-        if self.tasks == []:
+        if self.stack == ():
             if self.verbose > 2: print('depth {} returns plan {}'.format(self.depth, self.plan))
             return [self]
-        task1 = self.tasks[0]
-        if task1[0] in operators:
+        task1 = self.stack[0]
+        (operator, relevant) = self.domain.table.get(task1[0], _UNKNOWN)
+        if operator is not None:
             if self.verbose > 2: print('depth {} action {}'.format(self.depth, task1))
-            return self.apply_operator(task1)
-        elif task1[0] in methods:
+            return self.apply_operator(task1, operator)
+        elif relevant is not None:
             if self.verbose > 2: print('depth {} method instance {}'.format(self.depth, task1))
-            return self.apply_method(task1)
+            return self.apply_method(task1, relevant)
         else:
             if self.verbose>2: print('depth {} returns failure'.format(self.depth))
+            self.fail(task1, 'unknown')
             return []
 
-    def apply_operator(self, task1):
-        operator = operators[task1[0]]
-        newstate = operator(copy.deepcopy(self.state), *task1[1:])
+    def run_operator(self, operator, state, task1):
+        """Apply operator to state for task1."""
+        if self.stats is not None:
+            return self.stats.apply_operator(self, operator, state, task1)
+        return operator(state, *task1[1:])
+
+    def run_method(self, method, task1):
+        """Return the subtask alternatives that method gives for task1."""
+        if self.stats is not None:
+            return self.stats.call_method(self, method, self.state, task1)
+        return method(self.state, *task1[1:])
+
+    def run_alternatives(self, alternatives):
+        """Generate the subtask lists that a method's iterator generates."""
+        return alternatives
+
+    def prune(self, task1, newstate):
+        if self.verbose > 2: print("Cycle; pruning...")
+        if self.stats is not None:
+            self.stats.prune(self, task1, newstate)
+        if self.trace is not None:
+            self.trace.prune(self.depth, task1)
+        if self.nogoods is not None:
+            self.nogoods.pruned()
+
+    def fail(self, task1, kind):
+        """Record that task1 failed; kind is as in a trace's 'fail' events."""
+        if self.trace is not None:
+            self.trace.fail(self.depth, task1, kind)
+
+    def apply_operator(self, task1, operator):
+        newstate = self.run_operator(operator, copy_state(self.state), task1)
         if self.verbose > 2:
             print('depth {} new state:'.format(self.depth))
             print_state(newstate)
         if newstate:
-            if str(newstate) in self.prev_states:
-                if self.verbose > 2: print("Cycle; pruning...")
+            key = fingerprint(newstate)
+            if key in self.ancestry:
+                self.prune(task1, newstate)
                 return []
             else:
-                return [self.operator_planner_step(newstate)]
+                if self.trace is not None:
+                    self.trace.apply(self.depth, task1, state_diff(self.state, newstate))
+                return [self.operator_planner_step(newstate, key)]
         else:
+            self.fail(task1, 'operator')
             return []
 
-    def operator_planner_step(self, newstate):
-        p = PlannerStep(newstate, self.tasks[1:], self.verbose, self.prev_states)
-        p.plan = self.plan + [self.tasks[0]]
+    def operator_planner_step(self, newstate, key):
+        ancestry = Ancestry(key, self.ancestry)
+        expansion = Expansion(self.expansion, self.stack[0], None, None)
+        p = PlannerStep(newstate, self.stack[1], self.verbose, ancestry, expansion, self.domain)
         p.depth = self.depth + 1
+        p.stats = self.stats
+        p.trace = self.trace
+        p.nogoods = self.nogoods
+        if self.cost is not None:
+            p.cost = self.cost + self.domain.action_cost(self.state, self.stack[0])
+        self._pass_lists(p)
         return p
 
-    def apply_method(self, task1):
-        relevant = methods[task1[0]]
-        planner_steps = []
+    def apply_method(self, task1, relevant):
+        """
+        Call task1's methods, and return an iterator that makes the
+        children for their subtask alternatives as the search gets to
+        them, in the order the search tries them: the last method's
+        first, and for each method, the last alternative in its list
+        first, or the alternatives its iterator generates in that order.
+        """
+        results = []
         for method in relevant:
-            subtask_alternatives = method(self.state, *task1[1:])
-            if subtask_alternatives:
+            subtask_alternatives = self.run_method(method, task1)
+            if isinstance(subtask_alternatives, Iterator):
+                results.append((method, self.run_alternatives(subtask_alternatives), True))
+            elif subtask_alternatives:
                 if self.verbose > 2:
                     print(len(subtask_alternatives), "alternative subtask lists")
-                for subtasks in subtask_alternatives:
-                    if self.verbose > 2:
+                    for subtasks in subtask_alternatives:
                         print('depth {} new tasks: {}'.format(self.depth, subtasks))
-                    planner_steps.append(self.method_planner_step(subtasks))
-        return planner_steps
+                results.append((method, reversed(subtask_alternatives), False))
+        if not results:
+            self.fail(task1, 'method')
+            return []
+        results.reverse()
+        return self._method_children(task1, results)
 
-    def method_planner_step(self, subtasks):
-        updated_tasks = subtasks + self.tasks[1:]
-        p = PlannerStep(self.state, updated_tasks, self.verbose, self.prev_states)
-        p.plan = self.plan
+    def _method_children(self, task1, results):
+        found = False
+        for (method, alternatives, generated) in results:
+            for subtasks in alternatives:
+                if generated and self.verbose > 2:
+                    print('depth {} new tasks: {}'.format(self.depth, subtasks))
+                found = True
+                yield self.method_planner_step(subtasks, method)
+        if not found:
+            self.fail(task1, 'method')
+
+    def method_planner_step(self, subtasks, method=None):
+        expansion = Expansion(self.expansion, self.stack[0], method, subtasks)
+        updated_tasks = push_tasks(subtasks, self.stack[1])
+        p = PlannerStep(self.state, updated_tasks, self.verbose, self.ancestry, expansion,
+                        self.domain)
         p.depth = self.depth + 1
+        p.stats = self.stats
+        p.trace = self.trace
+        p.nogoods = self.nogoods
+        p.cost = self.cost
+        self._pass_lists(p, subtasks)
         return p
+
+class _TrailStep(object):
+    """
+    An operator application in a search by the 'trail' engine. mark is
+    the length of the trail just after the operator was applied; it is
+    valid only while the step is on the path to the trail's current step.
+    """
+    __slots__ = ('parent', 'task', 'key', 'depth', 'mark')
+
+    def __init__(self, parent, task, key, mark):
+        self.parent = parent
+        self.task = task
+        self.key = key
+        self.depth = parent.depth + 1 if parent else 0
+        self.mark = mark
+
+class _Trail(object):
+    """The single state shared by all the TrailPlannerSteps of a search."""
+    def __init__(self, state, domain):
+        self.operators = domain.operators
+        self.log = []
+        self.state = TrailState(state, self.log)
+        self.current = _TrailStep(None, None, fingerprint(self.state), 0)
+        self.on_path = {self.current.key}
+
+    def undo(self, mark):
+        """Undo the changes made to the state since the trail had length mark."""
+        log = self.log
+        while len(log) > mark:
+            (undo, obj, arg1, arg2) = log.pop()
+            undo(obj, arg1, arg2)
+
+    def push(self, step):
+        self.current = step
+        self.on_path.add(step.key)
+
+    def goto(self, step):
+        """
+        Make the state be the one that step produced: backtrack to the
+        closest step that is on both paths, then replay the operators of
+        the steps that lead from there to step.
+        """
+        here = self.current
+        if here is step:
+            return
+        replay = []
+        while here.depth > step.depth:
+            self.on_path.discard(here.key)
+            here = here.parent
+        while step.depth > here.depth:
+            replay.append(step)
+            step = step.parent
+        while here is not step:
+            self.on_path.discard(here.key)
+            here = here.parent
+            replay.append(step)
+            step = step.parent
+        self.undo(here.mark)
+        self.current = here
+        for step in reversed(replay):
+            self.operators[step.task[0]](self.state, *step.task[1:])
+            step.mark = len(self.log)
+            self.push(step)
+
+class TrailPlannerStep(PlannerStep):
+    """
+    A PlannerStep for the 'trail' engine. Instead of a state of its own,
+    each step refers to a _TrailStep, and its state attribute restores the
+    search's shared state to that step before returning it. Operators must
+    modify and return the state they are given.
+    """
+    def __init__(self, state, tasks, verbose, domain=None):
+        if domain is None:
+            domain = current_domain()
+        trail = _Trail(state, domain)
+        expansion = Expansion(None, None, None, list(tasks))
+        self._init(trail, trail.current, push_tasks(tasks), expansion, verbose, domain)
+
+    def _init(self, trail, step, stack, expansion, verbose, domain):
+        self.verbose = verbose
+        self.domain = domain
+        self.trail = trail
+        self.step = step
+        self.stack = stack
+        self.expansion = expansion
+        self.depth = 0
+        self.stats = None
+        self.trace = None
+        self.nogoods = None
+
+    @property
+    def state(self):
+        self.trail.goto(self.step)
+        return self.trail.state
+
+    def fingerprint(self):
+        return self.step.key
+
+    def apply_operator(self, task1, operator):
+        state = self.state
+        trail = self.trail
+        mark = len(trail.log)
+        # The cost needs the state before the operator changes it
+        cost = None if self.cost is None else self.cost + self.domain.action_cost(state, task1)
+        newstate = self.run_operator(operator, state, task1)
+        if self.verbose > 2:
+            print('depth {} new state:'.format(self.depth))
+            print_state(newstate)
+        if newstate:
+            if newstate is not state:
+                raise ValueError("the 'trail' engine needs operator {} to return the "
+                                 "state it was given".format(task1[0]))
+            key = fingerprint(newstate)
+            if key in trail.on_path:
+                self.prune(task1, newstate)
+                trail.undo(mark)
+                return []
+            if self.trace is not None:
+                self.trace.apply(self.depth, task1, _trail_diff(state, trail.log[mark:]))
+            trail.push(_TrailStep(self.step, task1, key, len(trail.log)))
+            child = self.operator_planner_step(newstate, key)
+            child.cost = cost
+            return [child]
+        else:
+            self.fail(task1, 'operator')
+            trail.undo(mark)
+            return []
+
+    def run_alternatives(self, alternatives):
+        # The iterator works on the shared state, so restore the state to
+        # this step each time it runs
+        while True:
+            self.trail.goto(self.step)
+            try:
+                subtasks = next(alternatives)
+            except StopIteration:
+                return
+            yield subtasks
+
+    def operator_planner_step(self, newstate, key):
+        expansion = Expansion(self.expansion, self.stack[0], None, None)
+        p = self._child(self.trail.current, self.stack[1], expansion)
+        self._pass_lists(p)
+        return p
+
+    def method_planner_step(self, subtasks, method=None):
+        expansion = Expansion(self.expansion, self.stack[0], method, subtasks)
+        p = self._child(self.step, push_tasks(subtasks, self.stack[1]), expansion)
+        self._pass_lists(p, subtasks)
+        return p
+
+    def _child(self, step, stack, expansion):
+        p = TrailPlannerStep.__new__(TrailPlannerStep)
+        p._init(self.trail, step, stack, expansion, self.verbose, self.domain)
+        p.depth = self.depth + 1
+        p.stats = self.stats
+        p.trace = self.trace
+        p.nogoods = self.nogoods
+        p.cost = self.cost
+        return p
+
+# The search engines that pyhop, multi_pyhop, find_first_plan and
+# find_n_plans can use. Each one is called as engine(state, tasks, verbose,
+# domain=domain) to make the PlannerStep at the root of the search.
+# - 'copy' gives each PlannerStep a copy of the state (see copy_state).
+# - 'trail' has the operators modify a single state, and undoes their
+#   changes when it backtracks, so a search branch takes memory in
+#   proportion to the changes made on it rather than to the state's size.
+engines = {'copy': PlannerStep, 'trail': TrailPlannerStep}
+
+############################################################
+# Search frontiers
+#
+# A frontier holds the nodes that a search has made but not expanded yet,
+# and decides which one to expand next. push(node) adds a node, and
+# push_children(children) adds the children of a node, which children
+# gives in the order a depth-first search tries them (see next_steps),
+# and returns whether there were any. pop() removes and returns the next
+# node to expand, and pop_oldest() removes and returns the one that has
+# been waiting the longest, if the frontier keeps track of that
+# (otherwise it is the same as pop).
+
+def _push_children(frontier, children):
+    """Push children onto frontier one at a time, the last one first."""
+    children = list(children)
+    for child in reversed(children):
+        frontier.push(child)
+    return bool(children)
+
+class _Children(object):
+    """
+    Children of a node that a DepthFirst frontier hasn't returned yet:
+    next is the next one, and rest is the iterator that makes the others.
+    """
+    __slots__ = ('next', 'rest')
+
+    def __init__(self, next, rest):
+        self.next = next
+        self.rest = rest
+
+class DepthFirst(object):
+    """
+    Expand the newest node first, so that the search is depth-first. A
+    node's children are made only as the search gets to them, except for
+    the one it expands next, so the frontier keeps one entry per level of
+    the search, rather than every alternative at every level.
+    """
+    def __init__(self, heuristic=None):
+        self.nodes = deque()
+
+    def push(self, node):
+        self.nodes.append(node)
+
+    def push_children(self, children):
+        if type(children) is list:
+            self.nodes.extend(reversed(children))
+            return bool(children)
+        children = iter(children)
+        for child in children:
+            self.nodes.append(_Children(child, children))
+            return True
+        return False
+
+    def pop(self):
+        top = self.nodes[-1]
+        if type(top) is not _Children:
+            return self.nodes.pop()
+        node = top.next
+        top.next = next(top.rest, None)
+        if top.next is None:
+            self.nodes.pop()
+        return node
+
+    def pop_oldest(self):
+        bottom = self.nodes[0]
+        if type(bottom) is not _Children:
+            return self.nodes.popleft()
+        # The oldest node is the last of these children, so make the rest
+        rest = list(bottom.rest)
+        if not rest:
+            self.nodes.popleft()
+            return bottom.next
+        node = rest.pop()
+        bottom.rest = iter(rest)
+        return node
+
+    def __len__(self):
+        return len(self.nodes)
+
+class BreadthFirst(DepthFirst):
+    """
+    Expand the oldest node first, so that the search is breadth-first and
+    finds the plans with the fewest decomposition steps first.
+    """
+    def pop(self):
+        return self.nodes.popleft()
+
+    def push_children(self, children):
+        return _push_children(self, children)
+
+class GreedyBestFirst(object):
+    """
+    Expand first the node for which heuristic(state, tasks, plan) is the
+    smallest, where tasks are the node's remaining tasks and plan is its
+    partial plan; of nodes with the same value, expand the newest first.
+    The lists tasks and plan are shared with the search, so heuristic
+    mustn't change them.
+    """
+    def __init__(self, heuristic):
+        if heuristic is None:
+            raise ValueError('the {} frontier needs a heuristic'.format(type(self).__name__))
+        self.heuristic = heuristic
+        self.heap = []
+        self.count = 0
+
+    def priority(self, node):
+        (tasks, plan) = node._shared_lists()
+        return self.heuristic(node.state, tasks, plan)
+
+    def push(self, node):
+        self.count += 1
+        heapq.heappush(self.heap, (self.priority(node), -self.count, node))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+    pop_oldest = pop
+
+    def push_children(self, children):
+        return _push_children(self, children)
+
+    def __len__(self):
+        return len(self.heap)
+
+class BestFirst(GreedyBestFirst):
+    """
+    Like GreedyBestFirst, but expand first the node for which
+    len(plan) + heuristic(state, tasks, plan) is the smallest, as in A*
+    search with every action costing 1. If the heuristic never
+    overestimates the number of actions still needed, the first plan
+    found is a shortest one.
+    """
+    def priority(self, node):
+        (tasks, plan) = node._shared_lists()
+        return len(plan) + self.heuristic(node.state, tasks, plan)
+
+# The frontiers that pyhop, multi_pyhop, find_first_plan, find_n_plans and
+# iter_plans can use. Each one is called as frontier(heuristic) to make
+# the frontier for a search. Using a state in a heuristic with the
+# 'trail' engine restores the search's shared state to that node, so the
+# heuristic frontiers work best with the 'copy' engine.
+frontiers = {'depth-first': DepthFirst, 'breadth-first': BreadthFirst,
+             'greedy': GreedyBestFirst, 'best-first': BestFirst}
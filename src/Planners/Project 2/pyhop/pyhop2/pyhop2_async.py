@@ -0,0 +1,99 @@
+"""
+asyncio versions of pyhop2's planners, for programs that plan inside an
+event loop. They search exactly like pyhop2.pyhop, pyhop2.multi_pyhop and
+pyhop2.iter_plans, and take the same arguments, plus two more: every
+`every` node expansions, or once `interval` seconds have gone by since
+the last time, whichever comes first, they let the event loop run its
+other tasks. Cancelling the task that is planning stops the search; the
+asyncio.CancelledError is raised where the search was waiting.
+
+    plan = await pyhop2_async.plan(state, tasks)
+    async for plan in pyhop2_async.iter_plans(state, tasks):
+        ...
+
+A single node expansion can't be interrupted, so an operator or method
+that takes a long time delays the other tasks by that long. The
+synchronous planners in pyhop2 are unchanged.
+"""
+
+import asyncio, time
+
+import pyhop2
+
+
+async def plan(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+               frontier='depth-first', heuristic=None, budget=None, domain=None,
+               nogoods=None, every=100, interval=0.01):
+    """
+    Like pyhop2.pyhop: return a plan that accomplishes tasks in state,
+    False if there isn't one, or a pyhop2.BudgetExhausted.
+    """
+    if verbose>0: print('** pyhop, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
+    nodes = iter_plan_nodes(state, tasks, verbose, engine, stats, trace, False,
+                            frontier, heuristic, budget, domain, nogoods, every, interval)
+    result = False
+    try:
+        async for p in nodes:
+            result = p.plan
+            break
+    except pyhop2.BudgetExhausted as e:
+        e.stats = stats
+        result = e
+    finally:
+        await nodes.aclose()
+    if verbose>0: print('** result =',result,'\n')
+    return result
+
+async def multi_plan(state, tasks, n, verbose=0, engine='copy', stats=None, trace=None,
+                     frontier='depth-first', heuristic=None, budget=None, domain=None,
+                     nogoods=None, every=100, interval=0.01):
+    """
+    Like pyhop2.multi_pyhop: return a list of up to n plans that
+    accomplish tasks in state, or a pyhop2.BudgetExhausted.
+    """
+    plans = []
+    if n <= 0:
+        return plans
+    nodes = iter_plan_nodes(state, tasks, verbose, engine, stats, trace, True,
+                            frontier, heuristic, budget, domain, nogoods, every, interval)
+    try:
+        async for p in nodes:
+            plans.append(p.plan)
+            if len(plans) >= n:
+                break
+    except pyhop2.BudgetExhausted as e:
+        e.stats = stats
+        e.plans = plans
+        return e
+    finally:
+        await nodes.aclose()
+    return plans
+
+async def iter_plans(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                     diversify=False, frontier='depth-first', heuristic=None, budget=None,
+                     domain=None, nogoods=None, every=100, interval=0.01):
+    """Like pyhop2.iter_plans, as an asynchronous generator."""
+    async for p in iter_plan_nodes(state, tasks, verbose, engine, stats, trace, diversify,
+                                   frontier, heuristic, budget, domain, nogoods, every,
+                                   interval):
+        yield p.plan
+
+async def iter_plan_nodes(state, tasks, verbose=0, engine='copy', stats=None, trace=None,
+                          diversify=False, frontier='depth-first', heuristic=None, budget=None,
+                          domain=None, nogoods=None, every=100, interval=0.01):
+    """Like pyhop2.iter_plan_nodes, as an asynchronous generator."""
+    steps = pyhop2.iter_search_steps(state, tasks, verbose, engine, stats, trace, diversify,
+                                     frontier, heuristic, budget, domain, nogoods)
+    expanded = 0
+    pause = time.perf_counter() + interval
+    try:
+        for p in steps:
+            if p is not None:
+                yield p
+                continue
+            expanded += 1
+            if expanded % every == 0 or time.perf_counter() >= pause:
+                await asyncio.sleep(0)
+                pause = time.perf_counter() + interval
+    finally:
+        steps.close()
@@ -0,0 +1,346 @@
+"""
+A plan cache on disk, for programs that plan for the same problems again
+and again, from one run to the next. PlanCache.pyhop plans like
+pyhop2.pyhop (or another planner, such as pyhop's pyhop), but first looks
+the problem up in an SQLite file, and afterwards stores the result there:
+the plan, or False if there is none, so that problems that can't be
+solved aren't searched again either.
+
+    cache = pyhop2_cache.PlanCache('plans.db')
+    plan = cache.pyhop(state, tasks)
+    plan = cache.pyhop(state, tasks, planner=pyhop.pyhop, domain=office)
+
+A problem's key is a hash of
+- the state's variables and values: the same whatever the order in which
+  they and the entries of dicts and sets were added, whatever the state's
+  name, and whether it is a State, a CowState or a CompactState (see
+  canonical). Making a variable rigid turns its lists into tuples, which
+  changes the key, since a list and a tuple are different values
+- the tasks, and the planner's other arguments, except for verbose,
+  stats, trace, budget and nogoods, which don't change what it returns
+- the domain's version (see domain_version), so that changing the code of
+  an operator or a method makes new keys, rather than returning plans
+  that the domain no longer finds
+- the planner's code
+
+The file keeps the max_entries most recently used results, and the
+PlanCache object keeps the last memory_entries that it used in a dict, so
+that most hits don't read the file at all. The file is a pickle store:
+only open ones that you trust.
+"""
+
+import hashlib, pickle, sqlite3, threading, time, weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import partial
+from types import CodeType, FunctionType
+
+import pyhop2
+
+# The results that a cache file keeps
+MAX_ENTRIES = 10000
+
+# The results that a PlanCache keeps in memory
+MEMORY_ENTRIES = 1000
+
+# A PlanCache writes the times at which its entries were used to the file
+# every FLUSH_EVERY hits, and whenever it stores a result
+FLUSH_EVERY = 100
+
+# The planners' arguments that don't change what they return
+_UNKEYED = frozenset(['verbose', 'stats', 'trace', 'budget', 'nogoods'])
+
+_KEY_ATOMIC = frozenset([type(None), bool, int, float, complex, str, bytes])
+
+_MISSING = object()
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+############################################################
+# Canonical forms
+
+# The canonical form of each rigid dict, by its key; an entry is removed
+# when its dict is no longer in use
+_rigid_forms = {}
+
+def canonical(value):
+    """
+    Return a string that describes value, such that equal values get the
+    same string whatever the order of the entries of their dicts and sets.
+    value may be made of atomic values (None, bools, numbers, strings),
+    dicts and other mappings, lists, tuples, sets, functions (described by
+    code_digest), states and objects whose variables are such values.
+    A list and a tuple with the same items get different strings, as they
+    aren't equal.
+    """
+    cls = type(value)
+    if cls in _KEY_ATOMIC:
+        return repr(value)
+    elif cls is pyhop2.RigidDict:
+        form = _rigid_forms.get(value._key)
+        if form is None:
+            form = _rigid_forms[value._key] = _mapping_form(value)
+            weakref.finalize(value, _rigid_forms.pop, value._key, None)
+        return form
+    elif isinstance(value, (dict, Mapping)):
+        return _mapping_form(value)
+    elif isinstance(value, list):
+        return '[' + ','.join([canonical(v) for v in value]) + ']'
+    elif isinstance(value, tuple):
+        return 't[' + ','.join([canonical(v) for v in value]) + ']'
+    elif isinstance(value, (set, frozenset)):
+        return '{' + ','.join(sorted([canonical(v) for v in value])) + '}'
+    elif cls is FunctionType:
+        return 'f' + code_digest(value)
+    try:
+        variables = vars(value)
+    except TypeError:
+        raise TypeError("can't make a cache key of a {}".format(cls.__name__))
+    return '<' + ','.join(sorted([name + '=' + canonical(v)
+                                  for (name, v) in variables.items() if name != '__name__'])) + '>'
+
+def _mapping_form(value):
+    return '(' + ','.join(sorted([canonical(k) + ':' + canonical(v)
+                                  for (k, v) in value.items()])) + ')'
+
+
+############################################################
+# Code and domain versions
+
+# The digest of each function's code, made the first time it is asked for
+_code_digests = weakref.WeakKeyDictionary()
+
+def code_digest(func):
+    """
+    Return a digest of the code of the function func: its bytecode and
+    constants, the default values of its arguments, and the values of the
+    global variables it uses that are atomic or that are functions of the
+    same module, whose code it follows in the same way; for a
+    functools.partial, the function's and the arguments'. Code that it
+    calls in other modules, or through classes or other objects, doesn't
+    count. It is computed once for each function.
+    """
+    digest = _code_digests.get(func)
+    if digest is None:
+        digest = _digest(_function_text(func, set()))
+        try:
+            _code_digests[func] = digest
+        except TypeError:
+            pass
+    return digest
+
+def _function_text(func, seen):
+    seen.add(func)
+    if type(func) is partial:
+        return 'partial({}, {}, {})'.format(_function_text(func.func, seen), canonical(func.args),
+                                           canonical(sorted(func.keywords.items())))
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return '{}.{}'.format(getattr(func, '__module__', None),
+                              getattr(func, '__qualname__', type(func).__qualname__))
+    parts = [func.__qualname__, _code_text(code)]
+    values = list(func.__defaults__ or ())
+    for cell in func.__closure__ or ():
+        try:
+            values.append(cell.cell_contents)
+        except ValueError:
+            values.append(_MISSING)
+    for value in values:
+        parts.append(repr(value) if type(value) in _KEY_ATOMIC else type(value).__name__)
+    module_globals = func.__globals__
+    for name in sorted(_global_names(code)):
+        value = module_globals.get(name, _MISSING)
+        if type(value) in _KEY_ATOMIC:
+            parts.append('{}={!r}'.format(name, value))
+        elif (type(value) is FunctionType and value.__module__ == func.__module__
+              and value not in seen):
+            parts.append('{}={}'.format(name, _function_text(value, seen)))
+    return '\n'.join(parts)
+
+def _code_text(code):
+    consts = [_const_text(c) for c in code.co_consts]
+    return repr((code.co_code, consts, code.co_names, code.co_varnames, code.co_freevars))
+
+def _const_text(const):
+    """Return a description of a code object's constant that is the same in every process."""
+    cls = type(const)
+    if cls is CodeType:
+        return _code_text(const)
+    elif cls is frozenset:
+        # The order of a frozenset's elements, and so its repr, depends on
+        # the process's PYTHONHASHSEED
+        return 'frozenset({' + ','.join(sorted([_const_text(c) for c in const])) + '})'
+    elif cls is tuple:
+        return '(' + ''.join([_const_text(c) + ',' for c in const]) + ')'
+    return repr(const)
+
+def _global_names(code):
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if type(c) is CodeType:
+            names |= _global_names(c)
+    return names
+
+# The version of each domain, with the table and costs it was made for;
+# the domain's declare_ methods make a new table (see pyhop2.Domain)
+_domain_versions = weakref.WeakKeyDictionary()
+
+def domain_version(domain):
+    """
+    Return a digest of domain's operators, methods (in order) and costs,
+    with the code of each of them (see code_digest).
+    """
+    costs = dict(getattr(domain, 'costs', {}))
+    known = _domain_versions.get(domain)
+    if known is not None and known[0] is domain.table and known[1] == costs:
+        return known[2]
+    parts = []
+    for (name, operator) in sorted(domain.operators.items()):
+        parts.append('o {} {}'.format(name, code_digest(operator)))
+    for (name, relevant) in sorted(domain.methods.items()):
+        parts.append('m {} {}'.format(name, ' '.join([code_digest(m) for m in relevant])))
+    for (name, cost) in sorted(costs.items()):
+        parts.append('c {} {}'.format(name, code_digest(cost) if callable(cost) else repr(cost)))
+    version = _digest('\n'.join(parts))
+    _domain_versions[domain] = (domain.table, costs, version)
+    return version
+
+def plan_key(state, tasks, planner, domain, options=None):
+    """
+    Return the key under which a PlanCache keeps what planner returns for
+    state and tasks in domain, with the other arguments in the dict options.
+    """
+    options = sorted((name, value) for (name, value) in (options or {}).items()
+                     if name not in _UNKEYED)
+    return _digest('\n'.join([code_digest(planner), domain_version(domain),
+                              canonical(state), canonical(tasks), canonical(options)]))
+
+
+############################################################
+# Plan caches
+
+class PlanCache(object):
+    """
+    The results of planners, in the SQLite file path (created if need be),
+    which keeps the max_entries most recently used ones, and the last
+    memory_entries of them that this object used in memory. Several
+    threads and processes can use the same file.
+    """
+    def __init__(self, path, max_entries=MAX_ENTRIES, memory_entries=MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, result BLOB, used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS plans_used ON plans (used)')
+        self._db.commit()
+
+    def __repr__(self):
+        return '<PlanCache {}>'.format(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM plans').fetchone()[0]
+
+    def pyhop(self, state, tasks, verbose=0, planner=None, domain=None, **options):
+        """
+        Return what planner (by default pyhop2.pyhop) returns for state and
+        tasks in domain, with the other arguments in options: from the
+        cache if it is there, and otherwise by calling planner, and caching
+        the result if it is a plan (or a list or tuple) or False. A result
+        from the cache doesn't fill in stats or trace. domain is by default
+        pyhop2's current domain, so pass it for a planner with current
+        domains of its own, such as pyhop's pyhop.
+        """
+        if planner is None:
+            planner = pyhop2.pyhop
+        if domain is None:
+            domain = pyhop2.current_domain()
+        key = plan_key(state, tasks, planner, domain, options)
+        result = self.get(key, _MISSING)
+        if result is _MISSING:
+            self.misses += 1
+            result = planner(state, tasks, verbose, domain=domain, **options)
+            if result is False or type(result) in (list, tuple):
+                self.put(key, result)
+        else:
+            self.hits += 1
+            if verbose>0: print('** plan cache hit, state = {}, tasks = {}\n** result = {}\n'.format(
+                state.__name__, tasks, result))
+        return result
+
+    def get(self, key, default=None):
+        """Return the result cached under key, or default if there is none."""
+        with self._lock:
+            result = self._memory.get(key, _MISSING)
+            if result is not _MISSING:
+                self._memory.move_to_end(key)
+            else:
+                row = self._db.execute('SELECT result FROM plans WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return default
+                result = pickle.loads(row[0])
+                self._remember(key, result)
+            self._touched[key] = time.time()
+            if len(self._touched) >= FLUSH_EVERY:
+                self._flush()
+        # Callers may change the plans they get
+        return list(result) if type(result) is list else result
+
+    def put(self, key, result):
+        """Cache result under key, and evict the least recently used results if need be."""
+        data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, list(result) if type(result) is list else result)
+            self._touched.pop(key, None)
+            self._db.execute('INSERT OR REPLACE INTO plans VALUES (?, ?, ?)', (key, data, time.time()))
+            self._flush()
+            excess = self._db.execute('SELECT COUNT(*) FROM plans').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute('DELETE FROM plans WHERE key IN '
+                                 '(SELECT key FROM plans ORDER BY used LIMIT ?)', (excess,))
+            self._db.commit()
+
+    def clear(self):
+        """Remove every result from the cache."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._db.execute('DELETE FROM plans')
+            self._db.commit()
+
+    def close(self):
+        """Write the times at which entries were used to the file, and close it."""
+        with self._lock:
+            if self._db is not None:
+                self._flush()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush(self):
+        if self._touched:
+            self._db.executemany('UPDATE plans SET used = ? WHERE key = ?',
+                                 [(used, key) for (key, used) in self._touched.items()])
+            self._touched.clear()
+            self._db.commit()
@@ -0,0 +1,344 @@
+"""
+Planning on a pool of worker processes, in two ways:
+
+- multi_plan and iter_plans enumerate the plans for one problem, for
+  problems such as the blocks world with blocks_world_methods3_p2, whose
+  decomposition trees have more plans than one core can enumerate in
+  reasonable time.
+
+    plans = pyhop2_parallel.multi_plan(state, tasks, 1000, workers=8)
+    for plan in pyhop2_parallel.iter_plans(state, tasks):
+        ...
+
+- plan_batch and iter_batch plan for many independent problems at once.
+
+    plans = pyhop2_parallel.plan_batch(domain, [(state1, tasks1), ...])
+
+The search is split into pieces, each of which is a list of search
+nodes that come one after another in a depth-first search. A node is
+sent as its tasks and the plan that leads to it, and the worker that gets
+it applies the plan's actions to the problem's state again, which gives
+it the node's state and the fingerprints of the states on the way there,
+for cycle detection (the fingerprints of one process mean nothing to
+another, as they are made with hash(), which differs between processes). A worker searches its piece depth-first, and once it
+has expanded chunk_nodes nodes it sends back the plans it found and the
+nodes it hadn't expanded yet, split into as many pieces as there are
+workers, for whichever workers are free. So large parts of the search
+are shared out as it goes on, and small ones are finished in one go.
+
+The plans come out in the order in which a depth-first search finds them
+(pyhop2.iter_plans, without diversify), whatever the number of workers
+and however long each piece takes: a piece's plans are only given out
+when all of the pieces before it have finished. So there is no random
+seed to give: the same problem always gives the same plans in the same
+order. Different decompositions can give the same plan, and by default
+each plan comes out only once, which means remembering every plan given
+out so far; iter_plans(..., distinct=False) doesn't, and gives the same
+plans as pyhop2.iter_plans, duplicates included.
+
+The workers search with the 'copy' engine, and get the domain (and for
+iter_plans, the problem's state) when they start: with the 'fork' start
+method, as it is; otherwise pickled, which needs its operators, methods
+and costs to be functions that their modules define at the top level.
+States and tasks are pickled too, and each worker keeps one copy of each
+rigid value in them (see pyhop2.rigid). For iter_plans, an operator must
+give the same state whenever it is applied to the same state.
+"""
+
+import heapq, os, pickle, traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import pyhop2
+
+
+def multi_plan(state, tasks, n, workers=None, verbose=0, domain=None, chunk_nodes=1000):
+    """
+    Return a list of the first n different plans that accomplish tasks in
+    state, in the order pyhop2.iter_plans finds them, searching on workers
+    processes (by default, one for each CPU). domain is as in pyhop2.pyhop.
+    """
+    if verbose>0: print('** multi_plan, verbose={}: **\n   state = {}\n   tasks = {}'.format(verbose, state.__name__, tasks))
+    plans = []
+    if n > 0:
+        results = iter_plans(state, tasks, workers, verbose, domain, chunk_nodes)
+        try:
+            for plan in results:
+                plans.append(plan)
+                if len(plans) >= n:
+                    break
+        finally:
+            results.close()
+    if verbose>0: print('** found', len(plans), 'plans **\n')
+    return plans
+
+def iter_plans(state, tasks, workers=None, verbose=0, domain=None, chunk_nodes=1000,
+               distinct=True):
+    """
+    Generate the plans that accomplish tasks in state, in the order
+    pyhop2.iter_plans finds them, searching on workers processes. If
+    distinct is true, each plan only once, which takes memory for each
+    plan generated until the generator finishes; otherwise, every plan
+    found, as pyhop2.iter_plans does. The workers stop when the generator
+    is closed.
+    """
+    if domain is None:
+        domain = pyhop2.current_domain()
+    workers = workers or os.cpu_count()
+    pool = ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(domain, state))
+    # Each piece has a key, a tuple; the plans a piece found have its key
+    # + (0,), and the pieces it was split into its key + (1,), + (2,), ...
+    # So the plans are in order of their pieces' keys.
+    pending = {}
+    chunks = []
+    seen = set() if distinct else None
+    def submit(piece, key):
+        pending[pool.submit(_search, piece, chunk_nodes, workers)] = key
+    try:
+        submit([(list(tasks), [])], ())
+        while pending:
+            (done, unused) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                (plans, pieces) = future.result()
+                if verbose>1:
+                    print('piece {}: {} plans, split into {} pieces'.format(key, len(plans), len(pieces)))
+                heapq.heappush(chunks, (key + (0,), plans))
+                for (i, piece) in enumerate(pieces):
+                    submit(piece, key + (i+1,))
+            # The pieces that come later are split from ones that are
+            # pending, so the plans before the first pending piece are final
+            first = min(pending.values()) if pending else None
+            while chunks and (first is None or chunks[0][0] < first):
+                for plan in heapq.heappop(chunks)[1]:
+                    if seen is None:
+                        yield plan
+                    elif _plan_key(plan) not in seen:
+                        seen.add(_plan_key(plan))
+                        yield plan
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _plan_key(plan):
+    """Return a hashable key that is the same for equal plans."""
+    key = tuple(plan)
+    try:
+        hash(key)
+    except TypeError:
+        return repr(plan)
+    return key
+
+
+def plan_batch(domain, problems, workers=None, planner=pyhop2.pyhop, time_limit=None,
+               chunk_size=None):
+    """
+    Plan for each (state, tasks) in problems, in domain, and return the
+    results in the same order; see iter_batch.
+    """
+    results = [None] * len(problems)
+    for (i, result) in iter_batch(domain, problems, workers, planner, time_limit, chunk_size):
+        results[i] = result
+    return results
+
+def iter_batch(domain, problems, workers=None, planner=pyhop2.pyhop, time_limit=None,
+               chunk_size=None, ordered=False):
+    """
+    Plan for each (state, tasks) in problems, in domain, on workers
+    processes (by default, one for each CPU), and generate (i, result)
+    for each problems[i] as the workers finish them, or in the order of
+    problems if ordered is true.
+
+    Each result is what planner(state, tasks, budget=budget, domain=domain)
+    returned: by default planner is pyhop2.pyhop, and for pyhop's domains
+    it could be pyhop.pyhop. If time_limit is given, budget is a
+    pyhop2.Budget with that time limit, and a problem that takes longer
+    gets a BudgetExhausted. If the planner raises an exception, or the
+    worker dies, the result is a ProblemFailed. Either way, the other
+    problems aren't affected.
+
+    The problems are sent to the workers in chunks of chunk_size (by
+    default, enough for each worker to get about four chunks), each
+    pickled once, so that values that its states share are sent only
+    once, and up to workers chunks at a time. If a worker dies, the chunks
+    that were being planned for are planned for again on a new pool, one
+    at a time, and a chunk that kills its worker again one problem at a
+    time, so that only the problem that killed it gets a ProblemFailed.
+    """
+    problems = list(problems)
+    workers = workers or os.cpu_count()
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(problems) // (4 * workers)))
+    budget = pyhop2.Budget(time_limit=time_limit) if time_limit is not None else None
+    def new_pool():
+        return ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(domain,))
+    # (start, size) of the chunks to plan for, and of the ones that were
+    # being planned for when a worker died, which are planned for alone
+    chunks = deque((start, min(chunk_size, len(problems) - start))
+                   for start in range(0, len(problems), chunk_size))
+    suspects = deque()
+    pool = new_pool()
+    pending = {}
+    done_results = {}
+    next_result = 0
+    def submit(start, size, alone):
+        data = pickle.dumps(problems[start:start+size], pickle.HIGHEST_PROTOCOL)
+        pending[pool.submit(_plan_chunk, data, planner, budget)] = (start, size, alone)
+    try:
+        while chunks or suspects or pending:
+            if suspects:
+                if not pending:
+                    submit(*suspects.popleft(), alone=True)
+            else:
+                while chunks and len(pending) < workers:
+                    submit(*chunks.popleft(), alone=False)
+            (done, unused) = wait(pending, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                # The rest of the pending chunks fail at once, or have finished
+                (done, unused) = wait(pending)
+                pool.shutdown(wait=True)
+                pool = new_pool()
+            for future in done:
+                (start, size, alone) = pending.pop(future)
+                try:
+                    results = pickle.loads(future.result())
+                except BrokenProcessPool:
+                    if not alone:
+                        suspects.append((start, size))
+                        continue
+                    elif size > 1:
+                        suspects.extendleft((i, 1) for i in reversed(range(start, start + size)))
+                        continue
+                    results = [ProblemFailed('the worker died while it planned for this problem')]
+                except Exception as e:
+                    results = [ProblemFailed('the worker failed: {!r}'.format(e))
+                               for i in range(size)]
+                if not ordered:
+                    for (i, result) in enumerate(results):
+                        yield (start + i, result)
+                else:
+                    for (i, result) in enumerate(results):
+                        done_results[start + i] = result
+            while next_result in done_results:
+                yield (next_result, done_results.pop(next_result))
+                next_result += 1
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+class ProblemFailed(Exception):
+    """
+    The result of a problem in a batch for which the planner raised an
+    exception, or whose worker died. It is false, like a failed search,
+    and message says what went wrong, and traceback where, if known.
+    """
+    def __init__(self, message, traceback=None):
+        Exception.__init__(self, message, traceback)
+        self.message = message
+        self.traceback = traceback
+
+    def __str__(self):
+        return self.message
+
+    def __bool__(self):
+        return False
+
+
+### in the workers
+
+# The domain that this worker searches in, and the state at the root of
+# the search, for iter_plans
+_domain = None
+_root = None
+
+def _start_worker(domain, root=None):
+    global _domain, _root
+    _domain = domain
+    _root = root
+
+def _plan_chunk(data, planner, budget):
+    """Plan for each problem in a pickled chunk, and return the pickled results."""
+    results = []
+    for (state, tasks) in pickle.loads(data):
+        try:
+            result = planner(state, tasks, budget=budget, domain=_domain)
+        except Exception as e:
+            result = ProblemFailed('{}: {}'.format(type(e).__name__, e), traceback.format_exc())
+        results.append(result)
+    try:
+        return pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return pickle.dumps([_picklable(result) for result in results], pickle.HIGHEST_PROTOCOL)
+
+def _picklable(result):
+    """Return result, or a ProblemFailed if it can't be pickled."""
+    try:
+        pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return ProblemFailed("the result can't be pickled: {}: {}".format(type(e).__name__, e))
+    return result
+
+def _search(piece, chunk_nodes, split):
+    """
+    Search the nodes in piece depth-first, one after the other. Each node
+    is (tasks, plan), where plan is the plan that leads to it from the
+    root of the whole search. Return the plans found, and the nodes that
+    hadn't been searched after chunk_nodes nodes were expanded, in the
+    order in which the search would have got to them, split into up to
+    split pieces.
+    """
+    choices = deque(reversed(_nodes(piece)))
+    plans = []
+    nodes = 0
+    token = pyhop2._scratch.set({})
+    try:
+        while choices and nodes < chunk_nodes:
+            p = choices.pop()
+            if p.is_complete():
+                plans.append(p.plan)
+            else:
+                choices.extend(p.get_next_step())
+                nodes += 1
+    finally:
+        pyhop2._scratch.reset(token)
+    rest = [(p.tasks, p.plan) for p in reversed(choices)]
+    size = max(1, -(-len(rest) // split))
+    return (plans, [rest[i:i+size] for i in range(0, len(rest), size)])
+
+def _nodes(piece):
+    """
+    Return PlannerSteps for the nodes of a piece that _search gets, by
+    applying their plans' actions to the root state. The nodes of a piece
+    come one after another in a depth-first search, so their plans mostly
+    start the same way, and the actions that they start with in common
+    with the node before are applied only once.
+    The worker doesn't know the methods that led to a node, so the root
+    of its decomposition (see PlannerStep.decomposition) has the plan's
+    actions and then the node's tasks as its tasks.
+    """
+    # The actions of the last node's plan, and the states and Ancestry
+    # records that they led to, starting with the root's
+    actions = []
+    path = [(_root, pyhop2.Ancestry(pyhop2.fingerprint(_root)))]
+    nodes = []
+    for (tasks, plan) in piece:
+        common = 0
+        while common < len(actions) and common < len(plan) and actions[common] == plan[common]:
+            common += 1
+        del actions[common:]
+        del path[common+1:]
+        for action in plan[common:]:
+            (state, ancestry) = path[-1]
+            newstate = _domain.operators[action[0]](pyhop2.copy_state(state), *action[1:])
+            if not newstate:
+                raise RuntimeError('{} failed when it was applied again'.format(action))
+            actions.append(action)
+            path.append((newstate, pyhop2.Ancestry(pyhop2.fingerprint(newstate), ancestry)))
+        # A root whose tasks are the plan's actions and then the node's
+        # tasks, and the actions expanded from it
+        expansion = pyhop2.Expansion(None, None, None, list(plan) + list(tasks))
+        for action in plan:
+            expansion = pyhop2.Expansion(expansion, action, None, None)
+        (state, ancestry) = path[-1]
+        nodes.append(pyhop2.PlannerStep(state, pyhop2.push_tasks(tasks), 0, ancestry, expansion,
+                                        _domain))
+    return nodes
@@ -0,0 +1,91 @@
+"""
+Reads a search trace written by pyhop2.PlanTracer (in either format),
+and prints the events that match the filters, one JSON object per line,
+or with --summary, tables of how many events of each kind there were at
+each depth, for each task name and for each operator.
+
+Usage: python read_trace.py TRACE [--event e1 e2 ...] [--task name ...]
+                            [--depth n | --depth min:max] [--summary]
+
+For example, to see the actions applied at depths 10 to 20:
+    python read_trace.py run.jsonl --event apply --depth 10:20
+"""
+
+from __future__ import print_function
+import argparse, json, sys
+from collections import Counter, defaultdict
+
+import pyhop2
+
+EVENTS = ['expand', 'apply', 'fail', 'prune', 'solution']
+
+
+def depth_range(text):
+    """Parse 'n' or 'min:max' (either of which may be left out) into a (min, max) pair."""
+    if ':' not in text:
+        return (int(text), int(text))
+    (low, high) = text.split(':', 1)
+    return (int(low) if low else 0, int(high) if high else float('inf'))
+
+def matching(events, kinds=None, tasks=None, depth=None):
+    """Yield the events that are of one of kinds, for one of the task names tasks, within depth."""
+    for e in events:
+        if kinds and e['event'] not in kinds:
+            continue
+        if tasks and not (e['task'] and e['task'][0] in tasks):
+            continue
+        if depth and not depth[0] <= e['depth'] <= depth[1]:
+            continue
+        yield e
+
+def summarize(events):
+    """Return the lines of a summary of events, by depth, task and operator."""
+    by_kind = Counter()
+    by_depth = defaultdict(Counter)
+    by_task = defaultdict(Counter)
+    by_operator = defaultdict(Counter)
+    plans = []
+    for e in events:
+        kind = e['event']
+        by_kind[kind] += 1
+        by_depth[e['depth']][kind] += 1
+        if e['task']:
+            by_task[e['task'][0]][kind] += 1
+            if kind in ('apply', 'prune') or e.get('kind') == 'operator':
+                by_operator[e['task'][0]][kind] += 1
+        if kind == 'solution':
+            plans.append(len(e['plan']))
+    lines = ['events: ' + ', '.join('{} {}'.format(k, by_kind[k]) for k in EVENTS)]
+    if plans:
+        lines.append('solutions: {}, plan lengths {}..{}'.format(len(plans), min(plans), max(plans)))
+    for (title, table, kinds) in [('depth', by_depth, EVENTS),
+                                  ('task', by_task, EVENTS[:-1]),
+                                  ('operator', by_operator, ['apply', 'fail', 'prune'])]:
+        row = '{:<30}' + ' {:>9}' * len(kinds)
+        lines.append('')
+        lines.append(row.format(title, *kinds))
+        for key in sorted(table, key=lambda k: (str(type(k)), k)):
+            lines.append(row.format(str(key), *[table[key][k] for k in kinds]))
+    return lines
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Filter and summarize a pyhop2 search trace.')
+    parser.add_argument('trace', help='a trace file written by pyhop2.PlanTracer')
+    parser.add_argument('--event', nargs='+', choices=EVENTS, help='show only these events')
+    parser.add_argument('--task', nargs='+', metavar='NAME',
+                        help='show only the events for tasks with these names')
+    parser.add_argument('--depth', type=depth_range, metavar='N|MIN:MAX',
+                        help='show only the events at these depths')
+    parser.add_argument('--summary', action='store_true',
+                        help='print a summary instead of the events')
+    args = parser.parse_args(argv)
+    events = matching(pyhop2.read_trace(args.trace), args.event, args.task, args.depth)
+    if args.summary:
+        for line in summarize(events):
+            print(line)
+    else:
+        for e in events:
+            print(json.dumps(e))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
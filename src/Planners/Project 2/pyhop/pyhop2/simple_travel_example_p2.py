@@ -38,6 +38,17 @@ pyhop2.declare_operators(walk, call_taxi, ride_taxi, pay_driver)
 print('')
 pyhop2.print_operators()
 
+# What the actions cost, for pyhop2.find_cheapest_plan: walking is free,
+# and a taxi ride costs the fare
+
+def ride_taxi_cost(state,a,x,y):
+    return taxi_rate(state.dist[x][y])
+
+pyhop2.declare_cost('walk', 0)
+pyhop2.declare_cost('call_taxi', 0)
+pyhop2.declare_cost('ride_taxi', ride_taxi_cost)
+pyhop2.declare_cost('pay_driver', 0)
+
 
 
 def travel_by_foot(state,a,x,y):
@@ -58,7 +69,7 @@ state1 = pyhop2.State('state1')
 state1.loc = {'me':'home'}
 state1.cash = {'me':20}
 state1.owe = {'me':0}
-state1.dist = {'home':{'park':8}, 'park':{'home':8}}
+state1.dist = pyhop2.rigid({'home':{'park':8}, 'park':{'home':8}})
 
 print("""
 ********************************************************************************
@@ -0,0 +1,294 @@
+"""
+The travel domain of simple_travel_example_p2, on a road network: a
+weighted graph rather than a table of the distances between every two
+places. A trip is broken into legs along a shortest route, walking the
+short roads and taking a taxi over the long stretches, as long as the
+traveller's cash covers the fares.
+
+The state's variables are as in simple_travel_example_p2, except that
+dist is the graph: dist[x][y] is the length of the road from x to y, if
+there is one. dist must be rigid (see pyhop2.rigid), since the shortest
+routes are kept in a RouteIndex for each graph, which only works if no
+operator changes it. An optional rigid variable coords, with the (x, y)
+position of each place, lets the index use A* on large graphs; no road
+may be shorter than the straight line between its ends.
+
+Load it into a domain of its own, since its operators have the same
+names as simple_travel_example_p2's:
+    domain = pyhop2.Domain('routes')
+    with pyhop2.using_domain(domain):
+        import travel_routes_p2
+    pyhop2.pyhop(state, [('travel', 'me', 'home', 'park')], domain=domain)
+"""
+
+import heapq, math, weakref
+from collections import OrderedDict
+from itertools import count
+
+import pyhop2
+
+# The longest road that anybody walks
+WALK_LIMIT = 2
+
+# Graphs with at most this many places get the shortest routes between
+# every two places when they are indexed; larger ones get them as needed
+ALL_PAIRS_LIMIT = 300
+
+# How many searches (or, with coords, routes) a RouteIndex of a large
+# graph remembers
+MAX_CACHED = 1000
+
+def taxi_rate(dist):
+    return (1.5 + 0.5 * dist)
+
+
+############################################################
+# Route indexes
+
+_order = count()
+
+class _Tree(object):
+    """
+    The shortest routes from source that a Dijkstra search has found so
+    far. settle resumes the search, so that later queries from the same
+    source pick up where earlier ones stopped.
+    """
+    __slots__ = ('graph', 'dist', 'pred', 'heap', 'done')
+
+    def __init__(self, graph, source):
+        self.graph = graph
+        self.dist = {source: 0}
+        self.pred = {source: None}
+        self.heap = [(0, next(_order), source)]
+        self.done = set()
+
+    def settle(self, target=None):
+        """
+        Search until the distance to target is final, or if target is
+        None, until every distance is; return the distance to target.
+        """
+        (graph, dist, pred, heap, done) = (self.graph, self.dist, self.pred, self.heap, self.done)
+        while heap and target not in done:
+            (d, unused, u) = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            for (v, w) in graph.get(u, {}).items():
+                new = d + w
+                if new < dist.get(v, math.inf):
+                    dist[v] = new
+                    pred[v] = u
+                    heapq.heappush(heap, (new, next(_order), v))
+        return dist[target] if target in done else math.inf
+
+def _path(pred, y):
+    path = []
+    while y is not None:
+        path.append(y)
+        y = pred[y]
+    path.reverse()
+    return path
+
+class RouteIndex(object):
+    """
+    Shortest routes in graph, a dict that maps each place to a dict of its
+    neighbours and the lengths of the roads to them. A graph with at most
+    all_pairs_limit places gets the routes between every two places right
+    away. A larger one gets them as they are asked for, by Dijkstra
+    searches that go on from where the last one from the same place
+    stopped, or if coords has the position of each place, by A* searches;
+    the last max_cached of them are remembered.
+    """
+    def __init__(self, graph, coords=None, all_pairs_limit=ALL_PAIRS_LIMIT,
+                 max_cached=MAX_CACHED):
+        self.graph = graph
+        self.coords = coords
+        self.all_pairs = len(graph) <= all_pairs_limit
+        self.max_cached = max_cached
+        self.trees = OrderedDict()
+        self.routes = OrderedDict()
+        if self.all_pairs:
+            for x in graph:
+                tree = _Tree(graph, x)
+                tree.settle()
+                self.trees[x] = tree
+
+    def distance(self, x, y):
+        """Return the length of a shortest route from x to y, or math.inf if there is none."""
+        return self._route(x, y)[0]
+
+    def path(self, x, y):
+        """Return the places on a shortest route from x to y, or None if there is none."""
+        return self._route(x, y)[1]
+
+    def _route(self, x, y):
+        if self.coords is not None and not self.all_pairs:
+            route = self.routes.get((x, y))
+            if route is None:
+                route = self._astar(x, y)
+                self._remember(self.routes, (x, y), route)
+            else:
+                self.routes.move_to_end((x, y))
+            return route
+        tree = self.trees.get(x)
+        if tree is None:
+            tree = _Tree(self.graph, x)
+            self._remember(self.trees, x, tree)
+        elif not self.all_pairs:
+            self.trees.move_to_end(x)
+        dist = tree.settle(y)
+        return (dist, _path(tree.pred, y) if dist < math.inf else None)
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.max_cached:
+            cache.popitem(last=False)
+
+    def _astar(self, x, y):
+        (graph, coords) = (self.graph, self.coords)
+        (gx, gy) = coords[y]
+        def h(u):
+            (ux, uy) = coords[u]
+            return math.hypot(ux - gx, uy - gy)
+        dist = {x: 0}
+        pred = {x: None}
+        heap = [(h(x), next(_order), x)]
+        done = set()
+        while heap:
+            u = heapq.heappop(heap)[2]
+            if u == y:
+                return (dist[y], _path(pred, y))
+            if u in done:
+                continue
+            done.add(u)
+            d = dist[u]
+            for (v, w) in graph.get(u, {}).items():
+                new = d + w
+                if new < dist.get(v, math.inf):
+                    dist[v] = new
+                    pred[v] = u
+                    heapq.heappush(heap, (new + h(v), next(_order), v))
+        return (math.inf, None)
+
+# The RouteIndex of each graph, by the graph's id; an entry is removed
+# when its graph is no longer in use
+_indexes = {}
+
+def index_graph(graph, coords=None, all_pairs_limit=ALL_PAIRS_LIMIT, max_cached=MAX_CACHED):
+    """
+    Make a RouteIndex for graph, a rigid dict, and return it; route_index
+    returns it for the states whose dist is graph from now on.
+    """
+    key = id(graph)
+    if key not in _indexes:
+        try:
+            weakref.finalize(graph, _indexes.pop, key, None)
+        except TypeError:
+            raise TypeError('the graph must be rigid (see pyhop2.rigid), not a {}'.format(
+                type(graph).__name__))
+    index = RouteIndex(graph, coords, all_pairs_limit, max_cached)
+    _indexes[key] = index
+    return index
+
+def route_index(state):
+    """Return the RouteIndex of state.dist, making it if need be."""
+    index = _indexes.get(id(state.dist))
+    if index is None:
+        index = index_graph(state.dist, getattr(state, 'coords', None))
+    return index
+
+
+############################################################
+# Operators
+
+def walk(state,a,x,y):
+    if state.loc[a] == x and y in state.dist[x]:
+        state.loc[a] = y
+        return state
+    else: return False
+
+def call_taxi(state,a,x):
+    state.loc['taxi'] = x
+    return state
+
+def ride_taxi(state,a,x,y):
+    if state.loc['taxi']==x and state.loc[a]==x:
+        dist = route_index(state).distance(x,y)
+        if dist == math.inf:
+            return False
+        state.loc['taxi'] = y
+        state.loc[a] = y
+        state.owe[a] = taxi_rate(dist)
+        return state
+    else: return False
+
+def pay_driver(state,a):
+    if state.cash[a] >= state.owe[a]:
+        state.cash[a] = state.cash[a] - state.owe[a]
+        state.owe[a] = 0
+        return state
+    else: return False
+
+pyhop2.declare_operators(walk, call_taxi, ride_taxi, pay_driver)
+
+def ride_taxi_cost(state,a,x,y):
+    return taxi_rate(route_index(state).distance(x,y))
+
+pyhop2.declare_cost('walk', 0)
+pyhop2.declare_cost('call_taxi', 0)
+pyhop2.declare_cost('ride_taxi', ride_taxi_cost)
+pyhop2.declare_cost('pay_driver', 0)
+
+
+############################################################
+# Methods
+
+def legs(state,x,y):
+    """
+    Return the legs of a shortest route from x to y, as a list of (kind,
+    places), where kind is 'walk' for a stretch of roads no longer than
+    WALK_LIMIT and 'taxi' for a stretch of longer ones, and places are the
+    places along it; or None if there is no route.
+    """
+    path = route_index(state).path(x,y)
+    if path is None:
+        return None
+    result = []
+    for (u, v) in zip(path, path[1:]):
+        kind = 'walk' if state.dist[u][v] <= WALK_LIMIT else 'taxi'
+        if result and result[-1][0] == kind:
+            result[-1][1].append(v)
+        else:
+            result.append((kind, [u, v]))
+    return result
+
+def leg_tasks(a,kind,places):
+    if kind == 'walk':
+        return [('walk',a,u,v) for (u, v) in zip(places, places[1:])]
+    return [('call_taxi',a,places[0]), ('ride_taxi',a,places[0],places[-1]), ('pay_driver',a)]
+
+def travel_by_foot(state,a,x,y):
+    route = legs(state,x,y)
+    if route is not None and all(kind == 'walk' for (kind, places) in route):
+        return [[task for leg in route for task in leg_tasks(a,*leg)]]
+    return False
+
+def travel_by_legs(state,a,x,y):
+    route = legs(state,x,y)
+    if route is None or len({kind for (kind, places) in route}) < 2:
+        return False
+    index = route_index(state)
+    fares = sum(taxi_rate(index.distance(places[0], places[-1]))
+                for (kind, places) in route if kind == 'taxi')
+    if state.cash[a] >= fares:
+        return [[task for leg in route for task in leg_tasks(a,*leg)]]
+    return False
+
+def travel_by_taxi(state,a,x,y):
+    if x != y and state.cash[a] >= taxi_rate(route_index(state).distance(x,y)):
+        return [[('call_taxi',a,x), ('ride_taxi',a,x,y), ('pay_driver',a)]]
+    return False
+
+# pyhop2 tries the last method first: walk if the whole route is
+# walkable, then walk and ride, and then ride all the way
+pyhop2.declare_methods('travel',travel_by_taxi,travel_by_legs,travel_by_foot)
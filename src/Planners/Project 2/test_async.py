@@ -0,0 +1,127 @@
+"""
+Tests for pyhop2_async.
+
+Usage: python test_async.py [-v]
+"""
+
+from __future__ import print_function
+import asyncio, os, sys, unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'pyhop', 'pyhop2'))
+
+import pyhop2
+import pyhop2_async
+
+
+############################################################
+# A domain whose searches go round in cycles, unless they are pruned
+
+ROADS = {'a': ['b', 'c'], 'b': ['a', 'c', 'd'], 'c': ['a', 'b', 'd'],
+         'd': ['b', 'c', 'e'], 'e': ['d', 'f'], 'f': ['e']}
+
+def move(state, here, there):
+    if state.loc == here and there in ROADS[here]:
+        state.loc = there
+        return state
+    else: return False
+
+def travel_m(state, goal):
+    if state.loc == goal:
+        return [[]]
+    return [[('move', state.loc, there), ('travel', goal)] for there in ROADS[state.loc]]
+
+roads = pyhop2.Domain('roads')
+roads.declare_operators(move)
+roads.declare_methods('travel', travel_m)
+
+def roads_state(loc):
+    state = pyhop2.State('roads')
+    state.loc = loc
+    return state
+
+############################################################
+# A domain in which count never ends, and each step is a new state
+
+def inc(state):
+    state.n += 1
+    return state
+
+def count_m(state):
+    return [[('inc',), ('count',)]]
+
+counting = pyhop2.Domain('counting')
+counting.declare_operators(inc)
+counting.declare_methods('count', count_m)
+
+def count_state():
+    state = pyhop2.State('counting')
+    state.n = 0
+    return state
+
+
+class AsyncPlanTest(unittest.TestCase):
+
+    def test_same_plans_as_pyhop(self):
+        for start in sorted(ROADS):
+            for goal in sorted(ROADS):
+                for engine in sorted(pyhop2.engines):
+                    tasks = [('travel', goal)]
+                    expected = pyhop2.pyhop(roads_state(start), tasks, engine=engine,
+                                            domain=roads)
+                    found = asyncio.run(pyhop2_async.plan(roads_state(start), tasks,
+                                                          engine=engine, domain=roads))
+                    self.assertEqual(found, expected, (start, goal, engine))
+                expected = pyhop2.multi_pyhop(roads_state(start), [('travel', goal)], 5,
+                                              domain=roads)
+                found = asyncio.run(pyhop2_async.multi_plan(roads_state(start),
+                                                            [('travel', goal)], 5, domain=roads))
+                self.assertEqual(found, expected, (start, goal))
+
+    def test_yields_every_n_expansions(self):
+        ticks = [0]
+        async def tick():
+            while True:
+                ticks[0] += 1
+                await asyncio.sleep(0)
+        async def main(stats):
+            ticker = asyncio.ensure_future(tick())
+            result = await pyhop2_async.plan(count_state(), [('count',)], stats=stats,
+                                             budget=pyhop2.Budget(max_nodes=1000),
+                                             domain=counting, every=10, interval=3600)
+            ticker.cancel()
+            return result
+        stats = pyhop2.SearchStats()
+        with mock.patch.object(asyncio, 'sleep', wraps=asyncio.sleep) as sleep:
+            result = asyncio.run(main(stats))
+            yields = [call for call in sleep.call_args_list if call == mock.call(0)]
+        self.assertEqual(result.reason, 'nodes')
+        self.assertEqual(stats.nodes, 1000)
+        # The ticker sleeps too, once each time it runs
+        self.assertEqual(len(yields) - ticks[0], stats.nodes // 10)
+        self.assertGreaterEqual(ticks[0], stats.nodes // 10)
+
+    def test_cancel_stops_the_search(self):
+        async def main(stats):
+            task = asyncio.ensure_future(pyhop2_async.plan(
+                count_state(), [('count',)], stats=stats,
+                budget=pyhop2.Budget(max_nodes=100000), domain=counting, every=1))
+            for i in range(20):
+                await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            nodes = stats.nodes
+            for i in range(20):
+                await asyncio.sleep(0)
+            return nodes
+        stats = pyhop2.SearchStats()
+        nodes = asyncio.run(main(stats))
+        self.assertLess(0, nodes)
+        self.assertLess(nodes, 100)
+        self.assertEqual(stats.nodes, nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
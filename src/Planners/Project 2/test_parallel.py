@@ -0,0 +1,150 @@
+"""
+Tests for pyhop2_parallel.
+
+Usage: python test_parallel.py [-v]
+"""
+
+from __future__ import print_function
+import os, pickle, subprocess, sys, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'pyhop', 'pyhop2'))
+
+import pyhop2
+import pyhop2_parallel
+
+
+############################################################
+# A domain whose searches go round in cycles, unless they are pruned
+
+ROADS = {'a': ['b', 'c'], 'b': ['a', 'c', 'd'], 'c': ['a', 'b', 'd'],
+         'd': ['b', 'c', 'e'], 'e': ['d', 'f'], 'f': ['e']}
+
+def move(state, here, there):
+    if state.loc == here and there in ROADS[here]:
+        state.loc = there
+        return state
+    else: return False
+
+def travel_m(state, goal):
+    if state.loc == goal:
+        return [[]]
+    return [[('move', state.loc, there), ('travel', goal)] for there in ROADS[state.loc]]
+
+roads = pyhop2.Domain('roads')
+roads.declare_operators(move)
+roads.declare_methods('travel', travel_m)
+
+# The same, with every plan found twice
+twice = pyhop2.Domain('twice')
+twice.declare_operators(move)
+twice.declare_methods('travel', travel_m, travel_m)
+
+def roads_problem():
+    state = pyhop2.State('roads')
+    state.loc = 'a'
+    return (state, [('travel', 'f')])
+
+def search_piece(root, piece, chunk_nodes, split):
+    """Search piece as a worker of pyhop2_parallel.iter_plans for roads would."""
+    pyhop2_parallel._start_worker(roads, root)
+    return pyhop2_parallel._search(piece, chunk_nodes, split)
+
+def search_in_process(seed, *args):
+    """Call search_piece(*args) in a new Python process whose PYTHONHASHSEED is seed."""
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    code = ('import pickle, sys, test_parallel; '
+            'sys.stdout.buffer.write(pickle.dumps(test_parallel.search_piece('
+            '*pickle.load(sys.stdin.buffer))))')
+    output = subprocess.run([sys.executable, '-c', code], input=pickle.dumps(args), env=env,
+                            cwd=HERE, stdout=subprocess.PIPE, check=True).stdout
+    return pickle.loads(output)
+
+def crashing_planner(state, tasks, budget=None, domain=None):
+    """pyhop2.pyhop, except that the worker dies for the state named 'crash'."""
+    if state.__name__ == 'crash':
+        os._exit(1)
+    return pyhop2.pyhop(state, tasks, budget=budget, domain=domain)
+
+def batch_problems(n, crash):
+    """Return n problems for roads, the crash'th of which kills its worker."""
+    problems = []
+    for i in range(n):
+        state = pyhop2.State('crash' if i == crash else 'roads')
+        state.loc = sorted(ROADS)[i % len(ROADS)]
+        problems.append((state, [('travel', sorted(ROADS)[i // len(ROADS) % len(ROADS)])]))
+    return problems
+
+
+class IterPlansTest(unittest.TestCase):
+
+    def test_same_plans_as_serial(self):
+        (state, tasks) = roads_problem()
+        expected = list(pyhop2.iter_plans(state, tasks, domain=roads))
+        plans = pyhop2_parallel.multi_plan(state, tasks, len(expected) + 1, workers=2,
+                                           domain=roads, chunk_nodes=2)
+        self.assertEqual(plans, expected)
+
+    def test_pieces_resumed_in_other_processes(self):
+        # The fingerprints that detect cycles differ from one process to
+        # another, so the pieces must not depend on the ones they were made with
+        (state, tasks) = roads_problem()
+        expected = list(pyhop2.iter_plans(state, tasks, domain=roads))
+        (plans, pieces) = search_in_process(1, state, [(tasks, [])], 3, 4)
+        self.assertTrue(pieces)
+        for piece in pieces:
+            (more, rest) = search_in_process(2, state, piece, 1000, 1)
+            self.assertEqual(rest, [])
+            plans.extend(more)
+        self.assertEqual(plans, expected)
+
+    def test_duplicates_kept_if_asked(self):
+        (state, tasks) = roads_problem()
+        expected = list(pyhop2.iter_plans(state, tasks, domain=twice))
+        self.assertLess(len(set(map(tuple, expected))), len(expected))
+        self.assertEqual(list(pyhop2_parallel.iter_plans(state, tasks, workers=2, domain=twice,
+                                                         chunk_nodes=2, distinct=False)),
+                         expected)
+
+    def test_resumed_nodes_have_decompositions(self):
+        (state, tasks) = roads_problem()
+        pyhop2_parallel._start_worker(roads, state)
+        plan = [('move', 'a', 'b'), ('move', 'b', 'd')]
+        [node] = pyhop2_parallel._nodes([(tasks, plan)])
+        self.assertEqual(node.plan, plan)
+        self.assertEqual(node.decomposition(), [(plan[0], None, []), (plan[1], None, []),
+                                                (tasks[0], None, [])])
+        [child] = [c for c in node.next_steps() if c.stack[0] == ('move', 'd', 'e')]
+        self.assertEqual(child.decomposition()[2][1], 'travel_m')
+
+
+class BatchTest(unittest.TestCase):
+
+    def test_worker_that_dies(self):
+        problems = batch_problems(16, crash=6)
+        expected = [pyhop2.pyhop(state, tasks, domain=roads) for (state, tasks) in problems]
+        results = pyhop2_parallel.plan_batch(roads, problems, workers=2, planner=crashing_planner,
+                                             chunk_size=4)
+        self.assertIsInstance(results[6], pyhop2_parallel.ProblemFailed)
+        self.assertIn('died', results[6].message)
+        self.assertEqual(results[:6] + results[7:], expected[:6] + expected[7:])
+
+    def test_ordered_after_worker_dies(self):
+        problems = batch_problems(16, crash=1)
+        indices = [i for (i, result) in pyhop2_parallel.iter_batch(
+            roads, problems, workers=2, planner=crashing_planner, chunk_size=3, ordered=True)]
+        self.assertEqual(indices, list(range(16)))
+
+    def test_failures_are_separate(self):
+        # A planner that can't be pickled fails every chunk it is sent with
+        problems = batch_problems(4, crash=None)
+        results = pyhop2_parallel.plan_batch(roads, problems, workers=1,
+                                             planner=lambda state, tasks, **options: [],
+                                             chunk_size=4)
+        self.assertTrue(all(isinstance(result, pyhop2_parallel.ProblemFailed)
+                            for result in results))
+        self.assertEqual(len(set(map(id, results))), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Tests for pyhop2_cache.
+
+Usage: python test_plan_cache.py [-v]
+"""
+
+from __future__ import print_function
+import functools, os, subprocess, sys, tempfile, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'pyhop', 'pyhop2'))
+
+import pyhop2
+import pyhop2_cache
+
+
+############################################################
+# A domain whose operator has a set constant
+
+def visit(state, room):
+    if room in {'hall', 'kitchen', 'study', 'attic', 'cellar', 'garden'}:
+        state.visited = state.visited + [room]
+        return state
+    else: return False
+
+def visit_all_m(state, rooms):
+    return [[('visit', room) for room in rooms]]
+
+rooms = pyhop2.Domain('rooms')
+rooms.declare_operators(visit)
+rooms.declare_methods('visit_all', visit_all_m)
+
+def rooms_state(visited):
+    state = pyhop2.State('rooms')
+    state.visited = visited
+    return state
+
+def digest_in_process(seed):
+    """Return the code digest of visit in a new Python process whose PYTHONHASHSEED is seed."""
+    env = dict(os.environ, PYTHONHASHSEED=str(seed))
+    code = ('import sys, test_plan_cache; '
+            'print(test_plan_cache.pyhop2_cache.code_digest(test_plan_cache.visit))')
+    return subprocess.run([sys.executable, '-c', code], env=env, cwd=HERE,
+                          stdout=subprocess.PIPE, check=True).stdout.strip()
+
+
+class KeyTest(unittest.TestCase):
+
+    def test_same_digest_in_every_process(self):
+        self.assertEqual(digest_in_process(1), digest_in_process(2))
+
+    def test_lists_and_tuples_differ(self):
+        self.assertNotEqual(pyhop2_cache.canonical(rooms_state(['hall'])),
+                            pyhop2_cache.canonical(rooms_state(('hall',))))
+        self.assertEqual(pyhop2_cache.canonical({'a': (1, [2])}),
+                         pyhop2_cache.canonical({'a': (1, [2])}))
+
+
+class PlanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = pyhop2_cache.PlanCache(os.path.join(self.directory.name, 'plans.db'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def test_same_results_as_planner(self):
+        problems = [([], [('visit_all', ['hall', 'study'])]),
+                    (['hall'], [('visit_all', ['attic', 'garden', 'cellar'])]),
+                    ([], [('visit_all', ['hall', 'roof'])])]
+        with pyhop2.using_domain(rooms):
+            expected = [pyhop2.pyhop(rooms_state(visited), tasks) for (visited, tasks) in problems]
+            # Misses, then hits from memory
+            for i in range(2):
+                for ((visited, tasks), result) in zip(problems, expected):
+                    self.assertEqual(self.cache.pyhop(rooms_state(visited), tasks), result)
+                    self.assertEqual(self.cache.pyhop(rooms_state(visited), tasks, engine='trail',
+                                                      frontier='breadth-first'), result)
+            self.assertEqual((self.cache.misses, self.cache.hits), (6, 6))
+            # and hits from the file
+            self.cache.close()
+            self.cache = pyhop2_cache.PlanCache(os.path.join(self.directory.name, 'plans.db'))
+            for ((visited, tasks), result) in zip(problems, expected):
+                self.assertEqual(self.cache.pyhop(rooms_state(visited), tasks), result)
+            self.assertEqual((self.cache.misses, self.cache.hits), (0, 3))
+        self.assertIs(expected[2], False)
+
+    def test_planner_that_is_not_a_function(self):
+        planner = functools.partial(pyhop2.pyhop, engine='trail')
+        tasks = [('visit_all', ['hall', 'study'])]
+        with pyhop2.using_domain(rooms):
+            plan = self.cache.pyhop(rooms_state([]), tasks, planner=planner)
+        self.assertEqual(plan, [('visit', 'hall'), ('visit', 'study')])
+        self.assertEqual(self.cache.misses, 1)
+        self.assertNotEqual(pyhop2_cache.code_digest(planner),
+                            pyhop2_cache.code_digest(functools.partial(pyhop2.pyhop)))
+
+
+if __name__ == '__main__':
+    unittest.main()
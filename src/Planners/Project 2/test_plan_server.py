@@ -0,0 +1,72 @@
+"""
+Tests for plan_server, without the HTTP server: they answer requests
+in this process, as a worker does.
+
+Usage: python test_plan_server.py [-v]
+"""
+
+from __future__ import print_function
+import unittest
+from unittest import mock
+
+import plan_server
+
+plan_server.load_domains(['travel'])
+
+def travel_request(**options):
+    state = {'__name__': 'travel', 'loc': {'me': 'home'}, 'cash': {'me': 20}, 'owe': {'me': 0},
+             'dist': {'home': {'park': 8}, 'park': {'home': 8}}}
+    return {'domain': 'travel', 'state': state, 'tasks': [['travel', 'me', 'home', 'park']],
+            'options': dict(options, rigid=['dist'])}
+
+
+class RequestTest(unittest.TestCase):
+
+    def test_plan(self):
+        (status, answer) = plan_server._worker_plan(travel_request())
+        self.assertEqual(status, 200)
+        self.assertEqual(answer['plans'], [[['call_taxi', 'me', 'home'],
+                                            ['ride_taxi', 'me', 'home', 'park'],
+                                            ['pay_driver', 'me']]])
+
+    def test_bad_options(self):
+        for options in [{'plans': '2'}, {'plans': 0}, {'plans': True}, {'max_nodes': -1},
+                        {'max_nodes': 1.5}, {'time_limit': '1'}, {'time_limit': -0.5},
+                        {'engine': ['copy']}, {'frontier': 'sideways'}, {'cheapest': 'yes'}]:
+            (status, answer) = plan_server._worker_plan(travel_request(**options))
+            self.assertEqual(status, 400, options)
+
+    def test_bad_values(self):
+        for value in [{'__dict__': 5}, {'__dict__': [[1, 2, 3]]}, {'__dict__': [[[1], 2]]},
+                      {'__set__': 'abc'}, {'__set__': [[1]]}, {'__tuple__': None}]:
+            request = travel_request()
+            request['state']['extra'] = value
+            (status, answer) = plan_server._worker_plan(request)
+            self.assertEqual(status, 400, value)
+
+    def test_cheapest_within_budget(self):
+        (status, answer) = plan_server._worker_plan(travel_request(cheapest=True, max_nodes=2))
+        self.assertEqual(status, 200)
+        self.assertEqual((answer['status'], answer['reason']), ('gave up', 'nodes'))
+
+    def test_server_limits(self):
+        with mock.patch.dict(plan_server.LIMITS, max_nodes=2):
+            for options in [{}, {'max_nodes': 100}]:
+                (status, answer) = plan_server._worker_plan(travel_request(**options))
+                self.assertEqual((answer['status'], answer['reason']), ('gave up', 'nodes'))
+            (state, tasks, budget) = plan_server.read_request(travel_request(max_nodes=1))
+            self.assertEqual(budget.max_nodes, 1)
+            self.assertEqual(budget.time_limit, plan_server.LIMITS['time_limit'])
+
+    def test_domain_errors(self):
+        def call_taxi(state, a, x):
+            raise ValueError('no taxis today')
+        table = plan_server._domains['travel'].table
+        with mock.patch.dict(table, call_taxi=(call_taxi, None)):
+            (status, answer) = plan_server._worker_plan(travel_request())
+        self.assertEqual(status, 500)
+        self.assertIn('no taxis today', answer['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,671 @@
+"""
+Tests for pyhop2.
+
+Usage: python test_pyhop2.py [-v]
+"""
+
+from __future__ import print_function
+import contextlib, copy, io, os, pickle, sys, tempfile, threading, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'pyhop', 'pyhop2'))
+
+import pyhop
+import pyhop2
+import bench_problems
+
+# It runs some example problems when it is imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2 as travel_example
+
+# The blocks world, with the methods that have an alternative for each
+# waiting block
+blocks3 = pyhop2.Domain('blocks3')
+with pyhop2.using_domain(blocks3):
+    import blocks_world_operators_p2
+    import blocks_world_methods3_p2
+
+# The same, with a move_blocks method that checks the incrementally
+# maintained statuses against status()
+from blocks_world_methods_p2 import status
+from blocks_world_status_p2 import block_statuses
+
+def checked_moveb_m(state, goal):
+    alternatives = blocks_world_methods3_p2.moveb_m(state, goal)
+    statuses = block_statuses(state, goal)
+    wrong = [b for b in state.clear if statuses.status[b] != status(b, state, goal)]
+    if wrong:
+        raise AssertionError('wrong statuses for {}'.format(wrong))
+    return alternatives
+
+checked_blocks3 = pyhop2.Domain('checked_blocks3')
+checked_blocks3.declare_operators(*blocks3.operators.values())
+for (task, relevant) in blocks3.methods.items():
+    checked_blocks3.declare_methods(task, *relevant)
+checked_blocks3.declare_methods('move_blocks', checked_moveb_m)
+
+travel = pyhop2.Domain('travel')
+travel.declare_operators(travel_example.walk, travel_example.call_taxi,
+                         travel_example.ride_taxi, travel_example.pay_driver)
+travel.declare_methods('travel', travel_example.travel_by_foot, travel_example.travel_by_taxi)
+
+# The same domain for pyhop, whose methods return a single subtask list
+
+def travel_by_foot_v1(state, a, x, y):
+    alternatives = travel_example.travel_by_foot(state, a, x, y)
+    return alternatives[0] if alternatives else False
+
+def travel_by_taxi_v1(state, a, x, y):
+    alternatives = travel_example.travel_by_taxi(state, a, x, y)
+    return alternatives[0] if alternatives else False
+
+travel_v1 = pyhop.Domain('travel_v1')
+travel_v1.declare_operators(*travel.operators.values())
+travel_v1.declare_methods('travel', travel_by_foot_v1, travel_by_taxi_v1)
+
+def travel_state(dist, cash=20):
+    """Return a state in which me is at home, dist from the park, with cash."""
+    state = pyhop2.State('travel')
+    state.loc = {'me': 'home'}
+    state.cash = {'me': cash}
+    state.owe = {'me': 0}
+    state.dist = pyhop2.rigid({'home': {'park': dist}, 'park': {'home': dist}})
+    return state
+
+TRAVEL = [('travel', 'me', 'home', 'park')]
+
+
+############################################################
+# A domain whose state has containers in containers
+
+def push(state, stack, x):
+    state.stacks[stack].append(x)
+    state.piles[0].append(stack)
+    state.piles[1][0].add(x)
+    state.labels[x] = [x]
+    return state
+
+def relabel(state, x):
+    state.labels[x][0] = x.upper()
+    state.stacks[1][:] = [{'x': x}]
+    return state
+
+def fail(state):
+    return False
+
+def try_m(state, x):
+    # The search tries the last alternative first
+    return [[('check',)], [('push', 0, x), ('relabel', x), ('fail',)]]
+
+def check_m(state):
+    if (state.stacks == [[], []] and state.piles == ([], (set(),)) and state.labels == {}):
+        return [[]]
+    return False
+
+nested = pyhop2.Domain('nested')
+nested.declare_operators(push, relabel, fail)
+nested.declare_methods('try', try_m)
+nested.declare_methods('check', check_m)
+
+def nested_state():
+    state = pyhop2.State('nested')
+    state.stacks = [[], []]
+    state.piles = ([], (set(),))
+    state.labels = {}
+    return state
+
+
+############################################################
+# The plans that the searches should find, from a plain recursive
+# search that deep-copies the states and compares them whole
+
+def reference_plans(state, tasks, domain, plan=(), path=None):
+    """
+    Generate the plans for tasks in state, in the order in which pyhop2's
+    depth-first search finds them, pruning the states that are already
+    on the path to the node, as it does.
+    """
+    if path is None:
+        path = [vars(state)]
+    if not tasks:
+        yield list(plan)
+        return
+    task = tasks[0]
+    if task[0] in domain.operators:
+        newstate = domain.operators[task[0]](copy.deepcopy(state), *task[1:])
+        if newstate and vars(newstate) not in path:
+            for found in reference_plans(newstate, tasks[1:], domain, plan + (task,),
+                                         path + [vars(newstate)]):
+                yield found
+    # The search tries the last method first, and the last alternative
+    # of each method first
+    for method in reversed(domain.methods.get(task[0], [])):
+        for subtasks in reversed(method(state, *task[1:]) or []):
+            for found in reference_plans(state, list(subtasks) + list(tasks[1:]), domain, plan,
+                                         path):
+                yield found
+
+# A domain whose searches go round in cycles, unless they are pruned
+
+DOORS = {'hall': ['kitchen', 'study'], 'kitchen': ['hall', 'study', 'cellar'],
+         'study': ['hall', 'kitchen', 'cellar'], 'cellar': ['kitchen', 'study', 'attic'],
+         'attic': ['cellar']}
+
+def go(state, here, there):
+    if state.room == here and there in DOORS[here]:
+        state.room = there
+        return state
+    else: return False
+
+def go_to_m(state, room):
+    if state.room == room:
+        return [[]]
+    return [[('go', state.room, there), ('go_to', room)] for there in DOORS[state.room]]
+
+rooms = pyhop2.Domain('rooms')
+rooms.declare_operators(go)
+rooms.declare_methods('go_to', go_to_m)
+
+def rooms_state():
+    state = pyhop2.State('rooms')
+    state.room = 'hall'
+    return state
+
+# A domain with a plan for every number of incs, so that its search never ends
+
+def inc(state):
+    state.n += 1
+    return state
+
+def count_m(state):
+    # The search tries the last alternative first
+    return [[('inc',), ('count',)], []]
+
+counting = pyhop2.Domain('counting')
+counting.declare_operators(inc)
+counting.declare_methods('count', count_m)
+
+def count_state():
+    state = pyhop2.State('counting')
+    state.n = 0
+    return state
+
+
+def example_problems():
+    """Generate (state, tasks, domain) for a few problems in the example domains."""
+    for (n, seed) in [(5, 0), (6, 2), (7, 3), (8, 1)]:
+        (state, tasks) = bench_problems.blocks_problem(n, seed)
+        yield (state, tasks, blocks3)
+    for (dist, cash) in [(2, 20), (8, 20), (8, 5)]:
+        yield (travel_state(dist, cash), TRAVEL, travel)
+    yield (rooms_state(), [('go_to', 'attic')], rooms)
+
+def first_plans(plans, n=20):
+    """Return the first n plans in plans."""
+    return [plan for (i, plan) in zip(range(n), plans)]
+
+
+class SamePlansTest(unittest.TestCase):
+
+    def test_fingerprints_prune_the_same_states(self):
+        for (state, tasks, domain) in example_problems():
+            self.assertEqual(first_plans(pyhop2.iter_plans(state, tasks, domain=domain)),
+                             first_plans(reference_plans(state, tasks, domain)))
+
+    def test_cow_states(self):
+        for (state, tasks, domain) in example_problems():
+            self.assertEqual(first_plans(pyhop2.iter_plans(pyhop2.cow_state(state), tasks,
+                                                           domain=domain)),
+                             first_plans(reference_plans(state, tasks, domain)))
+        for (dist, cash) in [(2, 20), (8, 20), (8, 5)]:
+            state = travel_state(dist, cash)
+            self.assertEqual(pyhop.pyhop(pyhop2.cow_state(state), TRAVEL, domain=travel_v1),
+                             pyhop.pyhop(state, TRAVEL, domain=travel_v1))
+
+    def test_compact_states(self):
+        for (n, seed) in [(5, 0), (7, 3), (8, 1)]:
+            (state, tasks) = bench_problems.blocks_problem(n, seed)
+            blocks = list(state.clear)
+            schema = pyhop2.Schema(pos=(blocks, blocks + ['table', 'hand']),
+                                   clear=(blocks, [True, False]), holding=None)
+            expected = first_plans(reference_plans(state, tasks, blocks3))
+            for engine in ['copy', 'trail']:
+                plans = pyhop2.iter_plans(pyhop2.compact_state(state, schema), tasks,
+                                          engine=engine, domain=blocks3)
+                self.assertEqual(first_plans(plans), expected, (n, seed, engine))
+        state = pyhop2.compact_state(rooms_state(), pyhop2.Schema(room=None))
+        self.assertEqual(first_plans(pyhop2.iter_plans(state, [('go_to', 'attic')], domain=rooms)),
+                         first_plans(reference_plans(rooms_state(), [('go_to', 'attic')], rooms)))
+
+
+class RigidTest(unittest.TestCase):
+
+    def test_shared_not_copied(self):
+        state = travel_state(8)
+        copy = pyhop2.copy_state(state)
+        self.assertIs(copy.dist, state.dist)
+        with self.assertRaises(TypeError):
+            state.dist['home']['park'] = 1
+        self.assertEqual(pyhop2.fingerprint(travel_state(8)), pyhop2.fingerprint(travel_state(1)))
+
+    def test_unpickled_once(self):
+        state = travel_state(8)
+        (a, b) = pickle.loads(pickle.dumps((state, pyhop2.copy_state(state))))
+        self.assertIs(a.dist, state.dist)
+        self.assertIs(b.dist, state.dist)
+
+    def test_nogoods_tell_rigid_values_apart(self):
+        # fingerprint leaves rigid variables out, so the failure of the
+        # first problem mustn't count for the second
+        nogoods = pyhop2.NogoodTable()
+        self.assertIs(pyhop2.pyhop(travel_state(8, cash=0), TRAVEL, domain=travel,
+                                   nogoods=nogoods), False)
+        self.assertTrue(len(nogoods))
+        expected = [('walk', 'me', 'home', 'park')]
+        self.assertEqual(pyhop2.pyhop(travel_state(1, cash=0), TRAVEL, domain=travel), expected)
+        self.assertEqual(pyhop2.pyhop(travel_state(1, cash=0), TRAVEL, domain=travel,
+                                      nogoods=nogoods), expected)
+
+    def test_v1_nogoods_tell_rigid_values_apart(self):
+        nogoods = pyhop2.NogoodTable()
+        self.assertIs(pyhop.pyhop(travel_state(8, cash=0), TRAVEL, domain=travel_v1,
+                                  nogoods=nogoods), False)
+        self.assertTrue(len(nogoods))
+        expected = [('walk', 'me', 'home', 'park')]
+        self.assertEqual(pyhop.pyhop(travel_state(1, cash=0), TRAVEL, domain=travel_v1), expected)
+        self.assertEqual(pyhop.pyhop(travel_state(1, cash=0), TRAVEL, domain=travel_v1,
+                                     nogoods=nogoods), expected)
+
+
+
+class TrailEngineTest(unittest.TestCase):
+
+    def test_nested_containers_undone(self):
+        for engine in ['copy', 'trail']:
+            state = nested_state()
+            self.assertEqual(pyhop2.pyhop(state, [('try', 'bad')], engine=engine, domain=nested),
+                             [], engine)
+            self.assertEqual(vars(state), vars(nested_state()), engine)
+
+    def test_same_plans_on_examples(self):
+        for (state, tasks, domain) in example_problems():
+            self.assertEqual(first_plans(pyhop2.iter_plans(state, tasks, engine='trail',
+                                                           domain=domain)),
+                             first_plans(reference_plans(state, tasks, domain)))
+
+    def test_same_plans_as_copy(self):
+        tasks = [('try', 'a'), ('try', 'b')]
+        expected = pyhop2.multi_pyhop(nested_state(), tasks, 10, domain=nested)
+        self.assertEqual(pyhop2.multi_pyhop(nested_state(), tasks, 10, engine='trail',
+                                            domain=nested), expected)
+
+
+
+class FrontierTest(unittest.TestCase):
+
+    def test_plans_the_search_can_find(self):
+        # Every frontier finds one of the plans that the depth-first search
+        # finds, and best-first with a heuristic of 0 one of the shortest
+        for (state, tasks, domain) in example_problems():
+            plans = list(reference_plans(state, tasks, domain))
+            for frontier in sorted(pyhop2.frontiers):
+                for engine in ['copy', 'trail']:
+                    plan = pyhop2.pyhop(state, tasks, engine=engine, frontier=frontier,
+                                        heuristic=lambda state, tasks, plan: 0, domain=domain)
+                    if not plans:
+                        self.assertIs(plan, False)
+                        continue
+                    self.assertIn(plan, plans, (frontier, engine))
+                    if frontier == 'best-first':
+                        self.assertEqual(len(plan), min(map(len, plans)))
+
+    def test_heuristic_gets_tasks_and_plan(self):
+        # Each node's tasks and plan are made from its parent's, so check
+        # them against the ones made from the node's stack and Expansions
+        def check(frontier, engine):
+            nodes = []
+            def heuristic(state, tasks, plan):
+                node = nodes[-1]
+                self.assertEqual(tasks, pyhop2.task_list(node.stack))
+                self.assertEqual(plan, node.expansion.plan())
+                return len(tasks)
+            class Checked(pyhop2.frontiers[frontier]):
+                def priority(self, node):
+                    nodes.append(node)
+                    return pyhop2.frontiers[frontier].priority(self, node)
+            pyhop2.frontiers['checked'] = Checked
+            try:
+                return pyhop2.pyhop(state, tasks, engine=engine, frontier='checked',
+                                    heuristic=heuristic, domain=blocks3)
+            finally:
+                del pyhop2.frontiers['checked']
+        (state, tasks) = bench_problems.blocks_problem(8, 1)
+        for frontier in ['greedy', 'best-first']:
+            for engine in ['copy', 'trail']:
+                plan = check(frontier, engine)
+                self.assertTrue(plan)
+                self.assertEqual(plan, pyhop2.pyhop(state, tasks, engine=engine, frontier=frontier,
+                                                    heuristic=lambda s, t, p: len(t),
+                                                    domain=blocks3))
+
+
+class BlockStatusTest(unittest.TestCase):
+
+    def test_same_as_from_scratch(self):
+        # Looking for every plan backtracks, so the states that the
+        # statuses are given aren't always the ones that they were told of
+        for (n, seed) in [(6, 0), (8, 1), (8, 5)]:
+            (state, tasks) = bench_problems.blocks_problem(n, seed)
+            expected = list(pyhop2.iter_plans(state, tasks, domain=blocks3))
+            for (engine, start) in [('copy', state), ('copy', pyhop2.cow_state(state)),
+                                    ('trail', state)]:
+                self.assertEqual(list(pyhop2.iter_plans(start, tasks, engine=engine,
+                                                        domain=checked_blocks3)),
+                                 expected, (n, seed, engine))
+
+    def test_v1_search_scratch(self):
+        scratches = []
+        def remember(state):
+            scratches.append(pyhop.search_scratch())
+            return []
+        domain = pyhop.Domain('scratch')
+        domain.declare_methods('remember', remember)
+        self.assertEqual(pyhop.pyhop(pyhop.State('s'), [('remember',), ('remember',)],
+                                     domain=domain), [])
+        self.assertIsInstance(scratches[0], dict)
+        self.assertIs(scratches[0], scratches[1])
+        self.assertIsNone(pyhop.search_scratch())
+
+
+class CheapestPlanTest(unittest.TestCase):
+
+    def test_cheapest_of_all_plans(self):
+        # Every action costs 1, so the cheapest plans are the shortest
+        for (n, seed) in [(8, 1), (8, 5), (9, 4)]:
+            (state, tasks) = bench_problems.blocks_problem(n, seed)
+            shortest = min(len(plan) for plan in pyhop2.iter_plans(state, tasks, domain=blocks3))
+            for engine in ['copy', 'trail']:
+                for frontier in ['depth-first', 'breadth-first']:
+                    (plan, cost) = pyhop2.find_cheapest_plan(state, tasks, engine=engine,
+                                                             frontier=frontier, domain=blocks3,
+                                                             nogoods=pyhop2.NogoodTable())
+                    self.assertEqual((len(plan), cost), (shortest, shortest))
+
+    def test_out_of_budget(self):
+        (state, tasks) = bench_problems.blocks_problem(8, 1)
+        self.assertIsInstance(pyhop2.find_cheapest_plan(state, tasks, domain=blocks3,
+                                                        budget=pyhop2.Budget(max_nodes=5)),
+                              pyhop2.BudgetExhausted)
+        plans = []
+        with self.assertRaises(pyhop2.BudgetExhausted) as raised:
+            for (plan, cost) in pyhop2.iter_cheaper_plans(state, tasks, domain=blocks3,
+                                                          budget=pyhop2.Budget(max_nodes=100)):
+                plans.append(plan)
+        self.assertTrue(plans)
+        self.assertEqual(raised.exception.plans, plans)
+        # It returns the cheapest plan it found before the budget ran out
+        self.assertEqual(pyhop2.find_cheapest_plan(state, tasks, domain=blocks3,
+                                                   budget=pyhop2.Budget(max_nodes=100)),
+                         (plans[-1], len(plans[-1])))
+
+
+class SearchStatsTest(unittest.TestCase):
+
+    def test_counters(self):
+        # The search tries push, relabel and fail, and then check
+        stats = pyhop2.SearchStats()
+        self.assertEqual(pyhop2.pyhop(nested_state(), [('try', 'a')], domain=nested,
+                                      stats=stats), [])
+        self.assertEqual((stats.nodes, stats.max_depth, stats.backtracks, stats.cycles),
+                         (5, 3, 1, 0))
+        self.assertEqual(stats.operators, {'push': 1, 'relabel': 1, 'fail': 1})
+        self.assertEqual(stats.operator_failures, {'fail': 1})
+        self.assertEqual(stats.methods, {'try': 1, 'check': 1})
+        self.assertEqual(sum(stats.method_failures.values()), 0)
+        self.assertEqual(set(stats.operator_time), {'push', 'relabel', 'fail'})
+        self.assertEqual(set(stats.method_time), {'try_m', 'check_m'})
+
+    def test_hooks(self):
+        for engine in ['copy', 'trail']:
+            calls = {'expand': [], 'operator': [], 'method': [], 'prune': []}
+            stats = pyhop2.SearchStats(
+                on_expand=lambda node: calls['expand'].append(node.depth),
+                on_operator=lambda node, task, newstate: calls['operator'].append(
+                    (task[0], bool(newstate))),
+                on_method=lambda node, task, method, alternatives: calls['method'].append(
+                    (task[0], bool(alternatives))),
+                on_prune=lambda node, task, newstate: calls['prune'].append(task))
+            plans = list(pyhop2.iter_plans(rooms_state(), [('go_to', 'attic')], engine=engine,
+                                           stats=stats, domain=rooms))
+            self.assertEqual(len(plans), 4)
+            self.assertEqual(len(calls['expand']), stats.nodes)
+            self.assertEqual(max(calls['expand']), stats.max_depth)
+            self.assertEqual(len(calls['operator']), sum(stats.operators.values()))
+            self.assertEqual(len(calls['method']), sum(stats.methods.values()))
+            self.assertEqual(len(calls['prune']), stats.cycles)
+            self.assertTrue(stats.cycles)
+            self.assertTrue(all(task[0] == 'go' for task in calls['prune']))
+
+    def test_nogood_counters(self):
+        nogoods = pyhop2.NogoodTable()
+        state = travel_state(8, cash=0)
+        stats = pyhop2.SearchStats()
+        self.assertIs(pyhop2.pyhop(state, TRAVEL, domain=travel, stats=stats, nogoods=nogoods),
+                      False)
+        self.assertEqual((stats.nodes, stats.nogood_lookups, stats.nogood_hits), (1, 1, 0))
+        # The second time, the root is a known failure, and isn't expanded
+        stats = pyhop2.SearchStats()
+        self.assertIs(pyhop2.pyhop(state, TRAVEL, domain=travel, stats=stats, nogoods=nogoods),
+                      False)
+        self.assertEqual((stats.nodes, stats.nogood_lookups, stats.nogood_hits), (0, 1, 1))
+
+
+class PlanTracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def traced(self, name, state, tasks, domain, **options):
+        """Trace the plans for tasks in state to the file name, and read the trace back."""
+        path = os.path.join(self.directory.name, name)
+        with pyhop2.PlanTracer(path, **options) as trace:
+            plans = list(pyhop2.iter_plans(state, tasks, trace=trace, domain=domain))
+        return (plans, list(pyhop2.read_trace(path)))
+
+    def test_events(self):
+        # The search tries push, relabel and fail, and then check
+        expected = [
+            {'event': 'expand', 'node': 1, 'depth': 0, 'task': ['try', 'a']},
+            {'event': 'expand', 'node': 2, 'depth': 1, 'task': ['push', 0, 'a']},
+            {'event': 'apply', 'node': 2, 'depth': 1, 'task': ['push', 0, 'a'],
+             'diff': [['var', 'stacks', [['a'], []]], ['var', 'piles', [[0], [['a']]]],
+                      ['set', 'labels', 'a', ['a']]]},
+            {'event': 'expand', 'node': 3, 'depth': 2, 'task': ['relabel', 'a']},
+            {'event': 'apply', 'node': 3, 'depth': 2, 'task': ['relabel', 'a'],
+             'diff': [['var', 'stacks', [['a'], [[['x', 'a']]]]], ['set', 'labels', 'a', ['A']]]},
+            {'event': 'expand', 'node': 4, 'depth': 3, 'task': ['fail']},
+            {'event': 'fail', 'node': 4, 'depth': 3, 'task': ['fail'], 'kind': 'operator'},
+            {'event': 'expand', 'node': 5, 'depth': 1, 'task': ['check']},
+            {'event': 'solution', 'node': 5, 'depth': 2, 'task': None, 'plan': []}]
+        for (name, options) in [('trace.jsonl', {}), ('trace.bin', {}),
+                                ('trace', {'format': 'binary', 'buffer_size': 2}),
+                                ('trace2', {'format': 'jsonl', 'buffer_size': 2})]:
+            (plans, events) = self.traced(name, nested_state(), [('try', 'a')], nested, **options)
+            self.assertEqual(plans, [[]])
+            self.assertEqual(events, expected, name)
+
+    def test_formats_agree(self):
+        traces = []
+        for name in ['trace.jsonl', 'trace.bin']:
+            (plans, events) = self.traced(name, rooms_state(), [('go_to', 'attic')], rooms)
+            solutions = [e['plan'] for e in events if e['event'] == 'solution']
+            self.assertEqual(solutions, [[list(task) for task in plan] for plan in plans])
+            self.assertTrue(any(e['event'] == 'prune' for e in events))
+            traces.append(events)
+        self.assertEqual(traces[0], traces[1])
+        with open(os.path.join(self.directory.name, 'trace.bin'), 'rb') as f:
+            self.assertEqual(f.read(len(pyhop2._TRACE_MAGIC)), pyhop2._TRACE_MAGIC)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            pyhop2.PlanTracer(os.path.join(self.directory.name, 'trace'), format='xml')
+
+
+class IterPlansTest(unittest.TestCase):
+
+    def test_endless_search(self):
+        for engine in ['copy', 'trail']:
+            plans = first_plans(pyhop2.iter_plans(count_state(), [('count',)], engine=engine,
+                                                  domain=counting), 5)
+            self.assertEqual(plans, [[('inc',)] * n for n in range(5)])
+
+    def test_stops_when_closed(self):
+        everything = pyhop2.SearchStats()
+        self.assertEqual(len(list(pyhop2.iter_plans(rooms_state(), [('go_to', 'attic')],
+                                                    stats=everything, domain=rooms))), 4)
+        for engine in ['copy', 'trail']:
+            stats = pyhop2.SearchStats()
+            plans = pyhop2.iter_plans(rooms_state(), [('go_to', 'attic')], engine=engine,
+                                      stats=stats, domain=rooms)
+            self.assertEqual(next(plans), [('go', 'hall', 'study'), ('go', 'study', 'cellar'),
+                                           ('go', 'cellar', 'attic')])
+            nodes = stats.nodes
+            self.assertLess(nodes, everything.nodes)
+            plans.close()
+            self.assertEqual(list(plans), [])
+            self.assertEqual(stats.nodes, nodes)
+            self.assertIsNone(pyhop2.search_scratch())
+
+
+class BudgetTest(unittest.TestCase):
+
+    def exhausted(self, budget, **options):
+        """Look for endless plans within budget, and return the BudgetExhausted."""
+        stats = options.pop('stats', pyhop2.SearchStats())
+        result = pyhop2.multi_pyhop(count_state(), [('count',)], 10**9, stats=stats,
+                                    budget=budget, domain=counting, **options)
+        self.assertIsInstance(result, pyhop2.BudgetExhausted)
+        self.assertFalse(result)
+        self.assertIs(result.stats, stats)
+        self.assertEqual(result.nodes, stats.nodes)
+        return result
+
+    def test_nodes(self):
+        for engine in ['copy', 'trail']:
+            result = self.exhausted(pyhop2.Budget(max_nodes=50), engine=engine)
+            self.assertEqual((result.reason, result.nodes), ('nodes', 50))
+            # Each plan takes two nodes, a count and an inc
+            self.assertEqual(result.plans, [[('inc',)] * n for n in range(25)])
+        result = pyhop.pyhop(travel_state(8), TRAVEL, domain=travel_v1,
+                             budget=pyhop2.Budget(max_nodes=2))
+        self.assertEqual((type(result), result.reason), (pyhop2.BudgetExhausted, 'nodes'))
+
+    def test_time(self):
+        result = self.exhausted(pyhop2.Budget(time_limit=0.05))
+        self.assertEqual(result.reason, 'time')
+        self.assertGreaterEqual(result.seconds, 0.05)
+        self.assertTrue(result.plans)
+        result = self.exhausted(pyhop2.Budget(deadline=0))
+        self.assertEqual((result.reason, result.nodes, result.plans), ('time', 0, []))
+
+    def test_frontier(self):
+        result = pyhop2.multi_pyhop(rooms_state(), [('go_to', 'attic')], 10,
+                                    frontier='breadth-first', domain=rooms,
+                                    budget=pyhop2.Budget(max_frontier=3))
+        self.assertEqual(result.reason, 'frontier')
+        self.assertFalse(result)
+
+    def test_cancelled(self):
+        cancel = threading.Event()
+        def on_expand(node):
+            if node.depth == 10:
+                cancel.set()
+        result = self.exhausted(pyhop2.Budget(cancel=cancel),
+                                stats=pyhop2.SearchStats(on_expand=on_expand))
+        self.assertEqual((result.reason, result.nodes), ('cancelled', 11))
+        self.assertEqual(self.exhausted(pyhop2.Budget(cancel=cancel)).nodes, 0)
+
+
+class LazyMethodTest(unittest.TestCase):
+
+    def test_same_plans_as_lists(self):
+        def go_to_g(state, room):
+            # go_to_m's alternatives, in the order the search tries them
+            for subtasks in reversed(go_to_m(state, room) or []):
+                yield subtasks
+        lazy = pyhop2.Domain('lazy rooms')
+        lazy.declare_operators(go)
+        lazy.declare_methods('go_to', go_to_g)
+        for engine in ['copy', 'trail']:
+            self.assertEqual(list(pyhop2.iter_plans(rooms_state(), [('go_to', 'attic')],
+                                                    engine=engine, domain=lazy)),
+                             list(pyhop2.iter_plans(rooms_state(), [('go_to', 'attic')],
+                                                    engine=engine, domain=rooms)))
+
+    def test_generated_as_needed(self):
+        for engine in ['copy', 'trail']:
+            made = []
+            def count_g(state):
+                # Endless alternatives: n incs, for n = 0, 1, 2, ...
+                n = 0
+                while True:
+                    made.append(n)
+                    yield [('inc',)] * n
+                    n += 1
+            lazy = pyhop2.Domain('lazy counting')
+            lazy.declare_operators(inc)
+            lazy.declare_methods('count', count_g)
+            plans = pyhop2.iter_plans(count_state(), [('count',)], engine=engine, domain=lazy)
+            self.assertEqual(next(plans), [])
+            self.assertLessEqual(len(made), 2)
+            self.assertEqual(first_plans(plans, 4), [[('inc',)] * n for n in range(1, 5)])
+            self.assertLessEqual(len(made), 6)
+            self.assertEqual(pyhop2.pyhop(count_state(), [('count',)], engine=engine,
+                                          domain=lazy), [])
+
+
+class NogoodTableTest(unittest.TestCase):
+
+    def test_hits_misses_and_eviction(self):
+        nogoods = pyhop2.NogoodTable(max_size=2)
+        stack = pyhop2.push_tasks(TRAVEL)
+        (a, b, c) = [nogoods.key(travel_state(8, cash), stack) for cash in [0, 1, 2]]
+        self.assertFalse(nogoods.lookup(a))
+        nogoods.add(a)
+        nogoods.add(b)
+        self.assertTrue(nogoods.lookup(a))
+        # b is now the least recently used, so it makes way for c
+        nogoods.add(c)
+        self.assertEqual(len(nogoods), 2)
+        self.assertFalse(nogoods.lookup(b))
+        self.assertTrue(nogoods.lookup(a))
+        self.assertTrue(nogoods.lookup(c))
+        self.assertEqual((nogoods.lookups, nogoods.hits), (5, 3))
+        self.assertEqual(nogoods.hit_rate(), 3 / 5.0)
+
+    def test_task_stack_keys(self):
+        nogoods = pyhop2.NogoodTable()
+        state = travel_state(8)
+        tasks = [('move', 'a', str(i)) for i in range(200)]
+        stack = pyhop2.push_tasks(tasks)
+        nogoods.add(nogoods.key(state, stack))
+        # An equal stack made separately, or unpickled, is the same key
+        for same in [pyhop2.push_tasks(list(tasks)),
+                     pyhop2.push_tasks(tasks[:1], pyhop2.push_tasks(tasks[1:])),
+                     pickle.loads(pickle.dumps(stack))]:
+            self.assertEqual(hash(same), hash(stack))
+            self.assertTrue(nogoods.lookup(nogoods.key(state, same)))
+        for other in [pyhop2.push_tasks(tasks[:-1]), pyhop2.push_tasks(tasks[::-1])]:
+            self.assertFalse(nogoods.lookup(nogoods.key(state, other)))
+        # Tasks that can't be hashed can't be remembered
+        unhashable = pyhop2.push_tasks([('move', ['a'], 'b')], stack)
+        nogoods.add(nogoods.key(state, unhashable))
+        self.assertFalse(nogoods.lookup(nogoods.key(state, unhashable)))
+        self.assertEqual(pyhop2.task_list(unhashable)[1:], tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
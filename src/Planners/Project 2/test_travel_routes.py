@@ -0,0 +1,110 @@
+"""
+Tests for travel_routes_p2.
+
+Usage: python test_travel_routes.py [-v]
+"""
+
+from __future__ import print_function
+import contextlib, io, itertools, math, os, sys, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'pyhop', 'pyhop2'))
+
+import pyhop2
+import bench_problems
+
+routes = pyhop2.Domain('routes')
+with pyhop2.using_domain(routes):
+    import travel_routes_p2
+
+# It runs some example problems when it is imported
+with contextlib.redirect_stdout(io.StringIO()):
+    import simple_travel_example_p2 as travel_example
+
+# The example's domain, with its methods in the order of travel_routes_p2's,
+# which walks when it can
+travel = pyhop2.Domain('travel')
+travel.declare_operators(travel_example.walk, travel_example.call_taxi,
+                         travel_example.ride_taxi, travel_example.pay_driver)
+travel.declare_methods('travel', travel_example.travel_by_taxi, travel_example.travel_by_foot)
+
+def all_distances(graph):
+    """Return the length of a shortest route between every two places, by Floyd-Warshall."""
+    dist = {x: {y: 0 if x == y else graph[x].get(y, math.inf) for y in graph} for x in graph}
+    for k in graph:
+        for x in graph:
+            for y in graph:
+                if dist[x][k] + dist[k][y] < dist[x][y]:
+                    dist[x][y] = dist[x][k] + dist[k][y]
+    return dist
+
+def index_modes(dist, coords):
+    """
+    Generate (name, index) for each way that a RouteIndex can find
+    routes, where index is the RouteIndex that dist gets that way.
+    """
+    for (name, mode_coords, limit) in [('all-pairs', None, len(dist)), ('dijkstra', None, 0),
+                                       ('a*', coords, 0)]:
+        yield (name, travel_routes_p2.index_graph(dist, mode_coords, all_pairs_limit=limit))
+
+def replay(state, plan):
+    """Return the state that the actions of plan lead to from state, or False if one fails."""
+    state = pyhop2.copy_state(state)
+    for action in plan:
+        state = routes.operators[action[0]](state, *action[1:])
+        if not state:
+            return False
+    return state
+
+
+class RouteIndexTest(unittest.TestCase):
+
+    def test_shortest_routes(self):
+        (dist, coords) = bench_problems.campus_graph(40, seed=3, degree=2)
+        expected = all_distances(dist)
+        self.assertTrue(any(d == math.inf for row in expected.values() for d in row.values()))
+        for (mode, index) in index_modes(dist, coords):
+            for (x, y) in itertools.product(dist, dist):
+                distance = index.distance(x, y)
+                self.assertAlmostEqual(distance, expected[x][y], msg=(mode, x, y))
+                path = index.path(x, y)
+                if distance == math.inf:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual((path[0], path[-1]), (x, y))
+                    self.assertAlmostEqual(sum(dist[u][v] for (u, v) in zip(path, path[1:])),
+                                           distance, msg=(mode, x, y))
+
+
+class SamePlansTest(unittest.TestCase):
+
+    def test_same_plans_as_travel_example(self):
+        # With a road between the two places, the routes are the roads, so
+        # the plans are the ones that the example's methods give
+        for (d, cash) in [(1, 20), (2, 20), (8, 20), (8, 5), (40, 20)]:
+            state = pyhop2.State('travel')
+            state.loc = {'me': 'home'}
+            state.cash = {'me': cash}
+            state.owe = {'me': 0}
+            state.dist = pyhop2.rigid({'home': {'park': d}, 'park': {'home': d}})
+            tasks = [('travel', 'me', 'home', 'park')]
+            self.assertEqual(pyhop2.pyhop(state, tasks, domain=routes),
+                             pyhop2.pyhop(state, tasks, domain=travel), (d, cash))
+
+    def test_same_plans_however_indexed(self):
+        graph = bench_problems.campus_graph(60)
+        problems = [bench_problems.campus_problem(60, seed, graph=graph) for seed in range(5)]
+        results = {}
+        for (mode, index) in index_modes(*graph):
+            results[mode] = [pyhop2.pyhop(state, tasks, domain=routes)
+                             for (state, tasks) in problems]
+        self.assertTrue(all(results['all-pairs']))
+        self.assertEqual(results['dijkstra'], results['all-pairs'])
+        # A* can take another of the shortest routes when there are several
+        for ((state, tasks), plan, expected) in zip(problems, results['a*'],
+                                                   results['all-pairs']):
+            self.assertEqual(replay(state, plan).loc, replay(state, expected).loc)
+
+
+if __name__ == '__main__':
+    unittest.main()
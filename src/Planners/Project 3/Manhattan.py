@@ -1 +1,365 @@
-import pyhop2
+"""
+A grid-world robot domain for pyhop2. Robots move between the 4-connected
+free cells of an occupancy grid, and the navigate method finds a whole
+shortest path with a grid path-finder (A* with the Manhattan distance as
+its heuristic) and turns it into a sequence of moves, instead of planning
+one step per level of the search.
+
+The state's variables are
+- grid: a Grid, which all of the states share
+- loc: a dict with the (row, column) cell of each robot
+
+and the tasks are ('move', robot, cell1, cell2) and ('navigate', robot,
+cell). For example:
+    state = pyhop2.State('warehouse')
+    state.grid = load_grid('warehouse.map')
+    state.loc = {'robot': (0, 0)}
+    pyhop2.pyhop(state, [('navigate', 'robot', (120, 45))])
+
+With NumPy, a Grid keeps its cells in a NumPy array, and the A* search
+expands all of the cells with the same f value at once. Without it, it
+uses lists and a heap-based A*, which finds paths just as short, but more
+slowly on large grids.
+"""
+
+from __future__ import print_function
+import heapq, os, sys
+from collections import Counter, OrderedDict
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyhop2
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    '..', 'Project 2', 'pyhop', 'pyhop2'))
+    import pyhop2
+
+# A goal all of whose free neighbourhood is within this many moves of it
+# gets its distance field right away, rather than A* searching the rest
+# of the grid for a path that isn't there
+POCKET = 64
+
+
+############################################################
+# Grids
+
+class Grid(object):
+    """
+    An occupancy grid: blocked[r][c] is true if cell (r, c) is blocked.
+    path(start, goal) returns a shortest path between two cells. Once a
+    goal has been asked for field_after times, the grid computes the
+    distance from every cell to it (its distance field), so that paths
+    to it take time in proportion to their length; it keeps the fields
+    of the last max_fields such goals.
+
+    A Grid doesn't change, so the states of a search share it instead of
+    copying it, as they do rigid variables (see pyhop2.rigid).
+    """
+    def __init__(self, blocked, max_fields=4, field_after=2, use_numpy=None):
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError('use_numpy needs NumPy')
+        self.use_numpy = use_numpy
+        if use_numpy:
+            blocked = numpy.asarray(blocked, dtype=bool)
+            (self.height, self.width) = blocked.shape
+        else:
+            blocked = [[bool(x) for x in row] for row in blocked]
+            self.height = len(blocked)
+            self.width = len(blocked[0]) if blocked else 0
+        # Cells are numbered row by row in the grid with a border of
+        # blocked cells around it, so that every cell has four neighbours
+        stride = self.width + 2
+        self.stride = stride
+        self.offsets = (-stride, stride, -1, 1)
+        if use_numpy:
+            free = numpy.zeros((self.height + 2, stride), dtype=bool)
+            free[1:-1, 1:-1] = ~blocked
+            self.free = free.ravel()
+            self.free.flags.writeable = False
+        else:
+            free = bytearray(stride * (self.height + 2))
+            for (r, row) in enumerate(blocked):
+                for (c, cell) in enumerate(row):
+                    if not cell:
+                        free[(r + 1) * stride + c + 1] = 1
+            self.free = bytes(free)
+        self.max_fields = max_fields
+        self.field_after = field_after
+        self.fields = OrderedDict()
+        self.requests = Counter()
+
+    def __repr__(self):
+        return '<Grid {}x{}>'.format(self.height, self.width)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def _fingerprint(self):
+        return id(self)
+
+    def is_free(self, cell):
+        """Is cell a (row, column) pair of a free cell of the grid?"""
+        (r, c) = cell
+        return 0 <= r < self.height and 0 <= c < self.width and bool(self.free[self._index(cell)])
+
+    def _index(self, cell):
+        return (cell[0] + 1) * self.stride + cell[1] + 1
+
+    def _cell(self, i):
+        (r, c) = divmod(int(i), self.stride)
+        return (r - 1, c - 1)
+
+    def path(self, start, goal):
+        """
+        Return a shortest path from cell start to cell goal, as a list of
+        (row, column) cells, or None if there isn't one.
+        """
+        if not (self.is_free(start) and self.is_free(goal)):
+            return None
+        (s, t) = (self._index(start), self._index(goal))
+        field = self.fields.get(t)
+        if field is not None:
+            self.fields.move_to_end(t)
+        else:
+            self.requests[t] += 1
+            if self.requests[t] >= self.field_after:
+                field = self._distance_field(t)
+            else:
+                field = self._distance_field(t, POCKET)
+        if field is not None:
+            path = self._follow(field, s)
+        elif self.use_numpy:
+            path = self._astar_numpy(s, t)
+        else:
+            path = self._astar(s, t)
+        return None if path is None else [self._cell(i) for i in path]
+
+    def distance(self, start, goal):
+        """Return the number of moves from start to goal, or None if goal can't be reached."""
+        path = self.path(start, goal)
+        return None if path is None else len(path) - 1
+
+    def distance_field(self, goal):
+        """
+        Return the distance field of cell goal, indexed by cell number
+        (-1 for the cells from which it can't be reached), and keep it.
+        """
+        t = self._index(goal)
+        field = self.fields.get(t)
+        return self._distance_field(t) if field is None else field
+
+    def _distance_field(self, t, limit=None):
+        """
+        Make and keep the distance field of cell t, unless limit is given
+        and some cells are more than limit moves from it; then return None.
+        """
+        if self.use_numpy:
+            field = self._field_numpy(t, limit)
+        else:
+            field = self._field(t, limit)
+        if field is not None:
+            self.fields[t] = field
+            if len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        return field
+
+    def _follow(self, field, s):
+        """Return the path from s down field to its goal."""
+        if field[s] < 0:
+            return None
+        path = [s]
+        offsets = self.offsets
+        d = int(field[s])
+        while d > 0:
+            d -= 1
+            for offset in offsets:
+                if field[path[-1] + offset] == d:
+                    path.append(path[-1] + offset)
+                    break
+        return path
+
+    def _path(self, came, s, t):
+        """Return the path from s to t, where came[i] is the offset that led to cell i."""
+        path = [t]
+        while path[-1] != s:
+            path.append(path[-1] - self.offsets[came[path[-1]]])
+        path.reverse()
+        return path
+
+    ### with NumPy
+
+    def _astar_numpy(self, s, t):
+        # With unit costs and the Manhattan distance, a move changes f by
+        # 0 or 2. The cells to expand with the current bound on f are
+        # expanded together; their neighbours go back in with the same
+        # bound or into the next one
+        (free, offsets) = (self.free, self.offsets)
+        (tr, tc) = divmod(t, self.stride)
+        stride = self.stride
+        def h(cells):
+            return abs(cells // stride - tr) + abs(cells % stride - tc)
+        g = numpy.full(free.size, numpy.iinfo(numpy.int32).max, dtype=numpy.int32)
+        came = numpy.zeros(free.size, dtype=numpy.int8)
+        closed = numpy.zeros(free.size, dtype=bool)
+        g[s] = 0
+        bound = int(h(numpy.array([s]))[0])
+        current = [numpy.array([s])]
+        later = []
+        while True:
+            if not current:
+                if not later:
+                    return None
+                (current, later) = ([numpy.concatenate(later)], [])
+                bound += 2
+            front = current.pop()
+            front = numpy.unique(front[~closed[front]])
+            # Cells whose g went down since they were put in are in again
+            front = front[g[front] + h(front) == bound]
+            if front.size == 0:
+                continue
+            if (front == t).any():
+                return self._path(came, s, t)
+            closed[front] = True
+            g_next = g[front] + 1
+            same = []
+            for (k, offset) in enumerate(offsets):
+                cells = front + offset
+                better = free[cells] & (g[cells] > g_next)
+                if not better.any():
+                    continue
+                cells = cells[better]
+                g_cells = g_next[better]
+                g[cells] = g_cells
+                came[cells] = k
+                on_bound = g_cells + h(cells) == bound
+                same.append(cells[on_bound])
+                later.append(cells[~on_bound])
+            if same:
+                current.append(numpy.concatenate(same))
+
+    def _field_numpy(self, t, limit=None):
+        (free, offsets) = (self.free, self.offsets)
+        field = numpy.full(free.size, -1, dtype=numpy.int32)
+        field[t] = 0
+        front = numpy.array([t])
+        d = 0
+        while front.size:
+            if d == limit:
+                return None
+            d += 1
+            cells = numpy.concatenate([front + offset for offset in offsets])
+            front = numpy.unique(cells[free[cells] & (field[cells] < 0)])
+            field[front] = d
+        return field
+
+    ### without NumPy
+
+    def _astar(self, s, t):
+        (free, offsets, stride) = (self.free, self.offsets, self.stride)
+        (tr, tc) = divmod(t, stride)
+        def h(i):
+            return abs(i // stride - tr) + abs(i % stride - tc)
+        g = {s: 0}
+        came = {}
+        closed = set()
+        # Of the cells with the same f, expand the farthest from s first
+        heap = [(h(s), 0, s)]
+        while heap:
+            (f, minus_g, i) = heapq.heappop(heap)
+            if i == t:
+                return self._path(came, s, t)
+            if i in closed:
+                continue
+            closed.add(i)
+            g_next = 1 - minus_g
+            for (k, offset) in enumerate(offsets):
+                j = i + offset
+                if free[j] and g_next < g.get(j, g_next + 1):
+                    g[j] = g_next
+                    came[j] = k
+                    heapq.heappush(heap, (g_next + h(j), -g_next, j))
+        return None
+
+    def _field(self, t, limit=None):
+        (free, offsets) = (self.free, self.offsets)
+        field = [-1] * len(free)
+        field[t] = 0
+        front = [t]
+        d = 0
+        while front:
+            if d == limit:
+                return None
+            d += 1
+            cells = []
+            for i in front:
+                for offset in offsets:
+                    j = i + offset
+                    if free[j] and field[j] < 0:
+                        field[j] = d
+                        cells.append(j)
+            front = cells
+        return field
+
+def load_grid(path, **options):
+    """
+    Return a Grid read from the file path: a NumPy .npy file with a 2-D
+    array whose nonzero cells are blocked, or a text map with a line per
+    row, in which '.', 'G' and 'S' are free cells and any other character
+    is blocked, after an optional header of 'type', 'height', 'width' and
+    'map' lines (as in the Moving AI benchmark maps). The options are as
+    for Grid.
+    """
+    if path.endswith('.npy'):
+        if numpy is None:
+            raise ImportError('reading {} needs NumPy'.format(path))
+        return Grid(numpy.load(path), **options)
+    with open(path) as f:
+        lines = [line.rstrip('\r\n') for line in f]
+    if lines and lines[0].startswith('type'):
+        lines = lines[lines.index('map') + 1:]
+    rows = [[char not in '.GS' for char in line] for line in lines if line]
+    return Grid(rows, **options)
+
+
+############################################################
+# Operators
+
+def move(state,robot,here,there):
+    if (state.loc[robot] == here and abs(here[0]-there[0]) + abs(here[1]-there[1]) == 1
+            and state.grid.is_free(there)):
+        state.loc[robot] = there
+        return state
+    else: return False
+
+pyhop2.declare_operators(move)
+
+
+############################################################
+# Methods
+
+def navigate_m(state,robot,goal):
+    path = state.grid.path(state.loc[robot], goal)
+    if path is None:
+        return False
+    return [[('move',robot,here,there) for (here, there) in zip(path, path[1:])]]
+
+pyhop2.declare_methods('navigate',navigate_m)
+
+
+if __name__ == '__main__':
+    state = pyhop2.State('state1')
+    state.grid = Grid([[0, 0, 0, 0, 0],
+                       [1, 1, 1, 1, 0],
+                       [0, 0, 0, 0, 0],
+                       [0, 1, 1, 1, 1],
+                       [0, 0, 0, 0, 0]])
+    state.loc = {'robot': (0, 0)}
+    pyhop2.pyhop(state, [('navigate', 'robot', (4, 4))], verbose=1)
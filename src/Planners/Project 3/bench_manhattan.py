@@ -0,0 +1,85 @@
+"""
+Benchmark for Manhattan: plans navigate tasks on random occupancy grids
+of growing size, with robots that start at random cells and go to one of
+a few goals, and reports the median latency of
+- a*: the first path to each goal, which A* finds
+- field: making the distance field of a goal, the next time it's asked for
+- plan: pyhop planning a navigate task, once the goals' fields are made
+
+Usage: python bench_manhattan.py [--sizes n1 n2 ...] [--density d]
+                                 [--goals n] [--problems n] [--no-numpy]
+"""
+
+from __future__ import print_function
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Manhattan
+import pyhop2
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def random_grid(size, density, rng):
+    """Return a size x size list of rows in which each cell is blocked with probability density."""
+    return [[rng.random() < density for c in range(size)] for r in range(size)]
+
+def random_cells(grid, n, rng):
+    """Return n random free cells of grid that are connected to each other."""
+    while True:
+        cells = []
+        while len(cells) < n:
+            cell = (rng.randrange(grid.height), rng.randrange(grid.width))
+            if grid.is_free(cell):
+                cells.append(cell)
+        field = grid.distance_field(cells[0])
+        grid.fields.clear()
+        if all(field[grid._index(cell)] >= 0 for cell in cells):
+            return cells
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark navigation on growing grids.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000, 2000])
+    parser.add_argument('--density', type=float, default=0.25,
+                        help='the fraction of blocked cells (default 0.25)')
+    parser.add_argument('--goals', type=int, default=4,
+                        help='how many different goals (default 4)')
+    parser.add_argument('--problems', type=int, default=20,
+                        help='how many navigate tasks to plan for (default 20)')
+    parser.add_argument('--no-numpy', action='store_true',
+                        help="use the grid search that doesn't need NumPy")
+    args = parser.parse_args(argv)
+    print('{:>6} {:>10} {:>10} {:>10}  {}'.format('size', 'a* ms', 'field ms', 'plan ms', 'plans'))
+    for size in args.sizes:
+        rng = random.Random(size)
+        grid = Manhattan.Grid(random_grid(size, args.density, rng), max_fields=args.goals,
+                              use_numpy=False if args.no_numpy else None)
+        cells = random_cells(grid, args.goals + args.problems, rng)
+        (goals, starts) = (cells[:args.goals], cells[args.goals:])
+        searches = []
+        fields = []
+        for (goal, start) in zip(goals, starts):
+            begin = time.perf_counter()
+            grid.path(start, goal)
+            searches.append(time.perf_counter() - begin)
+            begin = time.perf_counter()
+            grid.path(start, goal)
+            fields.append(time.perf_counter() - begin)
+        latencies = []
+        found = 0
+        for (i, start) in enumerate(starts):
+            state = pyhop2.State('grid')
+            state.grid = grid
+            state.loc = {'robot': start}
+            begin = time.perf_counter()
+            plan = pyhop2.pyhop(state, [('navigate', 'robot', goals[i % len(goals)])])
+            latencies.append(time.perf_counter() - begin)
+            found += plan is not False
+        print('{:>6} {:>10.2f} {:>10.2f} {:>10.2f}  {}/{}'.format(
+            size, 1000 * median(searches), 1000 * median(fields), 1000 * median(latencies),
+            found, len(starts)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
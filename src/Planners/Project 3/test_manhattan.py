@@ -0,0 +1,118 @@
+"""
+Tests for Manhattan. The tests of the NumPy grids are skipped if NumPy
+isn't installed.
+
+Usage: python test_manhattan.py [-v]
+"""
+
+from __future__ import print_function
+import os, random, sys, unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'Project 2', 'pyhop', 'pyhop2'))
+
+import pyhop2
+
+grid_domain = pyhop2.Domain('grid')
+with pyhop2.using_domain(grid_domain):
+    import Manhattan
+
+def random_rows(rng):
+    """Return the rows of a random grid, of up to 24x24 cells."""
+    (height, width) = (rng.randrange(1, 25), rng.randrange(1, 25))
+    density = rng.choice([0, 0.2, 0.35, 0.5])
+    return [[rng.random() < density for c in range(width)] for r in range(height)]
+
+def cell_pairs(rows, rng, n=10):
+    """Return n random (start, goal) pairs of free cells of rows."""
+    free = [(r, c) for (r, row) in enumerate(rows) for (c, blocked) in enumerate(row)
+            if not blocked]
+    return [(rng.choice(free), rng.choice(free)) for i in range(n)] if free else []
+
+def bfs_distance(rows, start, goal):
+    """Return the number of moves from start to goal, by breadth-first search, or None."""
+    seen = {start: 0}
+    front = [start]
+    while front:
+        cells = []
+        for (r, c) in front:
+            if (r, c) == goal:
+                return seen[goal]
+            for cell in [(r-1, c), (r+1, c), (r, c-1), (r, c+1)]:
+                if (0 <= cell[0] < len(rows) and 0 <= cell[1] < len(rows[0])
+                        and not rows[cell[0]][cell[1]] and cell not in seen):
+                    seen[cell] = seen[(r, c)] + 1
+                    cells.append(cell)
+        front = cells
+    return None
+
+
+class GridTest(unittest.TestCase):
+
+    def check_path(self, rows, start, goal, path):
+        """Check that path is a shortest path from start to goal in rows, or None if there isn't one."""
+        distance = bfs_distance(rows, start, goal)
+        if distance is None:
+            self.assertIsNone(path)
+            return
+        self.assertEqual((path[0], path[-1]), (start, goal))
+        self.assertEqual(len(path) - 1, distance)
+        for ((r1, c1), (r2, c2)) in zip(path, path[1:]):
+            self.assertEqual(abs(r1 - r2) + abs(c1 - c2), 1)
+            self.assertFalse(rows[r2][c2])
+
+    def check_grids(self, use_numpy):
+        rng = random.Random(0)
+        for trial in range(100):
+            rows = random_rows(rng)
+            # The grid makes distance fields only for goals with small
+            # pockets (see POCKET), so A* is called directly as well
+            grid = Manhattan.Grid(rows, field_after=1000, use_numpy=use_numpy)
+            for (start, goal) in cell_pairs(rows, rng):
+                grid.fields.clear()
+                (s, t) = (grid._index(start), grid._index(goal))
+                path = grid._astar_numpy(s, t) if use_numpy else grid._astar(s, t)
+                self.check_path(rows, start, goal,
+                                None if path is None else [grid._cell(i) for i in path])
+                self.check_path(rows, start, goal, grid.path(start, goal))
+
+    def test_astar(self):
+        self.check_grids(False)
+
+    @unittest.skipIf(Manhattan.numpy is None, 'needs NumPy')
+    def test_astar_numpy(self):
+        self.check_grids(True)
+
+    @unittest.skipIf(Manhattan.numpy is None, 'needs NumPy')
+    def test_same_fields(self):
+        rng = random.Random(1)
+        for trial in range(50):
+            rows = random_rows(rng)
+            with_numpy = Manhattan.Grid(rows, use_numpy=True)
+            without = Manhattan.Grid(rows, use_numpy=False)
+            for (start, goal) in cell_pairs(rows, rng, 3):
+                t = without._index(goal)
+                for limit in [None, 1, 5]:
+                    field = with_numpy._field_numpy(t, limit)
+                    expected = without._field(t, limit)
+                    self.assertEqual(None if field is None else field.tolist(), expected)
+
+    @unittest.skipIf(Manhattan.numpy is None, 'needs NumPy')
+    def test_same_plan_lengths(self):
+        rng = random.Random(2)
+        for trial in range(30):
+            rows = random_rows(rng)
+            for (start, goal) in cell_pairs(rows, rng, 3):
+                lengths = []
+                for use_numpy in [True, False]:
+                    state = pyhop2.State('grid')
+                    state.grid = Manhattan.Grid(rows, use_numpy=use_numpy)
+                    state.loc = {'robot': start}
+                    plan = pyhop2.pyhop(state, [('navigate', 'robot', goal)], domain=grid_domain)
+                    lengths.append(len(plan) if plan is not False else None)
+                self.assertEqual(lengths[0], lengths[1])
+                self.assertEqual(lengths[1], bfs_distance(rows, start, goal))
+
+
+if __name__ == '__main__':
+    unittest.main()